@@ -0,0 +1,316 @@
+"""
+Load test: many concurrent synthetic users against a locally started server.
+
+Starts the app in a child process on a throwaway SQLite file (or targets
+--url), registers --users users through /auth/register, logs them in and
+creates a plan for each through /planner. Then --clients threads, one user
+session each, replay a mix of /dashboard polls (conditional on the last ETag,
+like a browser) and /toggle_item clicks for --duration seconds. The JSON
+report has throughput and p50/p95/p99 latency per route, status counts, and
+"database is locked" errors seen in responses and in the server log.
+
+    python benchmarks/loadtest.py --users 200 --clients 50 --duration 30
+    python benchmarks/loadtest.py --server-cmd "python -m flask --app fitness_app run --port {port} --with-threads"
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --users 20 --clients 20
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fitness_app.models import MAX_PLAN_DAYS
+
+PASSWORD = "load-password"
+GOALS = ["Weight Loss", "Muscle Gain", "Endurance"]
+LOCKED = "database is locked"
+_INPUT = re.compile(r"<input[^>]*>")
+
+
+def _hidden(html: str, name: str):
+    """value of the <input name=...> in html, or None."""
+    for tag in _INPUT.findall(html):
+        if f'name="{name}"' in tag:
+            value = re.search(r'value="([^"]*)"', tag)
+            return value.group(1) if value else None
+    return None
+
+
+def _percentile(sorted_samples, q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.locked = 0
+
+    def record(self, route: str, seconds: float, status: int, body: bytes = b""):
+        with self._lock:
+            self.latencies[route].append(seconds * 1000)
+            self.statuses[route][status] += 1
+            if status >= 500 and LOCKED.encode() in body:
+                self.locked += 1
+
+
+class Client:
+    """One browser: a cookie jar, the last dashboard ETag and the CSRF token."""
+
+    def __init__(self, base_url: str, stats: Stats = None, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.stats = stats
+        self.timeout = timeout
+        self.etag = None
+        self.csrf = None
+        self.toggle = None   # form fields of today's toggle form
+        self.items = 0
+
+    def request(self, route: str, path: str, data: dict = None, headers: dict = None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers or {})
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                status, payload, resp_headers = resp.status, resp.read(), resp.headers
+        except urllib.error.HTTPError as exc:   # includes 304
+            status, payload, resp_headers = exc.code, exc.read(), exc.headers
+        except OSError:
+            status, payload, resp_headers = 599, b"", {}
+        if self.stats is not None:
+            self.stats.record(route, time.perf_counter() - start, status, payload)
+        return status, payload.decode("utf-8", "replace"), resp_headers
+
+    def form_token(self, path: str) -> str:
+        _, html, _ = self.request("setup", path)
+        return _hidden(html, "csrf_token")
+
+    def register(self, i: int, rng: random.Random):
+        self.request("setup", "/auth/register", {
+            "csrf_token": self.form_token("/auth/register"), "username": f"load{i}",
+            "email": f"load{i}@example.com", "password": PASSWORD, "confirm": PASSWORD,
+            "age": rng.randint(18, 70), "height_cm": rng.randint(150, 200), "weight_kg": rng.randint(50, 120),
+            "gender": rng.choice(["Male", "Female"]), "fitness_level": "Intermediate",
+            "previous_goal": rng.choice(GOALS)})
+
+    def login(self, i: int):
+        self.request("setup", "/auth/login", {
+            "csrf_token": self.form_token("/auth/login"), "identifier": f"load{i}", "password": PASSWORD})
+
+    def create_plan(self, days: int, goal: str, wait: float = 60.0):
+        status, body, _ = self.request(
+            "setup", "/planner", {"csrf_token": self.form_token("/planner"), "days": days, "goal": goal},
+            headers={"Accept": "application/json"})
+        if status == 202:
+            status_url = json.loads(body)["status_url"]
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline:
+                _, body, _ = self.request("setup", status_url)
+                if json.loads(body)["job"]["status"] in ("done", "failed"):
+                    break
+                time.sleep(0.2)
+
+    def refresh_dashboard(self):
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        status, html, headers = self.request("dashboard", "/dashboard", headers=headers)
+        if status == 200:
+            self.etag = headers.get("ETag")
+            self.csrf = _hidden(html, "csrf_token") or self.csrf
+            fields = {name: _hidden(html, name) for name in ("day_id", "plan_id", "day_index")}
+            if fields["plan_id"]:
+                self.toggle = fields
+                self.items = html.count('class="complete-btn"')
+        return status
+
+    def click(self, rng: random.Random):
+        if not self.toggle or not self.items:
+            return self.refresh_dashboard()
+        form = dict(self.toggle, csrf_token=self.csrf, item_index=rng.randrange(self.items),
+                    completed=rng.choice(["true", "false"]))
+        status, body, _ = self.request("toggle_item", "/toggle_item", form,
+                                       headers={"X-CSRFToken": self.csrf or ""})
+        if status == 200:
+            day_id = json.loads(body).get("day_id")
+            if day_id:
+                self.toggle["day_id"] = str(day_id)   # the day is materialized now
+        return status
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(cmd: str, port: int, env: dict, log_path: str):
+    log = open(log_path, "wb")
+    proc = subprocess.Popen(shlex.split(cmd.format(port=port, python=sys.executable)), cwd=ROOT, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}, see {log_path}")
+        try:
+            urllib.request.urlopen(base_url + "/auth/login", timeout=1).read()
+            return proc, base_url
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("server did not start within 60s")
+
+
+def setup_users(base_url: str, users: int, concurrency: int, plan_days: int, seed: int):
+    def one(i):
+        rng = random.Random(seed + i)
+        client = Client(base_url)
+        client.register(i, rng)
+        client.login(i)
+        client.create_plan(plan_days, rng.choice(GOALS))
+        client.refresh_dashboard()
+        return client
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(one, range(users)))
+
+
+def run_load(clients, stats: Stats, duration: float, toggle_ratio: float, think: float, seed: int):
+    stop = time.monotonic() + duration
+
+    def loop(n, client):
+        rng = random.Random(seed * 7919 + n)
+        client.stats = stats
+        while time.monotonic() < stop:
+            if rng.random() < toggle_ratio:
+                client.click(rng)
+            else:
+                client.refresh_dashboard()
+            if think:
+                time.sleep(rng.expovariate(1 / think))
+
+    threads = [threading.Thread(target=loop, args=(n, c), daemon=True) for n, c in enumerate(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+
+def report_routes(stats: Stats, elapsed: float) -> dict:
+    routes = {}
+    for route, samples in stats.latencies.items():
+        if route == "setup":
+            continue
+        samples.sort()
+        statuses = stats.statuses[route]
+        routes[route] = {
+            "requests": len(samples),
+            "rps": len(samples) / elapsed,
+            "p50_ms": _percentile(samples, 0.50),
+            "p95_ms": _percentile(samples, 0.95),
+            "p99_ms": _percentile(samples, 0.99),
+            "max_ms": samples[-1],
+            "errors": sum(n for code, n in statuses.items() if code >= 400),
+            "status": {str(code): n for code, n in sorted(statuses.items())},
+        }
+    return routes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100, help="synthetic users to register")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent client threads")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of replayed traffic")
+    parser.add_argument("--toggle-ratio", type=float, default=0.3, help="share of requests that are toggles")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between requests (s)")
+    parser.add_argument("--plan-days", type=int, default=28, help=f"1-{MAX_PLAN_DAYS} (the planner form's limit)")
+    parser.add_argument("--setup-concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--server-cmd", default="{python} -m flask --app fitness_app run --port {port} "
+                                                "--with-threads --no-reload --no-debugger",
+                        help="command starting the server; {port} and {python} are substituted")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the started server (repeatable)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    if not 1 <= args.plan_days <= MAX_PLAN_DAYS:
+        parser.error(f"--plan-days must be 1-{MAX_PLAN_DAYS}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "server.log")
+        proc = None
+        if args.url:
+            base_url = args.url
+        else:
+            env = dict(os.environ, DATABASE_URL="sqlite:///" + os.path.join(tmp, "load.db"), AUTO_CREATE_DB="1",
+                       FLASK_DEBUG="0")
+            env.update(kv.split("=", 1) for kv in args.env)
+            proc, base_url = start_server(args.server_cmd, _free_port(), env, log_path)
+        try:
+            start = time.perf_counter()
+            clients = setup_users(base_url, args.users, args.setup_concurrency, args.plan_days, args.seed)
+            setup_seconds = time.perf_counter() - start
+            sessions = clients[:args.clients]
+            # more clients than users: the extra sessions log in as the same users again
+            for n in range(args.clients - len(clients)):
+                client = Client(base_url)
+                client.login(n % len(clients))
+                client.refresh_dashboard()
+                sessions.append(client)
+            stats = Stats()
+            elapsed = run_load(sessions, stats, args.duration, args.toggle_ratio, args.think, args.seed)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=30)
+        server_locked = None
+        if proc is not None:
+            with open(log_path, "rb") as f:
+                server_locked = f.read().count(LOCKED.encode())
+
+    routes = report_routes(stats, elapsed)
+    total = sum(r["requests"] for r in routes.values())
+    report = {
+        "config": {k: getattr(args, k) for k in ("users", "clients", "duration", "toggle_ratio", "think",
+                                                 "plan_days", "seed")},
+        "server": args.url or args.server_cmd,
+        "setup_s": setup_seconds,
+        "elapsed_s": elapsed,
+        "requests": total,
+        "rps": total / elapsed,
+        "routes": routes,
+        "db_locked": {"responses": stats.locked, "server_log": server_locked},
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Cold-start benchmark: import time, create_app time and time-to-first-request.
+
+Every run is a fresh interpreter against a throwaway SQLite file, so the
+numbers match what a newly spawned worker pays.
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --warmup-models --auto-create-db
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter; prints one JSON line.
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import fitness_app
+t1 = time.perf_counter()
+app = fitness_app.create_app({"WTF_CSRF_ENABLED": False})
+t2 = time.perf_counter()
+client = app.test_client()
+status = client.get("/auth/login").status_code
+t3 = time.perf_counter()
+print(json.dumps({
+    "import_s": t1 - t0,
+    "create_app_s": t2 - t1,
+    "first_request_s": t3 - t2,
+    "total_s": t3 - t0,
+    "status": status,
+    "ml_modules_loaded": sorted(m for m in ("numpy", "pandas", "sklearn", "joblib") if m in sys.modules),
+}))
+"""
+
+
+def run_once(env: dict) -> dict:
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", _CHILD], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup-models", action="store_true", help="set WARMUP_MODELS=1")
+    parser.add_argument("--auto-create-db", action="store_true", help="set AUTO_CREATE_DB=1")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   DATABASE_URL="sqlite:///" + os.path.join(tmp, "startup.db"),
+                   WARMUP_MODELS="1" if args.warmup_models else "0",
+                   AUTO_CREATE_DB="1" if args.auto_create_db else "0")
+        for _ in range(args.runs):
+            runs.append(run_once(env))
+
+    keys = ("import_s", "create_app_s", "first_request_s", "total_s")
+    report = {
+        "runs": args.runs,
+        "warmup_models": args.warmup_models,
+        "auto_create_db": args.auto_create_db,
+        "ml_modules_loaded": runs[-1]["ml_modules_loaded"],
+        "median": {k: statistics.median(r[k] for r in runs) for k in keys},
+        "min": {k: min(r[k] for r in runs) for k in keys},
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Hot-path benchmarks: planner, ML inference and the busiest HTTP routes.
+
+Seeds a throwaway SQLite database with --users users, each with --plans
+plans of --plan-days days, then times every benchmark for --iterations
+calls (after --warmup untimed calls). The report is JSON; pass --baseline
+with an earlier report to get per-benchmark ratios of the medians.
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --baseline baseline.json --fail-on-regression
+    python benchmarks/suite.py --only dashboard,toggle_item --iterations 500
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fitness_app.models import MAX_PLAN_DAYS
+
+PASSWORD = "bench-password"
+GOALS = ["Weight Loss", "Muscle Gain", "Endurance"]
+
+
+def seed(app, users: int, plans: int, plan_days: int, storage: str, rng: random.Random):
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+
+    from fitness_app.batch_plans import generate_plans_bulk
+    from fitness_app.models import User, db
+
+    password_hash = generate_password_hash(PASSWORD)   # hashing is slow; every user shares one
+    rows = []
+    for i in range(users):
+        height, weight = rng.uniform(150, 200), rng.uniform(50, 120)
+        rows.append(dict(
+            username=f"bench{i}", email=f"bench{i}@example.com", password_hash=password_hash,
+            age=rng.randint(18, 70), height_cm=round(height, 1), weight_kg=round(weight, 1),
+            gender=rng.choice(["Male", "Female"]),
+            fitness_level=rng.choice(["Beginner", "Intermediate", "Advanced"]),
+            bmi=round(weight / (height / 100) ** 2, 1)))
+    with app.app_context():
+        for start in range(0, len(rows), 5000):
+            db.session.execute(insert(User), rows[start:start + 5000])
+        db.session.commit()
+        for _ in range(plans):
+            generate_plans_bulk(days=plan_days, goal=rng.choice(GOALS), seed=rng.randrange(2 ** 31),
+                                storage=storage, chunk_size=2000)
+
+
+def _user_features(user) -> dict:
+    return {"age": user.age, "gender": 1 if user.gender == "Male" else 0, "height_cm": user.height_cm,
+            "weight_kg": user.weight_kg, "BMI": user.bmi, "fitness_level": 1}
+
+
+def benchmarks(app, users: int, plan_days: int, rng: random.Random) -> dict:
+    """name -> (setup, call). setup runs once inside the app context and returns call's state."""
+    from fitness_app.ml_engine import candidate_grid, suggest_best_plan
+    from fitness_app.models import User, db
+    from fitness_app.planner import generate_plan_for_user, get_today_for_user, predict_intensity_from_bmi
+
+    def random_user():
+        return db.session.get(User, rng.randint(1, users))
+
+    def login():
+        client = app.test_client()
+        client.post("/auth/login", data={"identifier": "bench0", "password": PASSWORD})
+        return client
+
+    def toggle_state():
+        client = login()
+        plan, day, _ = get_today_for_user(db.session.get(User, 1))
+        form = {"item_index": "0"}
+        if day is not None and day.id is not None:
+            form["day_id"] = str(day.id)
+        else:
+            form.update(plan_id=str(plan.id), day_index="0")
+        return client, form, [False]
+
+    def toggle(state):
+        client, form, flag = state
+        flag[0] = not flag[0]
+        response = client.post("/toggle_item", data=dict(form, completed="true" if flag[0] else "false"))
+        assert response.status_code == 200, response.status_code
+
+    def dashboard(client):
+        response = client.get("/dashboard")
+        assert response.status_code == 200, response.status_code
+
+    base = {"goal": 0, "plan_length_days": 28, "avg_intensity": 1, "avg_sets_per_day": 3,
+            "avg_reps_per_set": 8, "avg_cardio_minutes_per_day": 25, "exercise_types_count": 5,
+            "previous_success_rate": 0.7, "previous_goal": 0, "plan_adherence_rate": 0.8, "user_rating": 4.0}
+
+    return {
+        "generate_plan_for_user": (
+            lambda: None,
+            lambda _: generate_plan_for_user(random_user(), days=plan_days, goal=rng.choice(GOALS))),
+        "get_today_for_user": (lambda: None, lambda _: get_today_for_user(random_user())),
+        "predict_intensity_from_bmi": (lambda: None, lambda _: predict_intensity_from_bmi(rng.uniform(16, 40))),
+        "suggest_best_plan": (
+            lambda: (_user_features(db.session.get(User, 1)), candidate_grid(base)),
+            lambda state: suggest_best_plan(*state)),
+        "dashboard": (login, dashboard),
+        "toggle_item": (toggle_state, toggle),
+    }
+
+
+def time_calls(setup, call, iterations: int, warmup: int) -> dict:
+    state = setup()
+    for _ in range(warmup):
+        call(state)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call(state)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "min_ms": samples[0],
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> dict:
+    """Median ratio per benchmark present in both reports; above 1 + tolerance is a regression."""
+    out = {}
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        status = "slower" if ratio > 1 + tolerance else "faster" if ratio < 1 - tolerance else "same"
+        out[name] = {"baseline_median_ms": old["median_ms"], "median_ms": result["median_ms"],
+                     "ratio": ratio, "status": status}
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--plans", type=int, default=1, help="plans per user")
+    parser.add_argument("--plan-days", type=int, default=28, help=f"1-{MAX_PLAN_DAYS} (the planner form's limit)")
+    parser.add_argument("--storage", choices=["materialized", "virtual"], default="materialized")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", help="comma-separated benchmark names")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="median ratio band treated as unchanged (default 0.10 = +-10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if anything got slower")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    if not 1 <= args.plan_days <= MAX_PLAN_DAYS:
+        parser.error(f"--plan-days must be 1-{MAX_PLAN_DAYS}")
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(DATABASE_URL="sqlite:///" + os.path.join(tmp, "bench.db"), AUTO_CREATE_DB="1")
+        from fitness_app import create_app
+        app = create_app({"WTF_CSRF_ENABLED": False, "PLAN_STORAGE": args.storage, "PLAN_JOB_THREADS": 0})
+
+        start = time.perf_counter()
+        seed(app, args.users, args.plans, args.plan_days, args.storage, rng)
+        seed_seconds = time.perf_counter() - start
+
+        results = {}
+        with app.app_context():
+            suite = benchmarks(app, args.users, args.plan_days, rng)
+            names = args.only.split(",") if args.only else list(suite)
+            unknown = set(names) - set(suite)
+            if unknown:
+                parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+            for name in names:
+                results[name] = time_calls(*suite[name], args.iterations, args.warmup)
+
+    report = {
+        "config": {k: getattr(args, k) for k in ("users", "plans", "plan_days", "storage", "iterations",
+                                                 "warmup", "seed")},
+        "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                        "platform": platform.platform()},
+        "seed_s": seed_seconds,
+        "results": results,
+    }
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(results, json.load(f), args.tolerance)
+        regressed = any(c["status"] == "slower" for c in report["comparison"].values())
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if regressed and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
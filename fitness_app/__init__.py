@@ -3,20 +3,79 @@ from fitness_app.extensions import db, login_manager, csrf
 from fitness_app.auth.routes import auth_bp
 from fitness_app.main.routes import main_bp
 from flask_wtf.csrf import generate_csrf
+from fitness_app.identity_cache import identity_cache
+from fitness_app.db_profile import configure_engine, install_pragmas, init_single_writer
+from fitness_app.event_buffer import init_log_buffer
+from fitness_app.plan_jobs import init_plan_jobs
 
 
 import os
 
-def create_app():
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+def create_app(config: dict | None = None):
     app = Flask(__name__, static_folder="static", template_folder="templates")
 
     # Basic config (use env vars in prod)
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-change-me")
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///fitness.db")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Schema creation/upgrade on boot is a dev convenience; production runs `flask init-db`
+    app.config["AUTO_CREATE_DB"] = _env_flag("AUTO_CREATE_DB", "1")
+    # Load the ML models at startup instead of on the first plan request
+    app.config["WARMUP_MODELS"] = _env_flag("WARMUP_MODELS", "0")
+    # Rendered plan-grid cache: "memory" (per process), "filesystem" (shared) or "none"
+    app.config["FRAGMENT_CACHE_BACKEND"] = os.getenv("FRAGMENT_CACHE_BACKEND", "memory")
+    # flask_login user cache: seconds to trust a cached user row (0 disables) and max users
+    app.config["IDENTITY_CACHE_TTL"] = float(os.getenv("IDENTITY_CACHE_TTL", "30"))
+    app.config["IDENTITY_CACHE_SIZE"] = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+    # SQLite engine tuning (WAL, busy timeout, pool); "off" keeps SQLAlchemy's defaults
+    app.config["SQLITE_PROFILE"] = os.getenv("SQLITE_PROFILE", "production")
+    # Funnel this process's writes through one thread (see db_profile.SingleWriter)
+    app.config["SQLITE_SINGLE_WRITER"] = _env_flag("SQLITE_SINGLE_WRITER", "0")
+    # WorkoutLog rows are written behind the request in batches (event_buffer)
+    app.config["WORKOUT_LOG_ENABLED"] = _env_flag("WORKOUT_LOG_ENABLED", "1")
+    app.config["WORKOUT_LOG_FLUSH_SIZE"] = int(os.getenv("WORKOUT_LOG_FLUSH_SIZE", "200"))
+    app.config["WORKOUT_LOG_FLUSH_INTERVAL"] = float(os.getenv("WORKOUT_LOG_FLUSH_INTERVAL", "2.0"))
+    # "virtual" plans store a seed and write day rows only when a day is first touched
+    app.config["PLAN_STORAGE"] = os.getenv("PLAN_STORAGE", "materialized")
+    # /planner queues a PlanJob and returns at once; PLAN_JOB_THREADS=0 leaves the
+    # queue to `flask plan-worker` processes, PLAN_JOBS_ENABLED=0 generates inline
+    app.config["PLAN_JOBS_ENABLED"] = _env_flag("PLAN_JOBS_ENABLED", "1")
+    app.config["PLAN_JOB_THREADS"] = int(os.getenv("PLAN_JOB_THREADS", "2"))
+    app.config["PLAN_JOB_POLL_INTERVAL"] = float(os.getenv("PLAN_JOB_POLL_INTERVAL", "5.0"))
+    app.config["PLAN_JOB_TIMEOUT"] = float(os.getenv("PLAN_JOB_TIMEOUT", "300"))
+    # python -m fitness_app.prefork: listen address, forked workers x request threads each
+    app.config["WEB_BIND"] = os.getenv("WEB_BIND", "0.0.0.0:8000")
+    app.config["WEB_WORKERS"] = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 2)))
+    app.config["WEB_THREADS"] = int(os.getenv("WEB_THREADS", "8"))
+    app.config["WEB_GRACEFUL_TIMEOUT"] = float(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+    app.config["WEB_MAX_REQUESTS"] = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+    # Per-request cProfile captures: admins send "X-Profile: 1" (or ?_profile=1);
+    # PROFILE_SAMPLE_RATE=N also profiles 1 in N requests. Newest PROFILE_KEEP are kept.
+    app.config["PROFILER_ENABLED"] = _env_flag("PROFILER_ENABLED", "1")
+    app.config["PROFILE_SAMPLE_RATE"] = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    app.config["PROFILE_DIR"] = os.getenv("PROFILE_DIR")   # default: <instance>/profiles
+    app.config["PROFILE_KEEP"] = int(os.getenv("PROFILE_KEEP", "50"))
+    # Prometheus endpoint: loopback clients only, unless METRICS_TOKEN is set (then any
+    # client with "Authorization: Bearer <token>"); METRICS_ENABLED=0 removes it
+    app.config["METRICS_ENABLED"] = _env_flag("METRICS_ENABLED", "1")
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")
+    # Admin dashboard: users per page; stats panels older than this (s) are flagged as stale
+    # (`flask refresh-stats` updates them, e.g. from cron)
+    app.config["ADMIN_PAGE_SIZE"] = int(os.getenv("ADMIN_PAGE_SIZE", "50"))
+    app.config["ADMIN_STATS_MAX_AGE"] = float(os.getenv("ADMIN_STATS_MAX_AGE", "300"))
+    if config:
+        app.config.update(config)
 
     # Init extensions
+    configure_engine(app)
     db.init_app(app)
+    install_pragmas(app)
+    init_single_writer(app)
+    init_log_buffer(app)
+    init_plan_jobs(app)
     login_manager.init_app(app)
     csrf.init_app(app)
 
@@ -24,18 +83,39 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
 
+    from fitness_app.cli import register_cli
+    from fitness_app.fragment_cache import init_fragment_cache
+    from fitness_app.metrics import init_metrics
+    from fitness_app.request_profiler import init_request_profiler
+    register_cli(app)
+    init_fragment_cache(app)
+    init_metrics(app)
+    init_request_profiler(app)
+    identity_cache.configure(app.config["IDENTITY_CACHE_TTL"], app.config["IDENTITY_CACHE_SIZE"])
+
     # Inject CSRF token into all templates
     @app.context_processor
     def inject_csrf_token():
         return dict(csrf_token=generate_csrf())
 
-    # Create DB (dev convenience)
-    with app.app_context():
-        db.create_all()
+    if app.config["AUTO_CREATE_DB"]:
+        from fitness_app.schema import upgrade_schema
+        with app.app_context():
+            upgrade_schema()
+
+    if app.config["WARMUP_MODELS"]:
+        warmup_models()
 
     return app
 
 
+def warmup_models():
+    """Load the models used at request time into the process-wide registry."""
+    from fitness_app import ml_engine, planner
+    planner.get_intensity_predictor()
+    ml_engine.get_fast_model()
+
+
 if __name__ == "__main__":
     app = create_app()
     # Expose to LAN for mobile testing
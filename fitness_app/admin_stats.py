@@ -0,0 +1,182 @@
+"""
+Pre-aggregated plan statistics for the admin dashboard.
+
+AdminStat holds plan and item counters per (goal, intensity, active,
+adherence bucket), so every panel is a GROUP BY over a few dozen rows.
+refresh_admin_stats() keeps it current incrementally: it only reads plans
+that changed since the last refresh (new plans, toggles and nightly scores
+all move an indexed timestamp), the plans they replaced as their user's
+current plan, and, once a day, plans that ended since the last refresh.
+Each plan's last contribution is kept in PlanStatSnapshot, and only the
+difference is applied. Item counts come from the plan counters; no
+WorkoutDay row is read.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, or_, select
+
+from fitness_app.models import MAX_PLAN_DAYS, AdminStat, PlanStatSnapshot, StatsRefresh, WorkoutPlan, db
+
+REFRESH_NAME = "admin_stats"
+# a write that committed just after the previous refresh read the table may carry an
+# earlier timestamp; re-reading a little is harmless (snapshots make it idempotent)
+OVERLAP = timedelta(minutes=1)
+
+Key = Tuple[str, str, bool, int]
+
+
+def adherence_bucket(adherence: Optional[float]) -> int:
+    return -1 if adherence is None else min(max(int(adherence * 10), 0), 9)
+
+
+def _plan_columns():
+    return (WorkoutPlan.id, WorkoutPlan.user_id, WorkoutPlan.goal, WorkoutPlan.intensity, WorkoutPlan.start_date,
+            WorkoutPlan.days, WorkoutPlan.items_total, WorkoutPlan.items_completed, WorkoutPlan.adherence)
+
+
+def _changed_plans(state: Optional[StatsRefresh], today: date, chunk_size: int):
+    """Chunks of plan rows to re-evaluate: all of them on the first run."""
+    query = select(*_plan_columns())
+    if state is not None:
+        since = state.refreshed_at - OVERLAP
+        changed = [WorkoutPlan.updated_at > since, WorkoutPlan.scored_at > since]
+        if state.refreshed_on < today:
+            # plans that may have ended since the last refresh (start_date is indexed)
+            changed.append(WorkoutPlan.start_date > state.refreshed_on - timedelta(days=MAX_PLAN_DAYS))
+        query = query.where(or_(*changed))
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            query.where(WorkoutPlan.id > last_id).order_by(WorkoutPlan.id).limit(chunk_size)).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows
+
+
+def _with_replaced_plans(rows) -> list:
+    """Add plans counted as active whose user has a plan in `rows` (a newer plan replaces them)."""
+    have = {r.id for r in rows}
+    users = {r.user_id for r in rows}
+    extra_ids = db.session.scalars(
+        select(PlanStatSnapshot.plan_id)
+        .where(PlanStatSnapshot.user_id.in_(users), PlanStatSnapshot.active.is_(True))).all()
+    extra_ids = [i for i in extra_ids if i not in have]
+    if extra_ids:
+        rows = list(rows) + db.session.execute(select(*_plan_columns()).where(WorkoutPlan.id.in_(extra_ids))).all()
+    return rows
+
+
+def _snapshot(row, today: date, latest: Dict[int, int]) -> dict:
+    end = row.start_date + timedelta(days=row.days or 0)
+    active = row.start_date <= today < end and latest.get(row.user_id) == row.id
+    return {"plan_id": row.id, "user_id": row.user_id, "goal": row.goal or "", "intensity": row.intensity or "",
+            "active": active, "adherence_bucket": adherence_bucket(row.adherence) if active else -1,
+            "items_total": row.items_total or 0, "items_completed": row.items_completed or 0}
+
+
+def _key(snap) -> Key:
+    if isinstance(snap, dict):
+        return snap["goal"], snap["intensity"], snap["active"], snap["adherence_bucket"]
+    return snap.goal, snap.intensity, snap.active, snap.adherence_bucket
+
+
+def _apply(deltas: Dict[Key, List[int]]):
+    deltas = {k: v for k, v in deltas.items() if any(v)}
+    if not deltas:
+        return
+    existing = {(s.goal, s.intensity, s.active, s.adherence_bucket): s
+                for s in db.session.scalars(select(AdminStat).where(AdminStat.goal.in_({k[0] for k in deltas})))}
+    for key, (plans, total, completed) in deltas.items():
+        stat = existing.get(key)
+        if stat is None:
+            stat = AdminStat(goal=key[0], intensity=key[1], active=key[2], adherence_bucket=key[3],
+                             plans=0, items_total=0, items_completed=0)
+            db.session.add(stat)
+        stat.plans += plans
+        stat.items_total += total
+        stat.items_completed += completed
+
+
+def _refresh_chunk(rows, today: date) -> int:
+    rows = _with_replaced_plans(rows)
+    ids = [r.id for r in rows]
+    latest = dict(db.session.execute(
+        select(WorkoutPlan.user_id, func.max(WorkoutPlan.id))
+        .where(WorkoutPlan.user_id.in_({r.user_id for r in rows})).group_by(WorkoutPlan.user_id)).all())
+    old = {s.plan_id: s for s in db.session.scalars(select(PlanStatSnapshot).where(PlanStatSnapshot.plan_id.in_(ids)))}
+    deltas: Dict[Key, List[int]] = defaultdict(lambda: [0, 0, 0])
+    new = []
+    for row in rows:
+        snap = _snapshot(row, today, latest)
+        prev = old.get(row.id)
+        if prev is not None:
+            if (_key(prev) == _key(snap) and prev.items_total == snap["items_total"]
+                    and prev.items_completed == snap["items_completed"]):
+                continue
+            d = deltas[_key(prev)]
+            d[0] -= 1
+            d[1] -= prev.items_total
+            d[2] -= prev.items_completed
+        d = deltas[_key(snap)]
+        d[0] += 1
+        d[1] += snap["items_total"]
+        d[2] += snap["items_completed"]
+        new.append(snap)
+    if new:
+        db.session.execute(delete(PlanStatSnapshot).where(PlanStatSnapshot.plan_id.in_([s["plan_id"] for s in new])))
+        db.session.execute(insert(PlanStatSnapshot), new)
+    _apply(deltas)
+    return len(new)
+
+
+def refresh_admin_stats(today: Optional[date] = None, chunk_size: int = 5000, full: bool = False) -> int:
+    """Bring AdminStat up to date; returns the number of plans whose contribution changed."""
+    today = today or date.today()
+    started = datetime.utcnow()
+    if full:
+        db.session.execute(delete(AdminStat))
+        db.session.execute(delete(PlanStatSnapshot))
+        db.session.execute(delete(StatsRefresh).where(StatsRefresh.name == REFRESH_NAME))
+        db.session.commit()
+    state = db.session.get(StatsRefresh, REFRESH_NAME)
+    changed = 0
+    for rows in _changed_plans(state, today, chunk_size):
+        changed += _refresh_chunk(rows, today)
+        # each chunk is consistent on its own; an interrupted refresh resumes from the old watermark
+        db.session.commit()
+    state = db.session.get(StatsRefresh, REFRESH_NAME) or StatsRefresh(name=REFRESH_NAME)
+    state.refreshed_at, state.refreshed_on = started, today
+    db.session.add(state)
+    db.session.commit()
+    return changed
+
+
+def refreshed_at() -> Optional[datetime]:
+    state = db.session.get(StatsRefresh, REFRESH_NAME)
+    return state.refreshed_at if state else None
+
+
+def dashboard_stats() -> dict:
+    """Panels for the admin dashboard, read from AdminStat only."""
+    by_plan_type = []
+    for goal, intensity, plans, active, total, completed in db.session.execute(
+            select(AdminStat.goal, AdminStat.intensity, func.sum(AdminStat.plans),
+                   func.sum(AdminStat.plans).filter(AdminStat.active.is_(True)),
+                   func.sum(AdminStat.items_total), func.sum(AdminStat.items_completed))
+            .group_by(AdminStat.goal, AdminStat.intensity).order_by(AdminStat.goal, AdminStat.intensity)):
+        if not plans:
+            continue
+        by_plan_type.append({"goal": goal or "-", "intensity": intensity or "-", "plans": plans,
+                             "active": active or 0, "completion_rate": completed / total if total else None})
+    buckets = dict(db.session.execute(
+        select(AdminStat.adherence_bucket, func.sum(AdminStat.plans))
+        .where(AdminStat.active.is_(True)).group_by(AdminStat.adherence_bucket)).all())
+    active = sum(buckets.values())
+    adherence = [{"label": f"{b * 10}-{b * 10 + 10}%" if b >= 0 else "not scored", "plans": buckets.get(b, 0),
+                  "share": buckets.get(b, 0) / active if active else 0.0}
+                 for b in list(range(10)) + [-1]]
+    return {"active_plans": active, "total_plans": sum(r["plans"] for r in by_plan_type),
+            "by_plan_type": by_plan_type, "adherence": adherence, "refreshed_at": refreshed_at()}
@@ -0,0 +1,97 @@
+"""
+Versioned model artifacts.
+
+    artifacts/<name>/<version>/model.joblib, model.npz (single trees), metadata.json
+    artifacts/<name>/current -> <version>      (symlink)
+
+A version directory is written under a temporary name and renamed into place,
+and `current` is switched with os.replace on a new symlink, so readers always
+see a complete version. Paths are resolved through `current`, which changes
+their mtime and makes the model registry reload them.
+"""
+import json
+import os
+import shutil
+import time
+from typing import Callable, Dict, List, Optional
+
+ARTIFACT_ROOT = os.getenv("MODEL_ARTIFACT_DIR",
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts"))
+METADATA = "metadata.json"
+
+
+def model_dir(name: str) -> str:
+    return os.path.join(ARTIFACT_ROOT, name)
+
+
+def current_path(name: str, filename: str) -> str:
+    return os.path.join(model_dir(name), "current", filename)
+
+
+def current_version(name: str) -> Optional[str]:
+    try:
+        return os.path.basename(os.readlink(os.path.join(model_dir(name), "current")))
+    except OSError:
+        return None
+
+
+def list_versions(name: str) -> List[str]:
+    try:
+        entries = os.listdir(model_dir(name))
+    except FileNotFoundError:
+        return []
+    return sorted(e for e in entries
+                  if not e.startswith(".") and e != "current"
+                  and os.path.isfile(os.path.join(model_dir(name), e, METADATA)))
+
+
+def read_metadata(name: str, version: Optional[str] = None) -> Optional[dict]:
+    path = os.path.join(model_dir(name), version or "current", METADATA)
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def write_version(name: str, files: Dict[str, Callable[[str], None]], metadata: dict,
+                  version: Optional[str] = None) -> str:
+    """
+    files: {filename: writer(path)}. Writes them plus metadata.json into a new
+    version directory and returns the version (not promoted yet).
+    """
+    base = model_dir(name)
+    os.makedirs(base, exist_ok=True)
+    if version is None:
+        stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        version, n = stamp, 1
+        while os.path.exists(os.path.join(base, version)):
+            n += 1
+            version = f"{stamp}-{n}"
+    final = os.path.join(base, version)
+    if os.path.exists(final):
+        raise FileExistsError(final)
+    tmp = os.path.join(base, f".tmp-{version}-{os.getpid()}")
+    os.makedirs(tmp)
+    try:
+        for filename, writer in files.items():
+            writer(os.path.join(tmp, filename))
+        with open(os.path.join(tmp, METADATA), "w", encoding="utf-8") as fh:
+            json.dump(dict(metadata, name=name, version=version), fh, indent=2, sort_keys=True)
+        os.rename(tmp, final)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return version
+
+
+def promote(name: str, version: str):
+    """Atomically point `current` at `version`."""
+    base = model_dir(name)
+    if not os.path.isfile(os.path.join(base, version, METADATA)):
+        raise FileNotFoundError(f"{name} has no version {version}")
+    link = os.path.join(base, f".current-{os.getpid()}")
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(version, link)
+    os.replace(link, os.path.join(base, "current"))
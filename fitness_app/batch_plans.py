@@ -0,0 +1,166 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import insert, select, update
+
+from fitness_app.models import MAX_PLAN_DAYS, User, WorkoutDay, WorkoutPlan, db
+from fitness_app.planner import (BANKS, GENERATOR_VERSION, build_day_rows, get_intensity_predictor,
+                                 seeded_day_items, virtual_items_total)
+
+INTENSITIES = ["Low", "Medium", "High"]
+
+
+def _plan_day_rows(job) -> List[dict]:
+    """Process-pool worker: day rows for one plan. Must stay a module-level function."""
+    plan_id, start, days, intensity, goal, seed = job
+    return build_day_rows(plan_id, start, days, intensity, goal, random.Random(seed))
+
+
+def _virtual_total(job) -> int:
+    """Process-pool worker: items_total of a virtual plan."""
+    plan_seed, days, intensity, goal = job
+    return virtual_items_total(plan_seed, days, intensity, goal, GENERATOR_VERSION)
+
+
+def _intensities(bmis: List[Optional[float]]) -> List[str]:
+    """Predict all intensities of a chunk in one vectorized call."""
+    import numpy as np
+    known = [i for i, b in enumerate(bmis) if b is not None]
+    out = ["Medium"] * len(bmis)
+    if known:
+        X = np.array([[bmis[i]] for i in known], dtype=float)
+        for i, pred in zip(known, get_intensity_predictor().predict(X)):
+            out[i] = INTENSITIES[int(pred)]
+    return out
+
+
+def _user_chunks(user_ids: Optional[Iterable[int]], chunk_size: int):
+    """Yield lists of (id, bmi), walking the user table by primary key."""
+    if user_ids is not None:
+        ids = sorted(set(user_ids))
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            yield db.session.execute(
+                select(User.id, User.bmi).where(User.id.in_(chunk)).order_by(User.id)).all()
+        return
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(User.id, User.bmi).where(User.id > last_id).order_by(User.id).limit(chunk_size)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def generate_plans_bulk(days: int = 28, goal: str = "Weight Loss", source: str = "AI",
+                        user_ids: Optional[Iterable[int]] = None, chunk_size: int = 500,
+                        workers: int = 1, seed: Optional[int] = None, progress=None,
+                        storage: str = "materialized") -> int:
+    """
+    Create a new plan for every user (or just `user_ids`).
+
+    Each chunk of users is one transaction: plans are inserted with one
+    executemany, their days are generated (in a process pool when workers > 1)
+    and written with a second executemany. With storage="virtual" only the
+    plans (and their seeds) are written. Returns the number of plans created.
+    """
+    if goal not in BANKS:
+        raise ValueError(f"Unknown goal: {goal}")
+    if not 1 <= days <= MAX_PLAN_DAYS:
+        raise ValueError(f"Plan length must be 1-{MAX_PLAN_DAYS} days, got {days}")
+    if storage not in ("materialized", "virtual"):
+        raise ValueError(f"Unknown plan storage: {storage}")
+    rng = random.Random(seed)
+    start = date.today()
+    created = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for users in _user_chunks(user_ids, chunk_size):
+            intensities = _intensities([u.bmi for u in users])
+            plan_rows = [
+                {"user_id": u.id, "start_date": start, "days": days, "source": source,
+                 "intensity": intensity, "goal": goal, "storage": storage, "generator_version": GENERATOR_VERSION}
+                for u, intensity in zip(users, intensities)
+            ]
+            if storage == "virtual":
+                for row in plan_rows:
+                    row["seed"] = rng.getrandbits(31)
+                jobs = [(row["seed"], days, row["intensity"], goal) for row in plan_rows]
+                totals = pool.map(_virtual_total, jobs, chunksize=max(1, len(jobs) // (workers * 4))) \
+                    if pool is not None else map(_virtual_total, jobs)
+                for row, total in zip(plan_rows, totals):
+                    row["items_total"] = total
+                db.session.execute(insert(WorkoutPlan), plan_rows)
+                db.session.commit()
+                created += len(plan_rows)
+                if progress:
+                    progress(created)
+                continue
+            plan_ids = db.session.scalars(
+                insert(WorkoutPlan).returning(WorkoutPlan.id, sort_by_parameter_order=True),
+                plan_rows).all()
+            jobs = [(plan_id, start, days, row["intensity"], goal, rng.getrandbits(64))
+                    for plan_id, row in zip(plan_ids, plan_rows)]
+            if pool is not None:
+                chunks = pool.map(_plan_day_rows, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+            else:
+                chunks = map(_plan_day_rows, jobs)
+            day_rows, totals = [], []
+            for plan_id, chunk in zip(plan_ids, chunks):
+                day_rows.extend(chunk)
+                totals.append({"id": plan_id, "items_total": sum(r["item_count"] for r in chunk)})
+            db.session.execute(insert(WorkoutDay), day_rows)
+            db.session.execute(update(WorkoutPlan), totals)
+            db.session.commit()
+            created += len(plan_ids)
+            if progress:
+                progress(created)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return created
+
+
+def materialize_virtual_plans(generator: Optional[int] = None, chunk_size: int = 200, progress=None) -> int:
+    """
+    Write every untouched day of virtual plans (only those of `generator`, if
+    given) as WorkoutDay rows and mark the plans materialized, so that their days
+    no longer depend on that generator. Returns the number of plans converted.
+    """
+    query = select(WorkoutPlan.id, WorkoutPlan.start_date, WorkoutPlan.days, WorkoutPlan.intensity,
+                   WorkoutPlan.goal, WorkoutPlan.seed, WorkoutPlan.generator_version).where(
+        WorkoutPlan.storage == "virtual")
+    if generator is not None:
+        query = query.where(WorkoutPlan.generator_version == generator)
+    converted = 0
+    last_id = 0
+    while True:
+        plans = db.session.execute(
+            query.where(WorkoutPlan.id > last_id).order_by(WorkoutPlan.id).limit(chunk_size)).all()
+        if not plans:
+            return converted
+        last_id = plans[-1].id
+        stored = set(db.session.execute(
+            select(WorkoutDay.plan_id, WorkoutDay.day_index)
+            .where(WorkoutDay.plan_id.in_([p.id for p in plans]))).all())
+        rows = []
+        for p in plans:
+            for i in range(p.days or 0):
+                if (p.id, i) not in stored:
+                    items = seeded_day_items(p.seed, i, p.intensity, p.goal, p.generator_version)
+                    rows.append({"plan_id": p.id, "day_index": i, "date": p.start_date + timedelta(days=i),
+                                 "items": items, "item_count": len(items), "completed_mask": 0,
+                                 "completed_count": 0})
+        if rows:
+            db.session.execute(insert(WorkoutDay), rows)
+        db.session.execute(update(WorkoutPlan), [{"id": p.id, "storage": "materialized"} for p in plans])
+        db.session.commit()
+        converted += len(plans)
+        if progress:
+            progress(converted)
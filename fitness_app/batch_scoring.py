@@ -0,0 +1,168 @@
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy import and_, case, exists, func, literal, or_, select, update
+from sqlalchemy.orm import aliased
+
+from fitness_app import artifacts
+from fitness_app.ml_engine import FEATURE_COLS, GOALS, success_proba
+from fitness_app.models import User, WorkoutDay, WorkoutPlan, db
+from fitness_app.planner import preset_volume
+from fitness_app.training import impute, imputation_values
+
+INTENSITIES = ["Low", "Medium", "High"]
+REPS_PER_SET = 8   # make_day's constant
+
+
+def _code(column, labels):
+    """SQL CASE mapping string values to the numeric codes the models were trained on (NULL if unknown)."""
+    return case({label: i for i, label in enumerate(labels)}, value=column, else_=None)
+
+
+def _by_intensity(column, pick):
+    return case({k: pick(preset_volume(k)) for k in INTENSITIES}, value=column,
+                else_=pick(preset_volume("Medium")))
+
+
+def feature_columns():
+    """
+    One SQL expression per FEATURE_COLS entry, in order; plan_adherence_rate is replaced later.
+    Optional profile fields and unknown categories come back as NULL.
+    """
+    bmi = func.coalesce(User.bmi, User.weight_kg / ((User.height_cm / 100.0) * (User.height_cm / 100.0)))
+    return [
+        User.age,
+        _code(User.gender, ["Female", "Male"]),
+        User.height_cm,
+        User.weight_kg,
+        bmi,
+        _code(User.fitness_level, ["Beginner", "Intermediate", "Advanced"]),
+        _code(WorkoutPlan.goal, GOALS),
+        WorkoutPlan.days,
+        _code(WorkoutPlan.intensity, INTENSITIES),
+        _by_intensity(WorkoutPlan.intensity, lambda v: v[1]),        # sets per exercise
+        literal(REPS_PER_SET),
+        _by_intensity(WorkoutPlan.intensity, lambda v: v[2]),        # cardio minutes
+        _by_intensity(WorkoutPlan.intensity, lambda v: v[0] + 1),    # strength moves + cardio
+        User.previous_success_rate,
+        _code(User.previous_goal, GOALS),
+        User.plan_adherence_rate,
+        User.user_rating,
+    ]
+
+
+ADHERENCE = FEATURE_COLS.index("plan_adherence_rate")
+ADHERENCE_DAYS = 14     # plan_adherence_rate looks at the plan's first two weeks
+
+
+def _latest_plans():
+    """Only each user's newest plan (the one the dashboard shows)."""
+    newer = aliased(WorkoutPlan)
+    return ~exists().where(newer.user_id == WorkoutPlan.user_id, newer.id > WorkoutPlan.id)
+
+
+def _plan_chunks(chunk_size: int, today: date) -> Iterator[list]:
+    meta = [WorkoutPlan.id, WorkoutPlan.start_date, WorkoutPlan.days, WorkoutPlan.storage,
+            WorkoutPlan.items_total, WorkoutPlan.success_proba]
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*meta, *feature_columns())
+            .join(User, User.id == WorkoutPlan.user_id)
+            .where(WorkoutPlan.id > last_id, WorkoutPlan.start_date <= today, _latest_plans())
+            .order_by(WorkoutPlan.id).limit(chunk_size)).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def plan_adherence(rows, today: date, fallback: np.ndarray) -> np.ndarray:
+    """
+    The plan_adherence_rate feature: completed / scheduled items over the plan's
+    first ADHERENCE_DAYS days that are over by `today`, from WorkoutDay. rows
+    start with (id, start_date, days, storage, items_total). Untouched days of
+    virtual plans have no row; their share of items_total is counted as
+    scheduled and not completed. Plans without a finished day keep `fallback`
+    (the user's stored plan_adherence_rate).
+
+    Scoring evaluates it at today; feedback rows (retraining.harvest_outcomes)
+    at the plan's end, i.e. over the full window. The window keeps the feature
+    from covering the whole plan, whose completion is the training label.
+    """
+    ids = [r[0] for r in rows]
+    sums = dict(
+        (plan_id, (done or 0, items or 0, n))
+        for plan_id, done, items, n in db.session.execute(
+            select(WorkoutDay.plan_id, func.sum(WorkoutDay.completed_count), func.sum(WorkoutDay.item_count),
+                   func.count())
+            .where(WorkoutDay.plan_id.in_(ids), WorkoutDay.date < today, WorkoutDay.day_index < ADHERENCE_DAYS)
+            .group_by(WorkoutDay.plan_id)))
+    out = fallback.copy()
+    for i, (plan_id, start, days, storage, items_total) in enumerate(r[:5] for r in rows):
+        elapsed = min(max((today - start).days, 0), days or 0, ADHERENCE_DAYS)
+        if elapsed == 0:
+            continue
+        done, items, n = sums.get(plan_id, (0, 0, 0))
+        if storage == "virtual" and items_total and days:
+            # per-day average for the days that were never materialized
+            items += (elapsed - n) * items_total / days
+        if items:
+            out[i] = min(done / items, 1.0)
+    return out
+
+
+def score_active_plans(chunk_size: int = 5000, today: Optional[date] = None, progress=None) -> int:
+    """
+    Score every user's current (started, not yet finished) plan. Each chunk is one
+    feature-matrix query, one day-aggregate query, one vectorized predict_proba
+    and one executemany UPDATE. Missing features (NULL) are imputed with the
+    medians the current model was trained with, never left to the trees.
+    Returns the number of plans scored.
+    """
+    today = today or date.today()
+    medians = imputation_values(artifacts.read_metadata("plan_success"))
+    scored = 0
+    for rows in _plan_chunks(chunk_size, today):
+        finished = [r[0] for r in rows if (today - r[1]).days >= (r[2] or 0) and r[5] is not None]
+        if finished:
+            # off the at-risk list once the plan is over
+            db.session.execute(update(WorkoutPlan), [{"id": i, "success_proba": None} for i in finished])
+        rows = [r for r in rows if (today - r[1]).days < (r[2] or 0)]
+        if not rows:
+            db.session.commit()
+            continue
+        X = np.array([r[6:] for r in rows], dtype=float)   # NULL -> nan
+        adherence = plan_adherence(rows, today, X[:, ADHERENCE])
+        X[:, ADHERENCE] = adherence
+        proba = success_proba(impute(X, medians))
+        now = datetime.utcnow()
+        # plain column update: version/updated_at stay untouched so page caches stay valid
+        db.session.execute(update(WorkoutPlan), [
+            {"id": r[0], "success_proba": float(p), "adherence": float(a) if a == a else None, "scored_at": now}
+            for r, p, a in zip(rows, proba, adherence)])
+        db.session.commit()
+        scored += len(rows)
+        if progress:
+            progress(scored)
+    return scored
+
+
+def at_risk_plans(threshold: float = 0.5, limit: int = 100, after: Optional[tuple] = None) -> List[dict]:
+    """
+    Lowest-probability current plans first. `after` is the (success_proba, plan_id)
+    of the last row of the previous page (keyset pagination over the proba index).
+    """
+    query = (select(WorkoutPlan.id, WorkoutPlan.success_proba, WorkoutPlan.adherence, WorkoutPlan.scored_at,
+                    WorkoutPlan.goal, WorkoutPlan.start_date, WorkoutPlan.days,
+                    User.id.label("user_id"), User.username, User.email)
+             .join(User, User.id == WorkoutPlan.user_id)
+             .where(WorkoutPlan.success_proba < threshold, _latest_plans())
+             .order_by(WorkoutPlan.success_proba, WorkoutPlan.id)
+             .limit(limit))
+    if after is not None:
+        proba, plan_id = after
+        query = query.where(or_(WorkoutPlan.success_proba > proba,
+                                and_(WorkoutPlan.success_proba == proba, WorkoutPlan.id > plan_id)))
+    return [dict(row._mapping) for row in db.session.execute(query)]
@@ -0,0 +1,175 @@
+import click
+from flask import Flask
+
+from fitness_app.models import MAX_PLAN_DAYS
+
+
+def register_cli(app: Flask):
+    """Flask CLI commands, e.g. `flask --app fitness_app init-db`."""
+
+    @app.cli.command("init-db")
+    def init_db():
+        """Create missing tables/columns and backfill data for new columns."""
+        from fitness_app.schema import upgrade_schema
+        for change in upgrade_schema():
+            click.echo(change)
+        click.echo("Database schema is up to date.")
+
+    @app.cli.command("warmup")
+    def warmup():
+        """Load the ML models once (trains them if the artifacts are missing)."""
+        from fitness_app import warmup_models
+        from fitness_app.model_registry import registry
+        warmup_models()
+        for name, stats in registry.stats().items():
+            if stats["loaded"]:
+                click.echo(f"{name}: {stats['path']}")
+
+    @app.cli.command("score-plans")
+    @click.option("--chunk-size", default=5000, show_default=True, help="Plans per query/transaction.")
+    def score_plans(chunk_size):
+        """Store the predicted success probability of every current plan (run nightly)."""
+        from fitness_app.batch_scoring import score_active_plans
+        scored = score_active_plans(chunk_size=chunk_size, progress=lambda n: click.echo(f"{n} plans scored"))
+        click.echo(f"Done: {scored} plans.")
+
+    @app.cli.command("at-risk")
+    @click.option("--threshold", default=0.5, show_default=True, help="Plans below this success probability.")
+    @click.option("--limit", default=100, show_default=True)
+    def at_risk(threshold, limit):
+        """Print current plans least likely to succeed (tab-separated)."""
+        from fitness_app.batch_scoring import at_risk_plans
+        click.echo("user_id\tusername\temail\tplan_id\tsuccess_proba\tadherence")
+        for r in at_risk_plans(threshold, limit):
+            adherence = "" if r["adherence"] is None else f"{r['adherence']:.2f}"
+            click.echo(f"{r['user_id']}\t{r['username']}\t{r['email']}\t{r['id']}\t{r['success_proba']:.3f}\t{adherence}")
+
+    @app.cli.command("export")
+    @click.argument("kind", type=click.Choice(["plans", "days", "logs"]))
+    @click.option("--format", "fmt", default="ndjson", show_default=True, type=click.Choice(["ndjson", "csv"]))
+    @click.option("--user-id", type=int)
+    @click.option("--since", type=click.DateTime(["%Y-%m-%d"]), help="First date included.")
+    @click.option("--until", type=click.DateTime(["%Y-%m-%d"]), help="Last date included.")
+    @click.option("--goal")
+    @click.option("--output", type=click.File("w", encoding="utf-8"), default="-", help="Default: stdout.")
+    @click.option("--chunk-size", default=1000, show_default=True, help="Rows fetched per round trip.")
+    def export_cmd(kind, fmt, user_id, since, until, goal, output, chunk_size):
+        """Stream plans, days or workout logs as NDJSON or CSV (constant memory)."""
+        from fitness_app.export import encode, export_rows
+        rows = export_rows(kind, user_id=user_id, since=since.date() if since else None,
+                           until=until.date() if until else None, goal=goal, chunk_size=chunk_size)
+        for chunk in encode(kind, rows, fmt):
+            output.write(chunk)
+
+    @app.cli.command("refresh-stats")
+    @click.option("--full", is_flag=True, help="Rebuild from scratch instead of applying changes.")
+    @click.option("--chunk-size", default=5000, show_default=True)
+    def refresh_stats(full, chunk_size):
+        """Update the admin dashboard's summary table (incremental; run from cron)."""
+        from fitness_app.admin_stats import refresh_admin_stats
+        changed = refresh_admin_stats(chunk_size=chunk_size, full=full)
+        click.echo(f"{changed} plans updated.")
+
+    @app.cli.command("retrain")
+    @click.option("--mode", default="auto", show_default=True, type=click.Choice(["auto", "full", "incremental"]),
+                  help="auto: add trees to a forest when possible, else retrain on CSV + feedback.")
+    @click.option("--min-improvement", default=0.0, show_default=True,
+                  help="Holdout ROC AUC (or accuracy) the candidate must gain to be promoted.")
+    @click.option("--add-trees", default=20, show_default=True, help="Trees added per incremental update.")
+    @click.option("--n-jobs", type=int)
+    @click.option("--no-harvest", is_flag=True, help="Don't collect newly finished plans first.")
+    @click.option("--no-promote", is_flag=True)
+    @click.option("--force", is_flag=True, help="Retrain even without new feedback.")
+    def retrain_cmd(mode, min_improvement, add_trees, n_jobs, no_harvest, no_promote, force):
+        """Daily plan-success refresh from finished plans (harvest, retrain, promote if better)."""
+        from fitness_app.retraining import harvest_outcomes, retrain
+        if not no_harvest:
+            click.echo(f"{harvest_outcomes()} finished plans harvested")
+        report = retrain(mode=mode, min_improvement=min_improvement, add_trees=add_trees, n_jobs=n_jobs,
+                         promote=not no_promote, force=force)
+        for key, value in report.items():
+            click.echo(f"{key}: {value}")
+        if report["status"] == "compiled mismatch":
+            raise SystemExit(1)
+
+    @app.cli.command("train-model")
+    @click.option("--target", default="plan_success", show_default=True,
+                  type=click.Choice(["plan_success", "intensity"]))
+    @click.option("--estimator", default="tree", show_default=True,
+                  type=click.Choice(["tree", "forest", "extra_trees"]))
+    @click.option("--csv", "csv_path", help="Training data (default: the bundled fitness_dataset.csv).")
+    @click.option("--n-jobs", type=int, help="Parallel tree building for forests (-1: all cores).")
+    @click.option("--n-estimators", default=100, show_default=True)
+    @click.option("--max-depth", type=int, help="Default: the depth of the shipped tree.")
+    @click.option("--holdout", default=0.2, show_default=True, help="Fraction of rows kept for metrics.")
+    @click.option("--chunk-size", default=200_000, show_default=True, help="CSV rows read at a time.")
+    @click.option("--no-promote", is_flag=True, help="Write the version without making it current.")
+    def train_model_cmd(target, estimator, csv_path, n_jobs, n_estimators, max_depth, holdout, chunk_size,
+                        no_promote):
+        """Train a model and store it as a new artifact version."""
+        from fitness_app.training import DATASET_PATH, train_model
+        _, meta = train_model(target, estimator, csv_path or DATASET_PATH, n_jobs=n_jobs, max_depth=max_depth,
+                              n_estimators=n_estimators, holdout=holdout, chunksize=chunk_size,
+                              promote=not no_promote)
+        click.echo(f"{target} {meta['version']}: {meta['dataset']['rows']} rows, "
+                   f"trained in {meta['train_seconds']}s, metrics {meta['metrics']}")
+        click.echo("promoted to current" if not no_promote else "not promoted")
+
+    @app.cli.command("list-models")
+    @click.option("--promote", nargs=2, metavar="TARGET VERSION", help="Make VERSION current (e.g. to roll back).")
+    def list_models(promote):
+        """Show stored artifact versions and their holdout metrics."""
+        from fitness_app import artifacts
+        if promote:
+            artifacts.promote(*promote)
+        for target in ("plan_success", "intensity"):
+            current = artifacts.current_version(target)
+            for version in artifacts.list_versions(target):
+                meta = artifacts.read_metadata(target, version)
+                mark = "*" if version == current else " "
+                click.echo(f"{mark} {target} {version} {meta['estimator']} rows={meta['dataset']['rows']} "
+                           f"{meta['metrics']}")
+
+    @app.cli.command("plan-worker")
+    @click.option("--threads", default=1, show_default=True, help="Jobs processed concurrently.")
+    @click.option("--once", is_flag=True, help="Drain the queue and exit.")
+    def plan_worker(threads, once):
+        """Process queued /planner jobs (run web workers with PLAN_JOB_THREADS=0)."""
+        from fitness_app.plan_jobs import PlanJobWorker, serve_forever
+        # this thread is one of the workers
+        worker = PlanJobWorker(app, threads=threads - 1, poll_interval=app.config["PLAN_JOB_POLL_INTERVAL"],
+                               timeout=app.config["PLAN_JOB_TIMEOUT"])
+        if once:
+            click.echo(f"{worker.run_pending()} jobs processed.")
+            return
+        worker.wake()
+        serve_forever(worker)
+
+    @app.cli.command("generate-plans")
+    @click.option("--days", default=28, show_default=True, type=click.IntRange(1, MAX_PLAN_DAYS))
+    @click.option("--goal", default="Weight Loss", show_default=True,
+                  type=click.Choice(["Weight Loss", "Muscle Gain", "Endurance"]))
+    @click.option("--user-id", "user_ids", multiple=True, type=int, help="Only these users (repeatable).")
+    @click.option("--chunk-size", default=500, show_default=True, help="Users per transaction.")
+    @click.option("--workers", default=1, show_default=True, help="Processes generating day items.")
+    @click.option("--seed", type=int, help="Make the generated items reproducible.")
+    @click.option("--storage", default="materialized", show_default=True,
+                  type=click.Choice(["materialized", "virtual"]),
+                  help="virtual: store only a seed per plan, days are generated when viewed.")
+    def generate_plans(days, goal, user_ids, chunk_size, workers, seed, storage):
+        """Generate a new plan for every user (e.g. at the start of a cohort)."""
+        from fitness_app.batch_plans import generate_plans_bulk
+        created = generate_plans_bulk(
+            days=days, goal=goal, user_ids=user_ids or None, chunk_size=chunk_size,
+            workers=workers, seed=seed, storage=storage, progress=lambda n: click.echo(f"{n} plans created"))
+        click.echo(f"Done: {created} plans.")
+
+    @app.cli.command("materialize-plans")
+    @click.option("--generator", type=int, help="Only virtual plans generated with this version.")
+    @click.option("--chunk-size", default=200, show_default=True, help="Plans per transaction.")
+    def materialize_plans(generator, chunk_size):
+        """Write out the days of virtual plans (before retiring a day generator)."""
+        from fitness_app.batch_plans import materialize_virtual_plans
+        converted = materialize_virtual_plans(generator=generator, chunk_size=chunk_size,
+                                              progress=lambda n: click.echo(f"{n} plans materialized"))
+        click.echo(f"Done: {converted} plans.")
@@ -0,0 +1,134 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+from flask import Flask, current_app
+from sqlalchemy import event
+
+from fitness_app.extensions import db
+
+# PRAGMAs applied to every new SQLite connection by the "production" profile.
+PRODUCTION_PRAGMAS = {
+    "SQLITE_JOURNAL_MODE": "WAL",        # readers don't block the writer and vice versa
+    "SQLITE_SYNCHRONOUS": "NORMAL",      # safe with WAL, far fewer fsyncs than FULL
+    "SQLITE_BUSY_TIMEOUT_MS": 5000,      # wait for the write lock instead of failing with "database is locked"
+    "SQLITE_CACHE_SIZE_KB": 20000,       # page cache per connection
+    "SQLITE_MMAP_SIZE": 256 * 1024 * 1024,
+}
+
+
+def _is_file_sqlite(uri: str) -> bool:
+    return uri.startswith("sqlite") and ":memory:" not in uri and uri.rstrip("/") not in ("sqlite:", "sqlite:/")
+
+
+def configure_engine(app: Flask):
+    """
+    Apply the SQLITE_PROFILE ("production" by default, "off" keeps SQLAlchemy's defaults).
+    Must run before db.init_app(); each PRAGMA can be overridden through app.config.
+    """
+    if app.config.get("SQLITE_PROFILE", "production") != "production":
+        return
+    if not _is_file_sqlite(app.config["SQLALCHEMY_DATABASE_URI"]):
+        return
+    for key, value in PRODUCTION_PRAGMAS.items():
+        app.config.setdefault(key, value)
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    options.setdefault("pool_size", app.config.get("SQLITE_POOL_SIZE", 10))
+    options.setdefault("max_overflow", app.config.get("SQLITE_MAX_OVERFLOW", 20))
+    options.setdefault("pool_timeout", 30)
+    connect_args = options.setdefault("connect_args", {})
+    # pooled connections move between request threads
+    connect_args.setdefault("check_same_thread", False)
+    connect_args.setdefault("timeout", app.config["SQLITE_BUSY_TIMEOUT_MS"] / 1000)
+
+
+def install_pragmas(app: Flask):
+    """Register the connect hook on this app's engine (call after db.init_app)."""
+    if "SQLITE_JOURNAL_MODE" not in app.config:
+        return
+    pragmas = [
+        f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA cache_size=-{int(app.config['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+    def on_connect(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, "connect", on_connect)
+
+
+class SingleWriter:
+    """
+    Runs write functions one at a time on a dedicated thread, each in a fresh
+    app context and session, so threads of this process never contend for
+    SQLite's write lock. Reads stay on the request threads.
+
+    The function must commit its own work. The thread starts lazily and is
+    restarted after a fork.
+    """
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        q = self._queue
+        while True:
+            future, fn, args, kwargs = q.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self.app.app_context():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as exc:
+                    db.session.rollback()
+                    future.set_exception(exc)
+                finally:
+                    db.session.remove()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        self._ensure_thread()
+        future: Future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def run(self, fn: Callable, *args, **kwargs):
+        return self.submit(fn, *args, **kwargs).result(timeout=self.app.config.get("SQLITE_WRITER_TIMEOUT", 30))
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+
+def init_single_writer(app: Flask):
+    if app.config.get("SQLITE_SINGLE_WRITER"):
+        app.extensions["single_writer"] = SingleWriter(app)
+
+
+def run_write(fn: Callable, *args, **kwargs):
+    """Run a committing write function, through the single-writer queue if enabled."""
+    writer = current_app.extensions.get("single_writer")
+    if writer is None:
+        return fn(*args, **kwargs)
+    return writer.run(fn, *args, **kwargs)
@@ -0,0 +1,140 @@
+import atexit
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import List
+
+from flask import Flask, current_app
+from sqlalchemy import insert
+
+from fitness_app.extensions import db
+from fitness_app.models import WorkoutLog
+
+
+class WriteBehindBuffer:
+    """
+    Collects WorkoutLog rows in memory and writes them in batches from a
+    background thread: when `flush_size` rows are queued, every
+    `flush_interval` seconds, and on shutdown. Requests never wait on the
+    INSERT. Rows still queued when the process is killed are lost; if more
+    than `max_queue` rows pile up (e.g. the database is down), the oldest
+    ones are dropped and counted.
+    """
+
+    def __init__(self, app: Flask, flush_size: int = 200, flush_interval: float = 2.0,
+                 max_queue: int = 100000):
+        self.app = app
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._rows: deque = deque(maxlen=max_queue)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        self.flushed = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                # first use, or first use after a fork (threads don't survive fork)
+                self._pid = os.getpid()
+                self._wake = threading.Event()
+                self._thread = threading.Thread(target=self._loop, name="workout-log-flusher", daemon=True)
+                self._thread.start()
+
+    def record(self, **row):
+        row.setdefault("timestamp", datetime.utcnow())
+        self._ensure_thread()
+        with self._lock:
+            if len(self._rows) == self._rows.maxlen:
+                self.dropped += 1
+            self._rows.append(row)
+            full = len(self._rows) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def depth(self) -> int:
+        return len(self._rows)
+
+    def _loop(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _take(self) -> List[dict]:
+        with self._lock:
+            rows = list(self._rows)
+            self._rows.clear()
+        return rows
+
+    def _requeue(self, rows: List[dict]):
+        with self._lock:
+            combined = rows + list(self._rows)
+            overflow = len(combined) - self._rows.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+                combined = combined[overflow:]
+            self._rows.clear()
+            self._rows.extend(combined)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            rows = self._take()
+            if not rows:
+                return 0
+            try:
+                with self.app.app_context():
+                    writer = self.app.extensions.get("single_writer")
+                    if writer is not None:
+                        writer.run(_insert_logs, rows)
+                    else:
+                        try:
+                            _insert_logs(rows)
+                        finally:
+                            db.session.remove()
+            except Exception:
+                self.errors += 1
+                self.app.logger.exception("Flushing %d workout log rows failed; requeued", len(rows))
+                self._requeue(rows)
+                return 0
+            self.flushed += len(rows)
+            self.flushes += 1
+            return len(rows)
+
+    def shutdown(self):
+        self._stopping = True
+        self._wake.set()
+        self.flush()
+
+    def stats(self) -> dict:
+        return {"depth": self.depth(), "flushed": self.flushed, "flushes": self.flushes,
+                "dropped": self.dropped, "errors": self.errors}
+
+
+def _insert_logs(rows: List[dict]):
+    db.session.execute(insert(WorkoutLog), rows)
+    db.session.commit()
+
+
+def init_log_buffer(app: Flask):
+    if not app.config.get("WORKOUT_LOG_ENABLED", True):
+        return
+    buffer = WriteBehindBuffer(app, app.config.get("WORKOUT_LOG_FLUSH_SIZE", 200),
+                               app.config.get("WORKOUT_LOG_FLUSH_INTERVAL", 2.0))
+    app.extensions["workout_log_buffer"] = buffer
+    atexit.register(buffer.shutdown)
+
+
+def record_toggle(user_id: int, day_id: int, item_index: int, completed: bool):
+    buffer = current_app.extensions.get("workout_log_buffer")
+    if buffer is not None:
+        buffer.record(user_id=user_id, workout_day_id=day_id, item_index=item_index, completed=completed)
@@ -0,0 +1,218 @@
+"""
+Exercise catalog with bitset indexes.
+
+Every exercise gets a position in the catalog; for each (field, value) pair the
+catalog keeps a Python int with bit i set when exercise i has that value. A
+selection such as "no equipment, not legs, advanced only" is a few ANDs over
+those ints instead of a scan over the exercise list, so the cost doesn't grow
+with the number of exercises until the matching ones are enumerated.
+
+The days of virtual plans are regenerated from this catalog. Changing it
+(_BUILTIN, or the file EXERCISE_CATALOG_PATH points to) changes those days, so
+it needs a new planner.GENERATORS version, or `flask materialize-plans` first.
+"""
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+FIELDS = ("kind", "muscle", "equipment", "modality", "difficulty", "goals")
+DIFFICULTIES = ("beginner", "intermediate", "advanced")
+GOALS = ("Weight Loss", "Muscle Gain", "Endurance")
+
+
+@dataclass(frozen=True)
+class Exercise:
+    name: str
+    kind: str                   # "strength" or "cardio"
+    muscle: str                 # legs / push / pull / core / full_body / cardio
+    equipment: str              # "none" for bodyweight
+    modality: str               # strength / conditioning / isometric / endurance
+    difficulty: str             # one of DIFFICULTIES
+    goals: FrozenSet[str] = field(default_factory=frozenset)
+    media: Optional[str] = None
+
+
+WL, MG, EN = GOALS
+
+# name, kind, muscle, equipment, modality, difficulty, goals, media
+_BUILTIN = [
+    ("Goblet squats", "strength", "legs", "kettlebell", "strength", "beginner", (WL, EN),
+     "https://www.youtube.com/embed/MWHIs0zxkCU"),
+    ("Walking lunges", "strength", "legs", "none", "strength", "beginner", (WL, EN),
+     "https://www.youtube.com/embed/UInwcEa5BH4"),
+    ("Kettlebell swings", "strength", "full_body", "kettlebell", "conditioning", "intermediate", (WL, EN),
+     "https://www.youtube.com/embed/r777bo9KuY4"),
+    ("Plank", "strength", "core", "none", "isometric", "beginner", (WL, EN),
+     "https://www.youtube.com/embed/mwlp75MS6Rg"),
+    ("Dips", "strength", "push", "parallel_bars", "strength", "intermediate", (WL,),
+     "https://www.youtube.com/embed/WVeZDBhZwLA"),
+    ("Push-ups", "strength", "push", "none", "strength", "beginner", (WL, EN),
+     "https://www.youtube.com/embed/WDIpL0pjun0?si=ZOHslrfgjZjlMWGU"),
+    ("Mountain climbers", "strength", "core", "none", "conditioning", "beginner", (WL, EN),
+     "https://www.youtube.com/embed/cnyTQDSE884?si=1JmX4f0kHfY4bX8G"),
+    ("Bodyweight squats", "strength", "legs", "none", "strength", "beginner", (WL, EN),
+     "https://www.youtube.com/embed/aclHkVaku9U"),
+    ("Step-ups", "strength", "legs", "box", "strength", "beginner", (WL, EN),
+     "https://www.youtube.com/embed/URHdW9js6DM"),
+    ("Burpees", "strength", "full_body", "none", "conditioning", "intermediate", (WL,),
+     "https://www.youtube.com/embed/OO7-dWIy0W8"),
+    ("Russian twists", "strength", "core", "none", "strength", "beginner", (WL,),
+     "https://www.youtube.com/embed/wkD8rjkodUI"),
+    ("Jumping jacks", "strength", "full_body", "none", "conditioning", "beginner", (WL, EN),
+     "https://www.youtube.com/embed/uLVt6u15L98"),
+    ("Side lunges", "strength", "legs", "none", "strength", "beginner", (WL, EN),
+     "https://www.youtube.com/embed/0R9ZQd3aM6s"),
+    ("Supermans", "strength", "core", "none", "isometric", "beginner", (EN,), None),
+    ("Back squats", "strength", "legs", "barbell", "strength", "intermediate", (MG,),
+     "https://www.youtube.com/embed/-bJIpOq-LWk"),
+    ("Front squats", "strength", "legs", "barbell", "strength", "advanced", (MG,),
+     "https://www.youtube.com/embed/W9jJaI4cHJU"),
+    ("Romanian deadlifts", "strength", "legs", "barbell", "strength", "intermediate", (MG,),
+     "https://www.youtube.com/embed/2bmuYtv4HbQ"),
+    ("Deadlifts", "strength", "legs", "barbell", "strength", "advanced", (MG,),
+     "https://www.youtube.com/embed/yPqv3ejnZvc?si=BW1YXRhzOT_9Miqk"),
+    ("Bench press", "strength", "push", "barbell", "strength", "intermediate", (MG,),
+     "https://www.youtube.com/embed/4_QuyfOCI5U"),
+    ("Overhead press", "strength", "push", "barbell", "strength", "intermediate", (MG,),
+     "https://www.youtube.com/embed/cGnhixvC8uA"),
+    ("Barbell rows", "strength", "pull", "barbell", "strength", "intermediate", (MG,),
+     "https://www.youtube.com/embed/bm0_q9bR_HA"),
+    ("Pull-ups", "strength", "pull", "pullup_bar", "strength", "intermediate", (MG,),
+     "https://www.youtube.com/embed/9yVGh3XbJ34"),
+    ("Dumbbell curls", "strength", "pull", "dumbbell", "strength", "beginner", (MG,),
+     "https://www.youtube.com/embed/CFBZ4jN1CMI"),
+    ("Tricep extensions", "strength", "push", "dumbbell", "strength", "beginner", (MG,),
+     "https://www.youtube.com/embed/kZ-ReOdn2qk"),
+    ("Chest fly", "strength", "push", "dumbbell", "strength", "beginner", (MG,),
+     "https://www.youtube.com/embed/Nhvz9EzdJ4U"),
+    ("Lat pulldown", "strength", "pull", "machine", "strength", "beginner", (MG,),
+     "https://www.youtube.com/embed/NAIEnMjN-6w"),
+    ("Leg press", "strength", "legs", "machine", "strength", "beginner", (MG,),
+     "https://www.youtube.com/embed/cDGOn-yfKJA"),
+    ("Weighted dips", "strength", "push", "parallel_bars", "strength", "advanced", (MG,),
+     "https://www.youtube.com/embed/MhPl9Vf4toc"),
+    ("Bulgarian split squats", "strength", "legs", "dumbbell", "strength", "intermediate", (MG,),
+     "https://www.youtube.com/embed/2C-uNgKwPLE"),
+    ("Hammer curls", "strength", "pull", "dumbbell", "strength", "beginner", (MG,),
+     "https://www.youtube.com/embed/CFBZ4jN1CMI"),
+    ("Incline walk", "cardio", "cardio", "treadmill", "endurance", "beginner", (WL, EN),
+     "https://liftmanual.com/wp-content/uploads/2023/04/walking-on-incline-treadmill.jpg"),
+    ("Steady run", "cardio", "cardio", "none", "endurance", "beginner", (WL, EN),
+     "https://sunriserunco.com/wp-content/uploads/2021/09/Steady-State-Running-featured-image.jpg"),
+    ("Tempo run", "cardio", "cardio", "none", "endurance", "intermediate", (WL, EN),
+     "https://i0.wp.com/post.healthline.com/wp-content/uploads/2020/01/Runner-training-on-running-track-1296x728-header-1296x728.jpg?w=1155&h=1528"),
+    ("Cycling", "cardio", "cardio", "bike", "endurance", "beginner", (WL, MG, EN),
+     "https://cdn.mos.cms.futurecdn.net/v2/t:139,l:0,cw:2700,ch:1518,q:80,w:2700/WXZQnTcQHyt2igzrwhNUyW.jpg"),
+    ("Elliptical", "cardio", "cardio", "elliptical", "endurance", "beginner", (WL, MG),
+     "https://shop.lifefitness.com/cdn/shop/products/life-fitness-e5-adjustable-stride-elliptical-cross-trainer-woman-1000x1000.jpg?v=1748945400&width=1000"),
+    ("Stair climber", "cardio", "cardio", "stair_climber", "endurance", "intermediate", (WL, EN),
+     "https://assets.clevelandclinic.org/transform/LargeFeatureImage/30ac4994-09bb-4ebd-b114-46d1af479237/stair-stepper-gym-1474835659-r"),
+    ("Swim", "cardio", "cardio", "pool", "endurance", "intermediate", (WL, EN),
+     "https://www.swimnow.co.uk/wp-content/uploads/2023/05/Health-Benefits-of-Swimming.jpg"),
+    ("Jump rope", "cardio", "cardio", "jump_rope", "conditioning", "intermediate", (WL, EN),
+     "https://www.youtube.com/embed/u3zgHI8QnqE"),
+    ("Rowing machine", "cardio", "cardio", "rower", "endurance", "intermediate", (WL, EN), None),
+    ("Rower easy", "cardio", "cardio", "rower", "endurance", "beginner", (MG,),
+     "https://www.youtube.com/embed/0R9ZQd3aM6s"),
+    ("Farmer's walk", "cardio", "full_body", "dumbbell", "conditioning", "intermediate", (MG,),
+     "https://www.youtube.com/embed/8OtwXwrJizk"),
+    ("Sled push", "cardio", "full_body", "sled", "conditioning", "advanced", (MG,),
+     "https://www.youtube.com/embed/QwscR2BhdEg"),
+]
+
+Filter = Dict[str, "str | Iterable[str]"]
+
+
+class ExerciseCatalog:
+    """
+    Immutable list of exercises plus one bitset per (field, value).
+
+    mask(**filters) -> int: a value may be a string or an iterable of strings
+    (any of them matches); different fields are ANDed. `exclude` takes the same
+    form and removes its matches. The enumeration of a mask is cached, since
+    plan generation asks for the same few masks over and over.
+    """
+
+    def __init__(self, exercises: Iterable[Exercise]):
+        self.exercises: Tuple[Exercise, ...] = tuple(exercises)
+        self.all = (1 << len(self.exercises)) - 1
+        self._index: Dict[Tuple[str, str], int] = {}
+        self._by_name: Dict[str, int] = {}
+        for i, ex in enumerate(self.exercises):
+            if ex.name in self._by_name:
+                raise ValueError(f"Duplicate exercise: {ex.name}")
+            self._by_name[ex.name] = i
+            bit = 1 << i
+            for name in FIELDS:
+                values = getattr(ex, name)
+                for value in (values if name == "goals" else (values,)):
+                    self._index[(name, value)] = self._index.get((name, value), 0) | bit
+        self._ids_cache: Dict[int, Tuple[int, ...]] = {}
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "ExerciseCatalog":
+        return cls(Exercise(**{**r, "goals": frozenset(r.get("goals", ()))}) for r in records)
+
+    def __len__(self) -> int:
+        return len(self.exercises)
+
+    def values(self, name: str) -> List[str]:
+        return sorted(v for f, v in self._index if f == name)
+
+    def _field_mask(self, name: str, value) -> int:
+        if name not in FIELDS:
+            raise ValueError(f"Unknown exercise field: {name}")
+        if isinstance(value, str):
+            return self._index.get((name, value), 0)
+        m = 0
+        for v in value:
+            m |= self._index.get((name, v), 0)
+        return m
+
+    def mask(self, exclude: Optional[Filter] = None, **filters) -> int:
+        m = self.all
+        for name, value in filters.items():
+            m &= self._field_mask(name, value)
+        for name, value in (exclude or {}).items():
+            m &= ~self._field_mask(name, value)
+        return m
+
+    def ids(self, mask: int) -> Tuple[int, ...]:
+        ids = self._ids_cache.get(mask)
+        if ids is None:
+            out = []
+            m = mask
+            while m:
+                low = m & -m
+                out.append(low.bit_length() - 1)
+                m ^= low
+            ids = self._ids_cache[mask] = tuple(out)
+        return ids
+
+    def select(self, exclude: Optional[Filter] = None, **filters) -> List[Exercise]:
+        return [self.exercises[i] for i in self.ids(self.mask(exclude, **filters))]
+
+    def get(self, name: str) -> Optional[Exercise]:
+        i = self._by_name.get(name)
+        return None if i is None else self.exercises[i]
+
+    def bank(self, goal: str) -> Dict[str, List[str]]:
+        """The old BANKS[goal] shape: {"strength": [names], "cardio": [names]}."""
+        return {kind: [ex.name for ex in self.select(goals=goal, kind=kind)] for kind in ("strength", "cardio")}
+
+    def media_links(self) -> Dict[str, str]:
+        return {ex.name: ex.media for ex in self.exercises if ex.media}
+
+
+def load_catalog(path: Optional[str] = None) -> ExerciseCatalog:
+    """Built-in catalog, or the exercises in a JSON list of records (see Exercise)."""
+    if not path:
+        return ExerciseCatalog(
+            Exercise(name, kind, muscle, equipment, modality, difficulty, frozenset(goals), media)
+            for name, kind, muscle, equipment, modality, difficulty, goals, media in _BUILTIN)
+    with open(path, encoding="utf-8") as fh:
+        return ExerciseCatalog.from_records(json.load(fh))
+
+
+catalog = load_catalog(os.getenv("EXERCISE_CATALOG_PATH"))
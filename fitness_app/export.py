@@ -0,0 +1,172 @@
+"""
+Streaming exports of plans, days and workout logs as NDJSON or CSV.
+
+Rows are read with yield_per (a server-side cursor where the driver has
+one, an incrementally fetched cursor on SQLite) as plain column tuples, so
+nothing accumulates in the session, and are encoded into ~64 KB text chunks
+as they arrive. Memory stays flat whatever the row count; the HTTP routes
+and `flask export` both consume the same generator.
+
+Days of virtual plans that were never touched have no WorkoutDay row; the
+export regenerates them from the plan's seed, as the dashboard does.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import and_, select
+
+from fitness_app.models import MAX_PLAN_DAYS, WorkoutDay, WorkoutLog, WorkoutPlan, db
+from fitness_app.planner import seeded_day_items
+
+KINDS = ("plans", "days", "logs")
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CHUNK_CHARS = 64 * 1024
+
+COLUMNS = {
+    "plans": ["plan_id", "user_id", "goal", "intensity", "source", "storage", "start_date", "days",
+              "items_total", "items_completed", "success_proba", "adherence", "created_at"],
+    "days": ["plan_id", "user_id", "goal", "day_index", "date", "item_count", "completed_count", "items"],
+    "logs": ["log_id", "user_id", "workout_day_id", "item_index", "completed", "timestamp", "notes"],
+}
+
+
+def _plans(user_id, since, until, goal, chunk_size) -> Iterator[dict]:
+    query = select(WorkoutPlan.id.label("plan_id"), WorkoutPlan.user_id, WorkoutPlan.goal, WorkoutPlan.intensity,
+                   WorkoutPlan.source, WorkoutPlan.storage, WorkoutPlan.start_date, WorkoutPlan.days,
+                   WorkoutPlan.items_total, WorkoutPlan.items_completed, WorkoutPlan.success_proba,
+                   WorkoutPlan.adherence, WorkoutPlan.created_at)
+    if user_id is not None:
+        query = query.where(WorkoutPlan.user_id == user_id)
+    if goal is not None:
+        query = query.where(WorkoutPlan.goal == goal)
+    if since is not None:
+        query = query.where(WorkoutPlan.start_date >= since)
+    if until is not None:
+        query = query.where(WorkoutPlan.start_date <= until)
+    for row in db.session.execute(query.order_by(WorkoutPlan.id).execution_options(yield_per=chunk_size)):
+        yield row._asdict()
+
+
+def _day(plan, day_index, items, mask, completed_count) -> dict:
+    return {"plan_id": plan.id, "user_id": plan.user_id, "goal": plan.goal, "day_index": day_index,
+            "date": plan.start_date + timedelta(days=day_index), "item_count": len(items),
+            "completed_count": completed_count,
+            "items": [dict(item, completed=bool(mask >> i & 1)) for i, item in enumerate(items)]}
+
+
+def _plan_days(plan, stored, since, until) -> Iterator[dict]:
+    """
+    Days of one plan dated since..until, in order; stored: [(day_index, items, completed_mask, completed_count)].
+    Days outside the range are skipped before a virtual one is generated.
+    """
+    first = max((since - plan.start_date).days, 0) if since is not None else 0
+    last = (until - plan.start_date).days if until is not None else (plan.days or 0) - 1
+    if plan.storage != "virtual":
+        for day_index, items, mask, count in stored:
+            if first <= day_index <= last:
+                yield _day(plan, day_index, items, mask or 0, count or 0)
+        return
+    by_index = {s[0]: s for s in stored}
+    for i in range(first, min(last + 1, plan.days or 0)):
+        if i in by_index:
+            _, items, mask, count = by_index[i]
+            yield _day(plan, i, items, mask or 0, count or 0)
+        else:
+            items = seeded_day_items(plan.seed, i, plan.intensity, plan.goal, plan.generator_version)
+            yield _day(plan, i, items, 0, 0)
+
+
+def _days(user_id, since, until, goal, chunk_size) -> Iterator[dict]:
+    # plans left-joined with their stored days, so virtual plans without any row still appear
+    query = (select(WorkoutPlan.id, WorkoutPlan.user_id, WorkoutPlan.goal, WorkoutPlan.intensity,
+                    WorkoutPlan.storage, WorkoutPlan.seed, WorkoutPlan.generator_version, WorkoutPlan.start_date,
+                    WorkoutPlan.days, WorkoutDay.day_index, WorkoutDay.items, WorkoutDay.completed_mask,
+                    WorkoutDay.completed_count)
+             .outerjoin(WorkoutDay, WorkoutDay.plan_id == WorkoutPlan.id))
+    if user_id is not None:
+        query = query.where(WorkoutPlan.user_id == user_id)
+    if goal is not None:
+        query = query.where(WorkoutPlan.goal == goal)
+    if since is not None:
+        # a plan with a day on or after `since` started at most MAX_PLAN_DAYS before it
+        query = query.where(WorkoutPlan.start_date > since - timedelta(days=MAX_PLAN_DAYS))
+    if until is not None:
+        query = query.where(WorkoutPlan.start_date <= until)
+    query = query.order_by(WorkoutPlan.id, WorkoutDay.day_index).execution_options(yield_per=chunk_size)
+    plan, stored = None, []
+    for row in db.session.execute(query):
+        if plan is not None and row.id != plan.id:
+            yield from _plan_days(plan, stored, since, until)
+            stored = []
+        plan = row
+        if row.day_index is not None:
+            stored.append((row.day_index, row.items, row.completed_mask, row.completed_count))
+    if plan is not None:
+        yield from _plan_days(plan, stored, since, until)
+
+
+def _logs(user_id, since, until, goal, chunk_size) -> Iterator[dict]:
+    query = select(WorkoutLog.id.label("log_id"), WorkoutLog.user_id, WorkoutLog.workout_day_id,
+                   WorkoutLog.item_index, WorkoutLog.completed, WorkoutLog.timestamp, WorkoutLog.notes)
+    if user_id is not None:
+        query = query.where(WorkoutLog.user_id == user_id)
+    if goal is not None:
+        query = (query.join(WorkoutDay, WorkoutDay.id == WorkoutLog.workout_day_id)
+                 .join(WorkoutPlan, and_(WorkoutPlan.id == WorkoutDay.plan_id, WorkoutPlan.goal == goal)))
+    if since is not None:
+        query = query.where(WorkoutLog.timestamp >= datetime.combine(since, datetime.min.time()))
+    if until is not None:
+        query = query.where(WorkoutLog.timestamp < datetime.combine(until + timedelta(days=1), datetime.min.time()))
+    for row in db.session.execute(query.order_by(WorkoutLog.id).execution_options(yield_per=chunk_size)):
+        yield row._asdict()
+
+
+_SOURCES = {"plans": _plans, "days": _days, "logs": _logs}
+
+
+def export_rows(kind: str, user_id: Optional[int] = None, since: Optional[date] = None,
+                until: Optional[date] = None, goal: Optional[str] = None, chunk_size: int = 1000) -> Iterator[dict]:
+    """Rows of `kind` matching the filters; dates are inclusive (plans: start_date, days: date, logs: timestamp)."""
+    if kind not in _SOURCES:
+        raise ValueError(f"Unknown export: {kind}")
+    return _SOURCES[kind](user_id, since, until, goal, chunk_size)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def _csv_value(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, separators=(",", ":"))
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def encode(kind: str, rows: Iterable[dict], fmt: str = "ndjson") -> Iterator[str]:
+    """Text chunks of about CHUNK_CHARS each (one header line first for CSV)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    buf = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(buf)
+        writer.writerow(COLUMNS[kind])
+    for row in rows:
+        if writer is None:
+            buf.write(json.dumps(row, default=_json_default, separators=(",", ":")))
+            buf.write("\n")
+        else:
+            writer.writerow([_csv_value(row[c]) for c in COLUMNS[kind]])
+        if buf.tell() >= CHUNK_CHARS:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
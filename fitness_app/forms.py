@@ -2,6 +2,8 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, IntegerField, FloatField, SelectField, BooleanField, TextAreaField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange, Optional
 
+from fitness_app.models import MAX_PLAN_DAYS
+
 class RegisterForm(FlaskForm):
     username = StringField("Username", validators=[DataRequired(), Length(3, 50)])
     email = StringField("Email", validators=[DataRequired(), Email(), Length(max=120)])
@@ -28,7 +30,7 @@ class LoginForm(FlaskForm):
 class WorkoutPlanForm(FlaskForm):
     intensity = SelectField("Intensity", choices=[("Low", "Low"), ("Medium", "Medium"), ("High", "High")], default="Medium", validators=[Optional()])
     goal = StringField("Goal", validators=[Optional()])
-    days = IntegerField("Duration", validators=[Optional(), NumberRange(1,56)])
+    days = IntegerField("Duration", validators=[Optional(), NumberRange(1, MAX_PLAN_DAYS)])
     submit = SubmitField("Create Plan")
 
 # ProfileForm moved from forms_profile.py
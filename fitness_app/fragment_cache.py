@@ -0,0 +1,185 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from flask import Flask, current_app
+
+
+class LRUBackend:
+    """In-process cache bounded by entry count and total characters stored."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            if len(value) > self.max_bytes:
+                return
+            self._data[key] = value
+            self._size += len(value)
+            while len(self._data) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def info(self) -> dict:
+        return {"entries": len(self._data), "bytes": self._size, "evictions": self.evictions}
+
+
+class FileSystemBackend:
+    """
+    Shared between worker processes on one host: one file per key, written
+    atomically. Oldest files are pruned once the directory exceeds max_entries.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 10000, prune_every: int = 100):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".html")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key: str, value: str):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(value)
+        os.replace(tmp, path)
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self._prune()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".html"):
+                self.delete_file(name)
+
+    def delete_file(self, name: str):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def _prune(self):
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".html")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for e in entries[:len(entries) - self.max_entries]:
+            self.delete_file(e.name)
+
+    def info(self) -> dict:
+        return {"directory": self.directory}
+
+
+class FragmentCache:
+    """
+    Rendered-template cache. Keys carry a version (e.g. WorkoutPlan.version),
+    so writers invalidate by bumping the version instead of deleting entries;
+    stale versions simply age out of the backend.
+    """
+
+    def __init__(self, backend=None, namespace: str = ""):
+        self.backend = backend if backend is not None else LRUBackend()
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: str, render: Callable[[], str]) -> str:
+        key = self.namespace + key
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = render()
+        self.backend.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        info = self.backend.info() if hasattr(self.backend, "info") else {}
+        return dict(info, hits=self.hits, misses=self.misses,
+                    hit_rate=self.hits / lookups if lookups else 0.0)
+
+
+class _NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+
+def init_fragment_cache(app: Flask) -> FragmentCache:
+    """
+    FRAGMENT_CACHE_BACKEND: "memory" (default), "filesystem", "none", or any object
+    with get(key)/set(key, value).
+    """
+    backend = app.config.get("FRAGMENT_CACHE_BACKEND", "memory")
+    if backend == "memory":
+        backend = LRUBackend(app.config.get("FRAGMENT_CACHE_MAX_ENTRIES", 1024),
+                             app.config.get("FRAGMENT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    elif backend == "filesystem":
+        backend = FileSystemBackend(
+            app.config.get("FRAGMENT_CACHE_DIR") or os.path.join(app.instance_path, "fragment_cache"),
+            app.config.get("FRAGMENT_CACHE_MAX_ENTRIES", 10000))
+    elif backend == "none":
+        backend = _NullBackend()
+    # a shared backend may outlive the database it was filled from; don't reuse its keys
+    namespace = hashlib.sha1(app.config["SQLALCHEMY_DATABASE_URI"].encode()).hexdigest()[:8] + ":"
+    cache = FragmentCache(backend, namespace)
+    app.extensions["fragment_cache"] = cache
+    return cache
+
+
+def fragment_cache() -> FragmentCache:
+    return current_app.extensions["fragment_cache"]
+
+
+def plan_grid_key(plan_id: int, version: int, day_index: Optional[int]) -> str:
+    return f"plan-grid:{plan_id}:{version}:{day_index}"
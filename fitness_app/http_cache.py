@@ -0,0 +1,69 @@
+import hashlib
+import time as _time
+from datetime import date, datetime, time
+
+from flask import current_app, request, session
+from sqlalchemy import select
+
+from fitness_app.models import WorkoutPlan, db
+
+
+def latest_plan_stamp(user_id: int):
+    """The few plan columns that decide whether plan pages changed (one indexed query)."""
+    return db.session.execute(
+        select(WorkoutPlan.id, WorkoutPlan.version, WorkoutPlan.start_date, WorkoutPlan.days,
+               WorkoutPlan.created_at, WorkoutPlan.updated_at)
+        .where(WorkoutPlan.user_id == user_id)
+        .order_by(WorkoutPlan.id.desc()).limit(1)).first()
+
+
+def plan_etag(stamp, *extra) -> str:
+    """ETag from plan id, plan version and today's day index (plus any page-specific parts)."""
+    if stamp is None:
+        parts = ["no-plan", date.today().isoformat()]
+    else:
+        parts = [stamp.id, stamp.version, (date.today() - stamp.start_date).days]
+    parts += [current_app.config.get("ETAG_SALT", "")] + list(extra)
+    return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+
+
+def page_etag(stamp, user, *extra) -> str:
+    """HTML pages also embed the username and a CSRF token that expires."""
+    limit = current_app.config.get("WTF_CSRF_TIME_LIMIT", 3600)
+    # re-render at least twice per token lifetime so a cached page never holds an expired token
+    csrf_bucket = int(_time.time() // (limit / 2)) if limit else 0
+    return plan_etag(stamp, user.id, user.username, session.get("csrf_token", ""), csrf_bucket, *extra)
+
+
+def plan_last_modified(stamp) -> datetime | None:
+    if stamp is None:
+        return None
+    changed = stamp.updated_at or stamp.created_at
+    # today's index changes at local midnight; express that instant in UTC like the timestamps
+    midnight_utc = datetime.utcnow() - (datetime.now() - datetime.combine(date.today(), time.min))
+    return max(changed, midnight_utc) if changed else midnight_utc
+
+
+def is_not_modified(etag: str, last_modified: datetime | None) -> bool:
+    if session.get("_flashes"):
+        return False  # pending flash messages must be rendered
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def set_validators(response, etag: str, last_modified: datetime | None):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # clients may keep a copy but must revalidate it every time
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified_response(etag: str, last_modified: datetime | None):
+    response = current_app.response_class(status=304)
+    return set_validators(response, etag, last_modified)
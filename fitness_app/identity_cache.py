@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class IdentityCache:
+    """
+    Short-lived, size-bounded cache of User column values keyed by user id,
+    so flask_login's user_loader can skip the primary-key SELECT.
+
+    Entries expire after `ttl` seconds; writers call invalidate() so the
+    process that changed a user never serves the old values. Other worker
+    processes see the change at most `ttl` seconds later.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, ttl: float, max_size: int):
+        with self._lock:
+            self.ttl = ttl
+            self.max_size = max_size
+            self._data.clear()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[user_id]
+                self.misses += 1
+                return None
+            self._data.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, fields: dict):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[user_id] = (time.monotonic() + self.ttl, fields)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+identity_cache = IdentityCache()
@@ -1,11 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify, flash
+from flask import (Blueprint, render_template, request, redirect, url_for, jsonify, flash, make_response, abort, send_file,
+                   current_app, Response, stream_with_context)
 from flask_login import login_required, current_user
-from fitness_app.models import User, db, WorkoutPlan, WorkoutDay, WorkoutLog
+from fitness_app.models import User, db, WorkoutPlan, WorkoutDay, WorkoutLog, PlanJob
 from fitness_app.forms import WorkoutPlanForm, ProfileForm
-from fitness_app.planner import generate_plan_for_user, get_today_for_user
-from datetime import date
-from sqlalchemy.orm.attributes import flag_modified
+from fitness_app.identity_cache import identity_cache
+from fitness_app.db_profile import run_write
+from fitness_app.event_buffer import record_toggle
+from fitness_app.plan_jobs import PlanJobConflict, active_job_id, job_status, plan_job_worker, submit_plan_job
+from fitness_app.request_profiler import request_profiler
+from fitness_app.planner import (generate_plan_for_user, get_today_for_user, set_item_completed, get_plan_progress,
+                                 get_plan_days, materialize_day)
+from datetime import date, datetime
 from fitness_app.planner import MEDIA_LINKS
+from fitness_app.fragment_cache import fragment_cache, plan_grid_key
+from fitness_app.http_cache import (latest_plan_stamp, plan_etag, page_etag, plan_last_modified,
+                                    is_not_modified, not_modified_response, set_validators)
 main_bp = Blueprint("main", __name__, url_prefix="")
 @main_bp.route("/profile", methods=["GET", "POST"])
 @login_required
@@ -35,6 +44,7 @@ def profile():
                 current_user.bmi = round(current_user.weight_kg / (h_m * h_m), 1)
         if updated:
             db.session.commit()
+            identity_cache.invalidate(current_user.id)
             flash("Profile updated successfully!", "success")
         else:
             flash("No changes made.", "info")
@@ -50,62 +60,250 @@ def index():
 @main_bp.route("/dashboard")
 @login_required
 def dashboard():
+    # cheap revalidation first: most polls see an unchanged plan and get a 304
+    stamp = latest_plan_stamp(current_user.id)
+    pending_job = active_job_id(current_user.id) if plan_job_worker() else None
+    etag, last_modified = page_etag(stamp, current_user, pending_job), plan_last_modified(stamp)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
     plan, today, delta = get_today_for_user(current_user)
-    days = []
+    grid_html = None
     if plan:
-        days = (WorkoutDay.query
-                .filter_by(plan_id=plan.id)
-                .order_by(WorkoutDay.day_index)
-                .all())
-    return render_template(
+        # the grid only changes when the plan version (or today's index) changes,
+        # so the days query and the table render only run on a cache miss
+        grid_html = fragment_cache().get_or_render(
+            plan_grid_key(plan.id, plan.version, delta),
+            lambda: render_template("main/_plan_grid.html", days=get_plan_days(plan), day_index=delta))
+    response = make_response(render_template(
         "main/dashboard.html",
         user=current_user,
         plan=plan,
         today=today,
         day_index=delta,
-        days=days,
+        grid_html=grid_html,
+        pending_job=pending_job,
         media_links=MEDIA_LINKS,
         bg_image="backgrounds/dashboard.jpg"
-    )
+    ))
+    # computed after rendering, once the session holds the page's CSRF token
+    return set_validators(response, page_etag(stamp, current_user, pending_job), last_modified)
+
+@main_bp.route("/api/progress")
+@login_required
+def api_progress():
+    stamp = latest_plan_stamp(current_user.id)
+    etag, last_modified = plan_etag(stamp, current_user.id), plan_last_modified(stamp)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    progress = get_plan_progress(current_user.id)
+    return set_validators(jsonify(plan=progress), etag, last_modified)
+
+def _iso_date(value):
+    return date.fromisoformat(value) if value else None
+
+@main_bp.route("/export/<kind>.<fmt>")
+@login_required
+def export(kind: str, fmt: str):
+    """
+    Streamed export of your plans, days or workout logs: /export/days.ndjson?since=2024-01-01&until=..&goal=..
+    Admins may pass user_id=.. or leave it out for everyone.
+    """
+    from fitness_app.export import FORMATS, KINDS, encode, export_rows
+    if kind not in KINDS or fmt not in FORMATS:
+        abort(404)
+    user_id = current_user.id
+    if current_user.is_admin:
+        user_id = request.args.get("user_id", type=int)
+    try:
+        since, until = _iso_date(request.args.get("since")), _iso_date(request.args.get("until"))
+    except ValueError:
+        return jsonify(error="since/until must be YYYY-MM-DD"), 400
+    rows = export_rows(kind, user_id=user_id, since=since, until=until, goal=request.args.get("goal") or None)
+    response = Response(stream_with_context(encode(kind, rows, fmt)), mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+    return response
+
+def _user_page(after: int | None, before: int | None, size: int):
+    """Keyset page of users by id: (users, prev_cursor, next_cursor); a cursor is None at either end."""
+    query = User.query
+    if before is not None:
+        users = query.filter(User.id < before).order_by(User.id.desc()).limit(size + 1).all()
+        more_before, users = len(users) > size, users[:size][::-1]
+        more_after = True
+    else:
+        if after is not None:
+            query = query.filter(User.id > after)
+        users = query.order_by(User.id).limit(size + 1).all()
+        more_after, users = len(users) > size, users[:size]
+        more_before = after is not None
+    if not users:
+        return users, None, None
+    return users, users[0].id if more_before else None, users[-1].id if more_after else None
 
 @main_bp.route("/admin")
 @login_required
 def admin_dashboard():
-    users = User.query.limit(10).all()
-    if not current_user.is_admin:  
+    if not current_user.is_admin:
         # Non-admins → show access denied page
         return render_template("access_denied.html"), 403
+    from fitness_app.admin_stats import dashboard_stats
+    # read-only: the panels are kept current by `flask refresh-stats` (cron), never by a page view
+    stats = dashboard_stats()
+    last = stats["refreshed_at"]
+    stats["stale"] = last is None or (
+        (datetime.utcnow() - last).total_seconds() > current_app.config.get("ADMIN_STATS_MAX_AGE", 300))
+    size = current_app.config.get("ADMIN_PAGE_SIZE", 50)
+    users, prev_cursor, next_cursor = _user_page(request.args.get("after", type=int),
+                                                 request.args.get("before", type=int), size)
+    profiler = request_profiler()
+    profiles = profiler.recent() if profiler is not None else []
+    return render_template("admin_dashboard.html", users=users, prev_cursor=prev_cursor, next_cursor=next_cursor,
+                           stats=stats, profiles=profiles, bg_image="backgrounds/admin.jpg")
 
-    return render_template("admin_dashboard.html", users=users, bg_image="backgrounds/admin.jpg")
+@main_bp.route("/admin/profiles/<capture_id>")
+@login_required
+def admin_profile(capture_id: str):
+    """A saved request profile: pstats file, or ?format=text for the top functions by cumulative time."""
+    if not current_user.is_admin:
+        return render_template("access_denied.html"), 403
+    profiler = request_profiler()
+    path = profiler.path(capture_id) if profiler is not None else None
+    if path is None:
+        abort(404)
+    if request.args.get("format") == "text":
+        sort = request.args.get("sort", "cumulative")
+        if sort not in ("cumulative", "tottime", "ncalls"):
+            sort = "cumulative"
+        return profiler.summary(capture_id, sort=sort), 200, {"Content-Type": "text/plain; charset=utf-8"}
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True,
+                     download_name=capture_id + ".prof")
+
+@main_bp.route("/admin/at_risk")
+@login_required
+def admin_at_risk():
+    """Coach list from the nightly scores: ?threshold=0.5&limit=100&after_proba=..&after_id=.."""
+    if not current_user.is_admin:
+        return jsonify(error="forbidden"), 403
+    from fitness_app.batch_scoring import at_risk_plans
+    threshold = request.args.get("threshold", 0.5, type=float)
+    limit = min(request.args.get("limit", 100, type=int), 1000)
+    after_proba, after_id = request.args.get("after_proba", type=float), request.args.get("after_id", type=int)
+    after = (after_proba, after_id) if after_proba is not None and after_id is not None else None
+    rows = at_risk_plans(threshold, limit, after)
+    next_page = None
+    if len(rows) == limit:
+        next_page = url_for("main.admin_at_risk", threshold=threshold, limit=limit,
+                            after_proba=rows[-1]["success_proba"], after_id=rows[-1]["id"])
+    for r in rows:
+        r["scored_at"] = r["scored_at"].isoformat() if r["scored_at"] else None
+        r["start_date"] = r["start_date"].isoformat()
+    return jsonify(plans=rows, next=next_page)
 
 @main_bp.route("/planner", methods=["GET", "POST"])
 @login_required
 def planner():
     form = WorkoutPlanForm()   # ✅ create form instance
     if form.validate_on_submit():
-        # Use the generator to create plan and days
-        generate_plan_for_user(
-            user=current_user,
-            days=form.days.data,
-            goal=form.goal.data
-        )
-        flash("Workout plan created!", "success")
+        if plan_job_worker() is None:
+            # Use the generator to create plan and days
+            run_write(_create_plan, current_user.id, form.days.data, form.goal.data)
+            flash("Workout plan created!", "success")
+            return redirect(url_for("main.dashboard"))
+        # generated in the background; the dashboard polls the job until the plan exists
+        try:
+            job_id = submit_plan_job(current_user.id, form.days.data, form.goal.data)
+        except PlanJobConflict as exc:
+            if request.accept_mimetypes.best == "application/json":
+                return jsonify(error=str(exc)), 409
+            flash(str(exc), "warning")
+            return redirect(url_for("main.dashboard"))
+        if request.accept_mimetypes.best == "application/json":
+            status_url = url_for("main.plan_job_status", job_id=job_id)
+            return jsonify(job_id=job_id, status_url=status_url), 202, {"Location": status_url}
+        flash("Your workout plan is being generated…", "info")
         return redirect(url_for("main.dashboard"))
 
     return render_template("main/planner.html", form=form, bg_image="backgrounds/planner.jpg")  # ✅ pass form
 
+@main_bp.route("/api/plan_jobs/<int:job_id>")
+@login_required
+def plan_job_status(job_id: int):
+    job = db.session.get(PlanJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify(error="not found"), 404
+    if job.status == "queued" and plan_job_worker() is not None:
+        plan_job_worker().wake()  # e.g. first request after a restart
+    return jsonify(job=job_status(job))
+
+def _create_plan(user_id: int, days: int, goal: str) -> int:
+    plan = generate_plan_for_user(user=db.session.get(User, user_id), days=days, goal=goal)
+    return plan.id
+
+def _apply_toggles(user_id: int, toggles):
+    """
+    [(day_id, plan_id, day_index, item_index, completed)] -> [(day_id, (completed_count, item_count)) | None],
+    one commit. Without a day_id the day is looked up (or materialized, for virtual plans) by plan_id/day_index.
+    """
+    results = []
+    for day_id, plan_id, day_index, item_index, completed in toggles:
+        if day_id is None:
+            day_id = materialize_day(user_id, plan_id, day_index) if plan_id is not None and day_index is not None else None
+        counts = set_item_completed(user_id, day_id, item_index, completed) if day_id is not None else None
+        results.append((day_id, counts) if counts is not None else None)
+    db.session.commit()
+    return results
+
+def _optional_int(value):
+    return None if value is None or value == '' else int(value)
+
 @main_bp.route('/toggle_item', methods=['POST'])
 @login_required
 def toggle_item():
-    day_id = request.form.get('day_id')
-    item_index = int(request.form.get('item_index'))
-    day = WorkoutDay.query.get(day_id)
-    if day and 0 <= item_index < len(day.items):
-        items = day.items
-        items[item_index]['completed'] = True
-        day.items = items
-        flag_modified(day, "items")  # <-- Add this line
-        db.session.commit()
-        all_completed = all(item.get('completed') for item in day.items)
-        return jsonify(success=True, all_completed=all_completed)
-    return jsonify(success=False), 400
\ No newline at end of file
+    day_id = request.form.get('day_id', type=int)
+    plan_id = request.form.get('plan_id', type=int)
+    day_index = request.form.get('day_index', type=int)
+    item_index = request.form.get('item_index', type=int)
+    completed = request.form.get('completed', 'true').lower() != 'false'
+    if item_index is None or (day_id is None and (plan_id is None or day_index is None)):
+        return jsonify(success=False), 400
+    # single UPDATE on the completion bitmask, no JSON rewrite
+    result, = run_write(_apply_toggles, current_user.id, [(day_id, plan_id, day_index, item_index, completed)])
+    if result is None:
+        return jsonify(success=False), 400
+    day_id, (done, total) = result
+    record_toggle(current_user.id, day_id, item_index, completed)
+    return jsonify(success=True, day_id=day_id, all_completed=done >= total)
+
+MAX_BATCH_TOGGLES = 100
+
+@main_bp.route('/toggle_items', methods=['POST'])
+@login_required
+def toggle_items():
+    """
+    Batch variant: {"toggles": [{"day_id": 1, "item_index": 0, "completed": true}, ...]};
+    "plan_id" + "day_index" may replace "day_id" for days of a virtual plan.
+    """
+    payload = request.get_json(silent=True) or {}
+    toggles = payload.get('toggles')
+    if not isinstance(toggles, list) or not 0 < len(toggles) <= MAX_BATCH_TOGGLES:
+        return jsonify(success=False, error=f"expected 1..{MAX_BATCH_TOGGLES} toggles"), 400
+    parsed = []
+    for t in toggles:
+        try:
+            toggle = (_optional_int(t.get('day_id')), _optional_int(t.get('plan_id')),
+                      _optional_int(t.get('day_index')), int(t['item_index']), bool(t.get('completed', True)))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify(success=False, error="each toggle needs item_index and day_id or plan_id/day_index"), 400
+        if toggle[0] is None and (toggle[1] is None or toggle[2] is None):
+            return jsonify(success=False, error="each toggle needs item_index and day_id or plan_id/day_index"), 400
+        parsed.append(toggle)
+    results = []
+    for (day_id, _, _, item_index, completed), result in zip(parsed, run_write(_apply_toggles, current_user.id, parsed)):
+        if result is None:
+            results.append(dict(day_id=day_id, item_index=item_index, success=False))
+        else:
+            day_id, (done, total) = result
+            record_toggle(current_user.id, day_id, item_index, completed)
+            results.append(dict(day_id=day_id, item_index=item_index, success=True,
+                                all_completed=done >= total))
+    return jsonify(success=all(r['success'] for r in results), results=results)
@@ -0,0 +1,279 @@
+"""
+Minimal Prometheus instrumentation (text exposition format, no client library).
+
+Metrics are per process; with several workers, scrape each one or
+aggregate them upstream. The endpoint (METRICS_PATH) answers loopback
+clients only, or any client sending "Authorization: Bearer <METRICS_TOKEN>"
+when a token is configured; METRICS_ENABLED=0 removes it.
+"""
+import bisect
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from flask import (Flask, Response, abort, g, has_request_context, request, template_rendered,
+                   before_render_template)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback returning {label-values tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 callback: Callable[[], Dict[Tuple, float]] = dict):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class CallbackCounter(Gauge):
+    """A counter kept elsewhere (e.g. cache hit counts), read at scrape time like a Gauge."""
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}     # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if isinstance(metric, Gauge):
+            # callbacks read the app that registered them: the latest create_app wins
+            self._metrics[metric.name] = metric
+            return metric
+        # module reloads share the first instance (its samples are referenced elsewhere)
+        return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Request latency by endpoint.", ("endpoint", "method", "status")))
+REQUEST_QUERIES = REGISTRY.register(Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ("endpoint",), COUNT_BUCKETS))
+REQUEST_DB_TIME = REGISTRY.register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request.", ("endpoint",)))
+QUERY_LATENCY = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Latency of single SQL statements.", (), FAST_BUCKETS))
+TEMPLATE_LATENCY = REGISTRY.register(Histogram(
+    "template_render_seconds", "Jinja render time by template.", ("template",)))
+INFERENCE_LATENCY = REGISTRY.register(Histogram(
+    "model_inference_seconds", "Model prediction time.", ("model",), FAST_BUCKETS))
+
+
+def timed_inference(model: str):
+    return INFERENCE_LATENCY.time(model=model)
+
+
+# --- SQLAlchemy hooks (process-wide, installed once) ---
+_sql_hooks_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("query_start")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    QUERY_LATENCY.observe(elapsed)
+    if has_request_context() and "sql_queries" in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+
+
+def install_sql_hooks():
+    global _sql_hooks_installed
+    if not _sql_hooks_installed:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _sql_hooks_installed = True
+
+
+def init_metrics(app: Flask):
+    install_sql_hooks()
+
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def _note_status(response):
+        g.response_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _record(exc):
+        # teardown also runs for requests that raised, which after_request may not see
+        start = g.pop("request_start", None)
+        if start is not None:
+            endpoint = request.endpoint or "unknown"
+            status = 500 if exc is not None else g.pop("response_status", 500)
+            REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint,
+                                    method=request.method, status=status)
+            REQUEST_QUERIES.observe(g.sql_queries, endpoint=endpoint)
+            REQUEST_DB_TIME.observe(g.sql_seconds, endpoint=endpoint)
+
+    def _template_start(sender, template, context, **extra):
+        g.setdefault("template_starts", []).append(time.perf_counter())
+
+    def _template_done(sender, template, context, **extra):
+        starts = g.get("template_starts")
+        if starts:
+            TEMPLATE_LATENCY.observe(time.perf_counter() - starts.pop(), template=template.name or "string")
+
+    before_render_template.connect(_template_start, app, weak=False)
+    template_rendered.connect(_template_done, app, weak=False)
+
+    from fitness_app.model_registry import registry
+    REGISTRY.register(CallbackCounter(
+        "model_registry_total", "Model registry loads/hits/reloads since process start.", ("model", "event"),
+        lambda: {(name, ev): st[ev] for name, st in registry.stats().items() for ev in ("loads", "hits", "reloads")}))
+    REGISTRY.register(CallbackCounter(
+        "model_registry_load_seconds_total", "Time spent loading each model.", ("model",),
+        lambda: {(name,): st["load_seconds"] for name, st in registry.stats().items()}))
+    from fitness_app.identity_cache import identity_cache
+    REGISTRY.register(CallbackCounter(
+        "identity_cache_total", "flask_login user cache lookups.", ("result",),
+        lambda: {("hit",): identity_cache.hits, ("miss",): identity_cache.misses}))
+    log_buffer = app.extensions.get("workout_log_buffer")
+    if log_buffer is not None:
+        REGISTRY.register(Gauge(
+            "workout_log_buffer", "Write-behind WorkoutLog buffer state.", ("stat",),
+            lambda: {(k,): v for k, v in log_buffer.stats().items()}))
+    plan_jobs = app.extensions.get("plan_jobs")
+    if plan_jobs is not None:
+        REGISTRY.register(Gauge(
+            "plan_jobs", "Plan jobs run by this process's workers.", ("stat",),
+            lambda: {(k,): v for k, v in plan_jobs.stats().items()}))
+    cache = app.extensions.get("fragment_cache")
+    if cache is not None:
+        REGISTRY.register(CallbackCounter(
+            "fragment_cache_total", "Fragment cache lookups.", ("result",),
+            lambda: {("hit",): cache.hits, ("miss",): cache.misses}))
+
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    token = app.config.get("METRICS_TOKEN")
+
+    def metrics_view():
+        if token:
+            if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+                abort(401)
+        elif request.remote_addr not in ("127.0.0.1", "::1"):
+            abort(403)
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule(app.config.get("METRICS_PATH", "/metrics"), "metrics", metrics_view)
@@ -1,12 +1,16 @@
 import os
+from itertools import product
 import numpy as np
-import pandas as pd
-from joblib import dump, load
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.tree import DecisionTreeClassifier
+from fitness_app import artifacts
+from fitness_app.model_registry import registry
+from fitness_app.metrics import timed_inference
+from fitness_app.tree_compile import compiled_path, load_compiled
 
-MODEL_PATH_INTENSITY = "model_intensity.joblib"
-MODEL_PATH_PLAN_SUCCESS = "model_plan_success.joblib"
+# Models shipped with the package; served until `flask train-model` writes a versioned artifact
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH_INTENSITY = os.path.join(MODEL_DIR, "model_intensity.joblib")
+MODEL_PATH_PLAN_SUCCESS = os.path.join(MODEL_DIR, "model_plan_success.joblib")
+MODEL_PATH_PLAN_SUCCESS_FAST = compiled_path(MODEL_PATH_PLAN_SUCCESS)
 
 # Goals in a fixed order so we can one-hot properly
 GOALS = ["Weight Loss", "Muscle Gain", "Endurance"]
@@ -18,25 +22,19 @@ FEATURE_COLS = [
     "avg_cardio_minutes_per_day", "exercise_types_count", "previous_success_rate",
     "previous_goal", "plan_adherence_rate", "user_rating"
 ]
+# featurize_user_plan takes the first six from the user dict, the rest from plan_params
+USER_FEATURES = FEATURE_COLS[:6]
+PLAN_FEATURES = FEATURE_COLS[6:]
+
+# pandas, joblib and sklearn are imported lazily inside the functions that need
+# them; inference through the compiled trees only needs numpy.
 
 # 1. Load and preprocess your real dataset
 def load_dataset(csv_path="fitness_dataset.csv"):
+    """Encoded float32 features plus plan_success (chunked, compact dtypes; see training.py)."""
+    from fitness_app.training import load_frame
     # Always resolve path relative to this file
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_path = os.path.join(base_dir, csv_path)
-    df = pd.read_csv(csv_path)
-    # Encode gender: 0 for Female, 1 for Male
-    df["gender"] = df["gender"].map({"Female": 0, "Male": 1})
-    # Encode fitness_level: e.g., Beginner=0, Intermediate=1, Advanced=2
-    df["fitness_level"] = df["fitness_level"].map({"Beginner": 0, "Intermediate": 1, "Advanced": 2})
-    # Encode goal: e.g., Weight Loss=0, Muscle Gain=1, Endurance=2
-    df["goal"] = df["goal"].map({"Weight Loss": 0, "Muscle Gain": 1, "Endurance": 2})
-    # Encode previous_goal similarly
-    df["previous_goal"] = df["previous_goal"].map({"Weight Loss": 0, "Muscle Gain": 1, "Endurance": 2})
-    # If avg_intensity is categorical, encode it too
-    if df["avg_intensity"].dtype == object:
-        df["avg_intensity"] = df["avg_intensity"].map({"Low": 0, "Medium": 1, "High": 2})
-    return df
+    return load_frame(os.path.join(MODEL_DIR, csv_path))
 
 def _make_synthetic_dataset(n=2000, seed=42):
     """
@@ -72,26 +70,54 @@ def _make_synthetic_dataset(n=2000, seed=42):
     X = np.column_stack([age, bmi, gender_male, goal_oh])
     return X, y
 
-# 2. Train and save the model
+# 2. Train and save the model (a new version under artifacts/plan_success, made current)
 def train_and_save_model(csv_path="fitness_dataset.csv"):
-    df = load_dataset(csv_path)
-    X = df[FEATURE_COLS]
-    y = df["plan_success"]
-    clf = DecisionTreeClassifier(max_depth=5, random_state=42)
-    clf.fit(X, y)
-    dump(clf, MODEL_PATH_PLAN_SUCCESS)
+    from fitness_app.training import train_model
+    clf, _ = train_model("plan_success", csv_path=os.path.join(MODEL_DIR, csv_path))
     return clf
 
-# 3. Load the model (train if missing)
-def ensure_model():
+# 3. Load the model; kept in memory by the registry. Entries point through
+# artifacts/<name>/current, so promoting a version reloads them in every process.
+def _load_or_retrain(path):
+    from joblib import load
+    try:
+        return load(path)
+    except Exception:
+        return train_and_save_model()
+
+def _shipped_model():
+    # no trained version yet: the model that ships with the package
     if os.path.exists(MODEL_PATH_PLAN_SUCCESS):
-        try:
-            return load(MODEL_PATH_PLAN_SUCCESS)
-        except Exception:
-            pass
+        return _load_or_retrain(MODEL_PATH_PLAN_SUCCESS)
     return train_and_save_model()
 
-_model = ensure_model()
+def load_fast(metadata_path):
+    """Compiled tree of an artifact version, or its sklearn model (forests aren't compiled)."""
+    version_dir = os.path.dirname(metadata_path)
+    npz = os.path.join(version_dir, "model.npz")
+    if os.path.exists(npz):
+        return load_compiled(npz)
+    from joblib import load
+    return load(os.path.join(version_dir, "model.joblib"))
+
+def _shipped_fast_model():
+    return load_compiled(MODEL_PATH_PLAN_SUCCESS_FAST)
+
+registry.register("plan_success", artifacts.current_path("plan_success", "model.joblib"),
+                  loader=_load_or_retrain, trainer=_shipped_model)
+
+registry.register("plan_success_fast", artifacts.current_path("plan_success", artifacts.METADATA),
+                  loader=load_fast, trainer=_shipped_fast_model)
+
+def ensure_model():
+    return registry.get("plan_success")
+
+def get_fast_model():
+    """Compiled (sklearn-free) plan-success tree, or the sklearn model if not exported."""
+    try:
+        return registry.get("plan_success_fast")
+    except FileNotFoundError:
+        return ensure_model()
 
 # 4. Featurize a user/plan for prediction
 def featurize_user_plan(user, plan_params):
@@ -124,43 +150,69 @@ def featurize_user_plan(user, plan_params):
 # 5. Predict plan success
 def predict_plan_success(user, plan_params):
     X = featurize_user_plan(user, plan_params)
-    pred = int(_model.predict(X)[0])
+    model = get_fast_model()
+    with timed_inference("plan_success"):
+        pred = int(model.predict(X)[0])
     return pred  # 1 = likely success, 0 = likely not
 
-# 6. (Optional) Suggest best plan from candidates
+# 6. Batched scoring: one matrix, one predict_proba call for all candidates
+def featurize_candidates(user, plan_candidates):
+    """
+    Same column layout as featurize_user_plan, but for N candidates at once.
+    Returns: float array of shape (N, len(FEATURE_COLS))
+    """
+    X = np.empty((len(plan_candidates), len(FEATURE_COLS)), dtype=float)
+    X[:, :len(USER_FEATURES)] = [user[c] for c in USER_FEATURES]
+    X[:, len(USER_FEATURES):] = [[plan[c] for c in PLAN_FEATURES] for plan in plan_candidates]
+    return X
+
+def success_proba(X, model=None):
+    """Probability of plan_success == 1 for each row of X."""
+    model = model if model is not None else get_fast_model()
+    with timed_inference("plan_success_batch"):
+        proba = model.predict_proba(X)
+    classes = list(model.classes_)
+    if 1 not in classes:
+        return np.zeros(len(X))
+    return proba[:, classes.index(1)]
+
+def score_candidates(user, plan_candidates):
+    if not plan_candidates:
+        return np.zeros(0)
+    return success_proba(featurize_candidates(user, plan_candidates))
+
+def rank_candidates(user, plan_candidates, top_k=None):
+    """
+    Returns: list of (probability, plan_params) sorted best first.
+    """
+    scores = score_candidates(user, plan_candidates)
+    order = np.argsort(-scores, kind="stable")
+    if top_k is not None:
+        order = order[:top_k]
+    return [(float(scores[i]), plan_candidates[i]) for i in order]
+
+def candidate_grid(base_params, intensities=(0, 1, 2), plan_lengths=(14, 28, 42, 56),
+                   sets_per_day=(2, 3, 4, 5), cardio_minutes=(15, 25, 35)):
+    """
+    base_params: plan_params dict with the fields that are not varied
+    Returns: one plan_params dict per combination of the varied fields
+    """
+    return [
+        dict(base_params, avg_intensity=i, plan_length_days=n,
+             avg_sets_per_day=s, avg_cardio_minutes_per_day=c)
+        for i, n, s, c in product(intensities, plan_lengths, sets_per_day, cardio_minutes)
+    ]
+
+# 7. (Optional) Suggest best plan from candidates
 def suggest_best_plan(user, plan_candidates):
     """
     plan_candidates: list of plan_params dicts
     Returns: plan_params dict with highest predicted success
     """
-    best_plan = None
-    best_score = -1
-    for plan in plan_candidates:
-        score = predict_plan_success(user, plan)
-        if score > best_score:
-            best_score = score
-            best_plan = plan
-    print(f"Yes, it is ML! Plan with predicted success: {best_score}")
-    return best_plan
-
-def _featurize(age: int, weight_kg: float, height_cm: float, gender: str, goal: str):
-    h_m = height_cm / 100.0
-    bmi = weight_kg / (h_m * h_m) if h_m > 0 else 0.0
-    gender_male = 1 if gender == "Male" else 0
-    goal_vec = [1 if goal == g else 0 for g in GOALS]
-    X = np.array([age, bmi, gender_male] + goal_vec, dtype=float).reshape(1, -1)
-    return X, bmi
-
-def predict_intensity(age, weight_kg, height_cm, gender, goal):
-    """
-    Returns: (intensity_label, bmi_value)
-      intensity_label in {"Low","Medium","High"}
-    """
-    X, bmi = _featurize(age, weight_kg, height_cm, gender, goal)
-    pred = int(_model.predict(X)[0])
-    label = ["Low", "Medium", "High"][pred]
-    print(label)
-    return label, float(bmi)
+    if not plan_candidates:
+        return None
+    scores = score_candidates(user, plan_candidates)
+    return plan_candidates[int(np.argmax(scores))]
 
 # Example usage:
 # user = {"age": 28, "gender_Male": 1, "gender_Female": 0}
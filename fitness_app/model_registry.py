@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+def _joblib_loader(path: str):
+    import joblib
+    return joblib.load(path)
+
+
+class _Entry:
+    def __init__(self, name: str, path: str, loader: Callable, trainer: Optional[Callable], version):
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self.trainer = trainer
+        self.version = version
+        self.model = None
+        self.loaded_mtime: Optional[float] = None
+        self.loaded_version = None
+        self.loads = 0
+        self.hits = 0
+        self.reloads = 0
+        self.load_seconds = 0.0
+
+
+class ModelRegistry:
+    """
+    Keeps fitted models in memory for the lifetime of the process.
+
+    A model is loaded from disk the first time it is requested and served from
+    memory afterwards. It is reloaded when its file mtime changes or when its
+    version is bumped with set_version().
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, path: str, loader: Callable = _joblib_loader,
+                 trainer: Optional[Callable] = None, version=None):
+        """trainer() is called (and must write `path`) when the file is missing."""
+        with self._lock:
+            self._entries[name] = _Entry(name, path, loader, trainer, version)
+
+    def is_registered(self, name: str) -> bool:
+        return name in self._entries
+
+    def set_version(self, name: str, version):
+        with self._lock:
+            self._entries[name].version = version
+
+    def _mtime(self, path: str) -> Optional[float]:
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def get(self, name: str):
+        entry = self._entries[name]
+        mtime = self._mtime(entry.path)
+        model = entry.model
+        if (model is not None and mtime == entry.loaded_mtime
+                and entry.version == entry.loaded_version):
+            entry.hits += 1
+            return model
+        with self._lock:
+            # another thread may have loaded it while we waited
+            mtime = self._mtime(entry.path)
+            if (entry.model is not None and mtime == entry.loaded_mtime
+                    and entry.version == entry.loaded_version):
+                entry.hits += 1
+                return entry.model
+            start = time.perf_counter()
+            if mtime is None:
+                if entry.trainer is None:
+                    raise FileNotFoundError(entry.path)
+                model = entry.trainer()
+                mtime = self._mtime(entry.path)
+            else:
+                model = entry.loader(entry.path)
+            entry.load_seconds += time.perf_counter() - start
+            if entry.model is not None:
+                entry.reloads += 1
+            entry.loads += 1
+            entry.model = model
+            entry.loaded_mtime = mtime
+            entry.loaded_version = entry.version
+            return model
+
+    def evict(self, name: Optional[str] = None):
+        """Drop cached model(s); the next get() loads from disk again."""
+        with self._lock:
+            entries = [self._entries[name]] if name else self._entries.values()
+            for entry in entries:
+                entry.model = None
+                entry.loaded_mtime = None
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "path": e.path,
+                "loaded": e.model is not None,
+                "version": e.loaded_version,
+                "loads": e.loads,
+                "hits": e.hits,
+                "reloads": e.reloads,
+                "load_seconds": e.load_seconds,
+            }
+            for name, e in self._entries.items()
+        }
+
+
+registry = ModelRegistry()
@@ -3,8 +3,10 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from fitness_app.extensions import db, login_manager
 from fitness_app import db
-from sqlalchemy import JSON, UniqueConstraint
+from sqlalchemy import JSON, Index, UniqueConstraint, event, text
 from sqlalchemy.ext.mutable import MutableList
+from sqlalchemy.orm import make_transient_to_detached
+from fitness_app.identity_cache import identity_cache
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
@@ -28,6 +30,10 @@ class User(UserMixin, db.Model):
 
     def check_password(self, password: str) -> bool:
         return check_password_hash(self.password_hash, password)
+
+# longest plan a user can create (WorkoutPlan.days); also bounds date-window queries over plans
+MAX_PLAN_DAYS = 56
+
 class WorkoutPlan(db.Model):
     """One active plan per user at a time."""
     id = db.Column(db.Integer, primary_key=True)
@@ -38,9 +44,29 @@ class WorkoutPlan(db.Model):
     source = db.Column(db.String(20), default="AI")         # "AI" or "Preset"
     intensity = db.Column(db.String(10))                    # Low/Medium/High (from AI)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # progress counters, kept in step with WorkoutDay.completed_count by toggle_item
+    items_total = db.Column(db.Integer)
+    items_completed = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # bumped on every change to the plan's days; part of the dashboard fragment-cache key
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Last-Modified for plan pages
+    # "materialized": every day is a WorkoutDay row. "virtual": days are regenerated from
+    # (goal, intensity, seed, day_index) and a row is only written once a day is touched.
+    storage = db.Column(db.String(12), nullable=False, default="materialized", server_default="materialized")
+    seed = db.Column(db.Integer)
+    # planner.GENERATORS key the days were (and, for virtual plans, keep being) generated with
+    generator_version = db.Column(db.Integer)
+    # written by the nightly batch scorer (batch_scoring.score_active_plans)
+    success_proba = db.Column(db.Float, index=True)
+    adherence = db.Column(db.Float)
+    scored_at = db.Column(db.DateTime, index=True)
 
     user = db.relationship("User", backref=db.backref("plans", lazy=True))
 
+    @property
+    def progress_percent(self) -> int:
+        return int(100 * self.items_completed / self.items_total) if self.items_total else 0
+
 class WorkoutDay(db.Model):
     """Stores the plan for a specific calendar day as a JSON list of items."""
     id = db.Column(db.Integer, primary_key=True)
@@ -48,11 +74,27 @@ class WorkoutDay(db.Model):
     day_index = db.Column(db.Integer, nullable=False)  # 0..N-1 within plan
     date = db.Column(db.Date, nullable=False, index=True)
     items = db.Column(MutableList.as_mutable(db.JSON), nullable=False)           # [{name, sets, reps, minutes, completed}]
+    # Completion lives in completed_mask (bit i = items[i] done) so a checkbox click is a
+    # single atomic UPDATE; the "completed" keys inside items are only the generated defaults.
+    item_count = db.Column(db.Integer)                                          # len(items)
+    completed_mask = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    completed_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")  # popcount(completed_mask)
     # ensure one record per plan/day_index
     __table_args__ = (UniqueConstraint('plan_id', 'day_index', name='uq_plan_day'),)
 
     plan = db.relationship("WorkoutPlan", backref=db.backref("days_list", lazy=True, order_by="WorkoutDay.day_index"))
 
+    def is_completed(self, index: int) -> bool:
+        return bool((self.completed_mask or 0) >> index & 1)
+
+    @property
+    def total_items(self) -> int:
+        return self.item_count if self.item_count is not None else len(self.items)
+
+    @property
+    def all_completed(self) -> bool:
+        return self.completed_count >= self.total_items
+
 class WorkoutLog(db.Model):
     """Optional detailed log per completed item (checkbox events, notes)."""
     id = db.Column(db.Integer, primary_key=True)
@@ -66,6 +108,71 @@ class WorkoutLog(db.Model):
     user = db.relationship("User")
     day = db.relationship("WorkoutDay")
 
+class PlanJob(db.Model):
+    """A queued /planner request; plan_jobs workers turn it into a WorkoutPlan."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    status = db.Column(db.String(10), nullable=False, default="queued", index=True)  # queued/running/done/failed/cancelled
+    days = db.Column(db.Integer, nullable=False)
+    goal = db.Column(db.String(20), nullable=False)
+    plan_id = db.Column(db.Integer, db.ForeignKey("workout_plan.id"))
+    error = db.Column(db.String(500))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # at most one job in flight per user, whichever process inserts it
+    __table_args__ = (Index('uq_plan_job_active_user', 'user_id', unique=True,
+                            sqlite_where=text("status IN ('queued', 'running')"),
+                            postgresql_where=text("status IN ('queued', 'running')")),)
+
+class PlanStatSnapshot(db.Model):
+    """What each plan last contributed to AdminStat, so a refresh can apply only the difference."""
+    plan_id = db.Column(db.Integer, db.ForeignKey("workout_plan.id"), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    goal = db.Column(db.String(20), nullable=False)
+    intensity = db.Column(db.String(10), nullable=False)
+    active = db.Column(db.Boolean, nullable=False)
+    adherence_bucket = db.Column(db.Integer, nullable=False)
+    items_total = db.Column(db.Integer, nullable=False)
+    items_completed = db.Column(db.Integer, nullable=False)
+
+class AdminStat(db.Model):
+    """Plan counters per (goal, intensity, active, adherence bucket); maintained by admin_stats."""
+    goal = db.Column(db.String(20), primary_key=True)
+    intensity = db.Column(db.String(10), primary_key=True)
+    active = db.Column(db.Boolean, primary_key=True)
+    adherence_bucket = db.Column(db.Integer, primary_key=True)   # 0..9 (tenths), -1 not scored yet
+    plans = db.Column(db.Integer, nullable=False, default=0)
+    items_total = db.Column(db.Integer, nullable=False, default=0)
+    items_completed = db.Column(db.Integer, nullable=False, default=0)
+
+class StatsRefresh(db.Model):
+    """Watermark of the last incremental refresh of a summary table."""
+    name = db.Column(db.String(40), primary_key=True)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+    refreshed_on = db.Column(db.Date, nullable=False)
+
+def _identity_fields(user: User) -> dict:
+    return {c.key: getattr(user, c.key) for c in User.__mapper__.column_attrs}
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    uid = int(user_id)
+    fields = identity_cache.get(uid) if identity_cache.enabled else None
+    if fields is not None:
+        # rebuild the row without a SELECT and attach it as if it had been loaded,
+        # so routes can still modify current_user and commit
+        user = User(**fields)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+    user = db.session.get(User, uid)
+    if user is not None:
+        identity_cache.put(uid, _identity_fields(user))
+    return user
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_identity(mapper, connection, target):
+    # catch-all for writes that don't invalidate explicitly (admin tools, scripts)
+    identity_cache.invalidate(target.id)
@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import Flask, current_app
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from fitness_app.db_profile import run_write
+from fitness_app.extensions import db
+from fitness_app.models import PlanJob, User
+from fitness_app.planner import generate_plan_for_user
+
+ACTIVE = ("queued", "running")   # at most one per user (uq_plan_job_active_user)
+
+
+class PlanJobConflict(Exception):
+    """The user's plan is already being generated with other settings."""
+
+
+class PlanJobWorker:
+    """
+    Turns queued PlanJob rows into plans on `threads` background threads.
+
+    The table is the queue: a job is claimed with a single conditional UPDATE,
+    so web processes and `flask plan-worker` processes can all share it. A job
+    left "running" by a process that died is claimed again after `timeout`
+    seconds, at most `max_attempts` times. Threads start lazily (on the first
+    submit or status poll) and are restarted after a fork.
+    """
+
+    def __init__(self, app: Flask, threads: int = 2, poll_interval: float = 5.0,
+                 timeout: float = 300.0, max_attempts: int = 3):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._workers = []
+        self._pid = None
+        self.processed = 0
+        self.failed = 0
+
+    def _ensure_threads(self):
+        if self.threads <= 0 or (self._pid == os.getpid() and self._workers):
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._workers:
+                self._pid = os.getpid()
+                self._wake = threading.Event()
+                self._workers = [threading.Thread(target=self._loop, name=f"plan-job-{i}", daemon=True)
+                                 for i in range(self.threads)]
+                for t in self._workers:
+                    t.start()
+
+    def wake(self):
+        self._ensure_threads()
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            if not self.run_next():
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def run_next(self) -> bool:
+        """Claim and run one job; False when the queue is empty."""
+        try:
+            with self.app.app_context():
+                job_id = run_write(_claim, self.timeout, self.max_attempts)
+                if job_id is None:
+                    return False
+                if run_write(_run_job, job_id):
+                    self.processed += 1
+                else:
+                    self.failed += 1
+                return True
+        except Exception:
+            self.app.logger.exception("Plan job worker error")
+            return False
+
+    def run_pending(self) -> int:
+        n = 0
+        while self.run_next():
+            n += 1
+        return n
+
+    def stats(self) -> dict:
+        return {"threads": len(self._workers), "processed": self.processed, "failed": self.failed}
+
+
+def _stale_before(timeout: float) -> datetime:
+    return datetime.utcnow() - timedelta(seconds=timeout)
+
+
+def _claim(timeout: float, max_attempts: int) -> Optional[int]:
+    stale = and_(PlanJob.status == "running", PlanJob.started_at < _stale_before(timeout))
+    # jobs whose worker died too often are given up
+    db.session.execute(
+        update(PlanJob).where(stale, PlanJob.attempts >= max_attempts)
+        .values(status="failed", error="worker timed out", finished_at=datetime.utcnow()))
+    claimable = and_(or_(PlanJob.status == "queued", stale), PlanJob.attempts < max_attempts)
+    candidate = select(PlanJob.id).where(claimable).order_by(PlanJob.id).limit(1).scalar_subquery()
+    job_id = db.session.scalar(
+        update(PlanJob).where(PlanJob.id == candidate, claimable)
+        .values(status="running", started_at=datetime.utcnow(), attempts=PlanJob.attempts + 1)
+        .returning(PlanJob.id))
+    db.session.commit()
+    return job_id
+
+
+def _run_job(job_id: int) -> bool:
+    job = db.session.get(PlanJob, job_id)
+    try:
+        plan = generate_plan_for_user(db.session.get(User, job.user_id), days=job.days, goal=job.goal,
+                                      commit=False)
+        job.plan_id = plan.id
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+        # plan, days and job state land in one transaction
+        db.session.commit()
+        return True
+    except Exception as exc:
+        db.session.rollback()
+        current_app.logger.exception("Plan job %s failed", job_id)
+        job = db.session.get(PlanJob, job_id)
+        job.status = "failed"
+        job.error = str(exc)[:500]
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return False
+
+
+def _enqueue(user_id: int, days: int, goal: str) -> int:
+    for _ in range(2):
+        active = db.session.execute(
+            select(PlanJob.id, PlanJob.days, PlanJob.goal)
+            .where(PlanJob.user_id == user_id, PlanJob.status.in_(ACTIVE))).first()
+        if active is not None:
+            if (active.days, active.goal) == (days, goal):
+                # a double submit (or an impatient user) reuses the job already in flight
+                return active.id
+            # a queued job with other settings is replaced; a running one can't be stopped
+            replaced = db.session.execute(
+                update(PlanJob).where(PlanJob.id == active.id, PlanJob.status == "queued")
+                .values(status="cancelled", error="replaced by a newer request",
+                        finished_at=datetime.utcnow())).rowcount
+            if not replaced:
+                db.session.rollback()
+                raise PlanJobConflict("Your previous plan request is already being generated; "
+                                      "try again once it is ready.")
+        job = PlanJob(user_id=user_id, days=days, goal=goal)
+        db.session.add(job)
+        try:
+            db.session.commit()
+            return job.id
+        except IntegrityError:
+            # another process queued a job for this user in between; look again
+            db.session.rollback()
+    raise PlanJobConflict("Your previous plan request is still being queued; try again.")
+
+
+def plan_job_worker() -> Optional[PlanJobWorker]:
+    return current_app.extensions.get("plan_jobs")
+
+
+def submit_plan_job(user_id: int, days: int, goal: str) -> int:
+    """
+    Queue a plan request and return its job id without waiting for the plan.
+    Raises PlanJobConflict while a job with other settings is running.
+    """
+    job_id = run_write(_enqueue, user_id, days, goal)
+    plan_job_worker().wake()
+    return job_id
+
+
+def active_job_id(user_id: int) -> Optional[int]:
+    return db.session.scalar(
+        select(PlanJob.id).where(PlanJob.user_id == user_id, PlanJob.status.in_(ACTIVE))
+        .order_by(PlanJob.id.desc()).limit(1))
+
+
+def job_status(job: PlanJob) -> dict:
+    status = {"id": job.id, "status": job.status, "plan_id": job.plan_id, "error": job.error,
+              "created_at": job.created_at.isoformat() if job.created_at else None,
+              "finished_at": job.finished_at.isoformat() if job.finished_at else None}
+    if job.status == "queued":
+        ahead = db.session.scalar(
+            select(func.count()).select_from(PlanJob)
+            .where(PlanJob.status == "queued", PlanJob.id < job.id))
+        status["queue_position"] = ahead + 1
+    return status
+
+
+def init_plan_jobs(app: Flask):
+    if not app.config.get("PLAN_JOBS_ENABLED", True):
+        return
+    app.extensions["plan_jobs"] = PlanJobWorker(
+        app, threads=app.config.get("PLAN_JOB_THREADS", 2),
+        poll_interval=app.config.get("PLAN_JOB_POLL_INTERVAL", 5.0),
+        timeout=app.config.get("PLAN_JOB_TIMEOUT", 300.0))
+
+
+def serve_forever(worker: PlanJobWorker):
+    """Foreground loop for a dedicated worker process."""
+    while True:
+        if not worker.run_pending():
+            time.sleep(worker.poll_interval)
@@ -1,94 +1,24 @@
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 import random
+from types import SimpleNamespace
 from typing import List, Dict, Tuple, Literal
-from fitness_app.models import WorkoutPlan, WorkoutDay, db, User
-import pandas as pd
-from sklearn.tree import DecisionTreeClassifier
-import joblib
+from fitness_app.models import MAX_PLAN_DAYS, WorkoutPlan, WorkoutDay, db, User
+from flask import current_app, has_app_context
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
 import os
+from fitness_app import artifacts
+from fitness_app.model_registry import registry
+from fitness_app.metrics import timed_inference
+from fitness_app.exercise_catalog import DIFFICULTIES, GOALS, catalog
 
 
 
 # --- Exercise banks ---
-BANKS = {
-    "Weight Loss": {
-        "strength": [
-            "Goblet squats", "Walking lunges", "Kettlebell swings", "Plank", "Dips",
-            "Push-ups", "Mountain climbers", "Bodyweight squats", "Step-ups", "Burpees",
-            "Russian twists", "Jumping jacks", "Side lunges"
-        ],
-        "cardio": [
-            "Incline walk", "Steady run", "Tempo run", "Cycling", "Elliptical",
-            "Stair climber", "Swim", "Jump rope", "Rowing machine"
-        ]
-    },
-    "Muscle Gain": {
-        "strength": [
-            "Back squats", "Front squats", "Romanian deadlifts", "Deadlifts",
-            "Bench press", "Overhead press", "Barbell rows", "Pull-ups",
-            "Dumbbell curls", "Tricep extensions", "Chest fly", "Lat pulldown",
-            "Leg press", "Weighted dips", "Bulgarian split squats", "Hammer curls"
-        ],
-        "cardio": [
-            "Rower easy", "Cycling", "Elliptical", "Farmer's walk", "Sled push"
-        ]
-    },
-    "Endurance": {
-        "strength": [
-            "Plank", "Walking lunges", "Goblet squats", "Kettlebell swings",
-            "Step-ups", "Push-ups", "Supermans", "Bodyweight squats",
-            "Side lunges", "Mountain climbers", "Jumping jacks"
-        ],
-        "cardio": [
-            "Steady run", "Tempo run", "Cycling", "Swim", "Incline walk",
-            "Rowing machine", "Stair climber", "Jump rope"
-        ]
-    }
-}
-MEDIA_LINKS = {
-    "Back squats": "https://www.youtube.com/embed/-bJIpOq-LWk",
-    "Front squats": "https://www.youtube.com/embed/W9jJaI4cHJU",
-    "Romanian deadlifts": "https://www.youtube.com/embed/2bmuYtv4HbQ",
-    "Deadlifts": "https://www.youtube.com/embed/yPqv3ejnZvc?si=BW1YXRhzOT_9Miqk",
-    "Bench press": "https://www.youtube.com/embed/4_QuyfOCI5U",
-    "Overhead press": "https://www.youtube.com/embed/cGnhixvC8uA",
-    "Barbell rows": "https://www.youtube.com/embed/bm0_q9bR_HA",
-    "Pull-ups": "https://www.youtube.com/embed/9yVGh3XbJ34",
-    "Dips": "https://www.youtube.com/embed/WVeZDBhZwLA",
-    "Goblet squats": "https://www.youtube.com/embed/MWHIs0zxkCU",
-    "Walking lunges": "https://www.youtube.com/embed/UInwcEa5BH4",
-    "Kettlebell swings": "https://www.youtube.com/embed/r777bo9KuY4",
-    "Plank": "https://www.youtube.com/embed/mwlp75MS6Rg",
-    "Rower easy": "https://www.youtube.com/embed/0R9ZQd3aM6s",
-    "Incline walk": "https://liftmanual.com/wp-content/uploads/2023/04/walking-on-incline-treadmill.jpg",
-    "Steady run": "https://sunriserunco.com/wp-content/uploads/2021/09/Steady-State-Running-featured-image.jpg",
-    "Tempo run": "https://i0.wp.com/post.healthline.com/wp-content/uploads/2020/01/Runner-training-on-running-track-1296x728-header-1296x728.jpg?w=1155&h=1528",
-    "Cycling": "https://cdn.mos.cms.futurecdn.net/v2/t:139,l:0,cw:2700,ch:1518,q:80,w:2700/WXZQnTcQHyt2igzrwhNUyW.jpg",
-    "Elliptical": "https://shop.lifefitness.com/cdn/shop/products/life-fitness-e5-adjustable-stride-elliptical-cross-trainer-woman-1000x1000.jpg?v=1748945400&width=1000",
-    "Stair climber": "https://assets.clevelandclinic.org/transform/LargeFeatureImage/30ac4994-09bb-4ebd-b114-46d1af479237/stair-stepper-gym-1474835659-r",
-    "Swim": "https://www.swimnow.co.uk/wp-content/uploads/2023/05/Health-Benefits-of-Swimming.jpg",
-    "Push-ups": "https://www.youtube.com/embed/WDIpL0pjun0?si=ZOHslrfgjZjlMWGU",
-    "Mountain climbers": "https://www.youtube.com/embed/cnyTQDSE884?si=1JmX4f0kHfY4bX8G",
-    "Bodyweight squats": "https://www.youtube.com/embed/aclHkVaku9U",
-    "Step-ups": "https://www.youtube.com/embed/URHdW9js6DM",
-    "Burpees": "https://www.youtube.com/embed/OO7-dWIy0W8",
-    "Russian twists": "https://www.youtube.com/embed/wkD8rjkodUI",
-    "Jumping jacks": "https://www.youtube.com/embed/uLVt6u15L98",
-    "Side lunges": "https://www.youtube.com/embed/0R9ZQd3aM6s",
-    "Jump rope": "https://www.youtube.com/embed/u3zgHI8QnqE",
-    "Dumbbell curls": "https://www.youtube.com/embed/CFBZ4jN1CMI",
-    "Tricep extensions": "https://www.youtube.com/embed/kZ-ReOdn2qk",
-    "Chest fly": "https://www.youtube.com/embed/Nhvz9EzdJ4U",
-    "Lat pulldown": "https://www.youtube.com/embed/NAIEnMjN-6w",
-    "Leg press": "https://www.youtube.com/embed/cDGOn-yfKJA",
-    "Weighted dips": "https://www.youtube.com/embed/MhPl9Vf4toc",
-    "Bulgarian split squats": "https://www.youtube.com/embed/2C-uNgKwPLE",
-    "Hammer curls": "https://www.youtube.com/embed/CFBZ4jN1CMI",
-    "Farmer's walk": "https://www.youtube.com/embed/8OtwXwrJizk",
-    "Sled push": "https://www.youtube.com/embed/QwscR2BhdEg"
+# Derived from the tagged catalog (exercise_catalog); kept for callers that want plain name lists.
+BANKS = {goal: catalog.bank(goal) for goal in GOALS}
+MEDIA_LINKS = catalog.media_links()
 
-
-}
 def bmi_from_profile(u: User) -> float | None:
     return u.bmi
 
@@ -101,31 +31,283 @@ def preset_volume(intensity: str) -> Tuple[int, int, int]:
     }
     return cfg.get(intensity)
 
-def make_day(strength_moves: int, sets: int, cardio_min: int, bank) -> List[dict]:
-    strength = random.sample(bank["strength"], min(strength_moves, len(bank["strength"])))
+# Strength days rotate through muscle groups. Legs are only trained on even day
+# indexes, so two consecutive days never both hit legs; this depends on nothing
+# but the day index, which keeps virtual plans reproducible.
+LEG_DAY_GROUPS = ("legs", "core", "full_body", "push", "pull")
+UPPER_DAY_GROUPS = ("push", "pull", "core", "full_body")
+
+def _group_order(day_index: int) -> Tuple[str, ...]:
+    if day_index % 2 == 0:
+        rest = LEG_DAY_GROUPS[1:]
+        shift = (day_index // 2) % len(rest)
+        return LEG_DAY_GROUPS[:1] + rest[shift:] + rest[:shift]
+    shift = (day_index // 2) % len(UPPER_DAY_GROUPS)
+    return UPPER_DAY_GROUPS[shift:] + UPPER_DAY_GROUPS[:shift]
+
+def _pick(mask: int, rng) -> int:
+    return rng.choice(catalog.ids(mask))
+
+def make_day(strength_moves: int, sets: int, cardio_min: int, goal: str, rng=random, day_index: int = 0,
+             equipment=None, max_difficulty: str | None = None) -> List[dict]:
+    """
+    One training day: `strength_moves` exercises spread over the day's muscle groups
+    plus one cardio block. `equipment` (a value or list of values) and `max_difficulty`
+    narrow the catalog selection.
+    """
+    filters = {"goals": goal}
+    if equipment is not None:
+        filters["equipment"] = equipment
+    if max_difficulty is not None:
+        filters["difficulty"] = DIFFICULTIES[:DIFFICULTIES.index(max_difficulty) + 1]
+    goal_pool = catalog.mask(kind="strength", **filters)
+    pool = goal_pool if day_index % 2 == 0 else goal_pool & ~catalog.mask(muscle="legs")
+    chosen: List[int] = []
+    taken = 0
+    groups = [catalog.mask(muscle=g) for g in _group_order(day_index)]
+    # round-robin over the groups, one move per group per pass
+    while len(chosen) < strength_moves:
+        progressed = False
+        for group in groups:
+            if len(chosen) == strength_moves:
+                break
+            candidates = pool & group & ~taken
+            if candidates:
+                i = _pick(candidates, rng)
+                chosen.append(i)
+                taken |= 1 << i
+                progressed = True
+        if not progressed:
+            break
+    # catalogs too small for the constraints: top up from the whole goal pool
+    for fallback in (pool, goal_pool):
+        while len(chosen) < strength_moves and fallback & ~taken:
+            i = _pick(fallback & ~taken, rng)
+            chosen.append(i)
+            taken |= 1 << i
+    items: List[dict] = [{"name": catalog.exercises[i].name, "sets": sets, "reps": 8, "completed": False}
+                         for i in chosen]
+    cardio = catalog.mask(kind="cardio", **filters) or catalog.mask(kind="cardio", goals=goal)
+    items.append({"name": catalog.exercises[_pick(cardio, rng)].name, "minutes": cardio_min, "completed": False})
+    return items
+
+RECOVERY_DAY = [{"name": "Active recovery walk", "minutes": 20, "completed": False}]
+
+def day_items(day_index: int, intensity: str, goal: str, rng=random) -> List[dict]:
+    if (day_index % 4) == 3:
+        return [dict(item) for item in RECOVERY_DAY]
+    strength_moves, sets, cardio = preset_volume(intensity)
+    return make_day(strength_moves, sets, cardio, goal, rng, day_index)
+
+# Version 1: the generator from before the exercise catalog, sampling from fixed per-goal
+# name lists. Frozen: virtual plans created with it are still regenerated with it.
+_V1_BANKS = {
+    "Weight Loss": {
+        "strength": ["Goblet squats", "Walking lunges", "Kettlebell swings", "Plank", "Dips",
+                     "Push-ups", "Mountain climbers", "Bodyweight squats", "Step-ups", "Burpees",
+                     "Russian twists", "Jumping jacks", "Side lunges"],
+        "cardio": ["Incline walk", "Steady run", "Tempo run", "Cycling", "Elliptical",
+                   "Stair climber", "Swim", "Jump rope", "Rowing machine"],
+    },
+    "Muscle Gain": {
+        "strength": ["Back squats", "Front squats", "Romanian deadlifts", "Deadlifts",
+                     "Bench press", "Overhead press", "Barbell rows", "Pull-ups",
+                     "Dumbbell curls", "Tricep extensions", "Chest fly", "Lat pulldown",
+                     "Leg press", "Weighted dips", "Bulgarian split squats", "Hammer curls"],
+        "cardio": ["Rower easy", "Cycling", "Elliptical", "Farmer's walk", "Sled push"],
+    },
+    "Endurance": {
+        "strength": ["Plank", "Walking lunges", "Goblet squats", "Kettlebell swings",
+                     "Step-ups", "Push-ups", "Supermans", "Bodyweight squats",
+                     "Side lunges", "Mountain climbers", "Jumping jacks"],
+        "cardio": ["Steady run", "Tempo run", "Cycling", "Swim", "Incline walk",
+                   "Rowing machine", "Stair climber", "Jump rope"],
+    },
+}
+
+def _v1_day_items(day_index: int, intensity: str, goal: str, rng=random) -> List[dict]:
+    if (day_index % 4) == 3:
+        return [dict(item) for item in RECOVERY_DAY]
+    strength_moves, sets, cardio_min = preset_volume(intensity)
+    bank = _V1_BANKS[goal]
+    strength = rng.sample(bank["strength"], min(strength_moves, len(bank["strength"])))
     items: List[dict] = [{"name": mv, "sets": sets, "reps": 8, "completed": False} for mv in strength]
-    items.append({"name": random.choice(bank["cardio"]), "minutes": cardio_min, "completed": False})
+    items.append({"name": rng.choice(bank["cardio"]), "minutes": cardio_min, "completed": False})
     return items
 
-def generate_plan_for_user(user: User, days: int = 28, source: str = "AI", goal: Literal["Weight Loss", "Muscle Gain", "Endurance"] = "Weight Loss"
-) -> WorkoutPlan:
+# Day generators by version. A virtual plan stores the version it was created with and
+# its untouched days are always regenerated with that one, so anything that changes what
+# a generator returns for a given rng (make_day, the catalog, the volumes, the recovery
+# days) must be added as a new version; an old one can only go once no virtual plan uses
+# it (`flask materialize-plans --generator N` writes those plans' days out).
+# Version 2: day_items over the exercise catalog, muscle groups balanced per day.
+GENERATORS = {1: _v1_day_items, 2: day_items}
+GENERATOR_VERSION = 2
+
+def seeded_day_items(seed: int, day_index: int, intensity: str, goal: str, generator: int) -> List[dict]:
+    """Items of one day of a virtual plan; the same inputs always give the same day."""
+    if generator not in GENERATORS:
+        raise ValueError(f"Unknown plan generator: {generator}")
+    # str seeds are hashed with sha512, so this is stable across processes and PYTHONHASHSEED
+    return GENERATORS[generator](day_index, intensity, goal, random.Random(f"{seed}:{day_index}"))
+
+def build_day_rows(plan_id: int, start: date, days: int, intensity: str, goal: str, rng=random) -> List[dict]:
+    """Column dicts for every WorkoutDay of a plan (current generator), ready for a bulk insert."""
+    rows = []
+    for i in range(days):
+        items = GENERATORS[GENERATOR_VERSION](i, intensity, goal, rng)
+        rows.append({"plan_id": plan_id, "day_index": i, "date": start + timedelta(days=i), "items": items,
+                     "item_count": len(items), "completed_mask": 0, "completed_count": 0})
+    return rows
+
+def virtual_items_total(seed: int, days: int, intensity: str, goal: str, generator: int) -> int:
+    return sum(len(seeded_day_items(seed, i, intensity, goal, generator)) for i in range(days))
+
+def _plan_storage(storage: str | None) -> str:
+    if storage is None:
+        storage = current_app.config.get("PLAN_STORAGE", "materialized") if has_app_context() else "materialized"
+    if storage not in ("materialized", "virtual"):
+        raise ValueError(f"Unknown plan storage: {storage}")
+    return storage
+
+def generate_plan_for_user(user: User, days: int = 28, source: str = "AI", goal: Literal["Weight Loss", "Muscle Gain", "Endurance"] = "Weight Loss",
+                           storage: Literal["materialized", "virtual"] | None = None, commit: bool = True) -> WorkoutPlan:
+    """commit=False leaves the plan flushed but uncommitted, for callers that write more in the same transaction."""
+    if not 1 <= days <= MAX_PLAN_DAYS:
+        raise ValueError(f"Plan length must be 1-{MAX_PLAN_DAYS} days, got {days}")
+    storage = _plan_storage(storage)
     bmi = bmi_from_profile(user)
-    intensity = predict_intensity_from_bmi(bmi) if bmi is not None else 1
-    strength_moves, sets, cardio = preset_volume(intensity)
+    intensity = predict_intensity_from_bmi(bmi) if bmi is not None else "Medium"
     start = date.today()
-    plan = WorkoutPlan(user_id=user.id, start_date=start, days=days, source=source, intensity=intensity, goal=goal)
-    db.session.add(plan)
-    db.session.flush()
-    for i in range(days):
-        d = start + timedelta(days=i)
-        if (i % 4) == 3:
-            items = [{"name": "Active recovery walk", "minutes": 20, "completed": False}]
-        else:
-            items = make_day(strength_moves, sets, cardio, BANKS[goal])
-        db.session.add(WorkoutDay(plan_id=plan.id, day_index=i, date=d, items=items))
-    db.session.commit()
+    plan = WorkoutPlan(user_id=user.id, start_date=start, days=days, source=source, intensity=intensity, goal=goal,
+                       storage=storage, generator_version=GENERATOR_VERSION)
+    if storage == "virtual":
+        # nothing but the seed (and the generator version) is stored; days are generated when viewed
+        plan.seed = random.getrandbits(31)
+        plan.items_total = virtual_items_total(plan.seed, days, intensity, goal, GENERATOR_VERSION)
+        db.session.add(plan)
+        db.session.flush()
+    else:
+        db.session.add(plan)
+        db.session.flush()
+        rows = build_day_rows(plan.id, start, days, intensity, goal)
+        plan.items_total = sum(r["item_count"] for r in rows)
+        # one executemany for all days instead of an ORM object per day
+        db.session.execute(insert(WorkoutDay), rows)
+    if commit:
+        db.session.commit()
     return plan
 
+def virtual_day(plan: WorkoutPlan, day_index: int) -> WorkoutDay:
+    """Transient (never added to the session) WorkoutDay for an untouched day of a virtual plan."""
+    items = seeded_day_items(plan.seed, day_index, plan.intensity, plan.goal, plan.generator_version)
+    return WorkoutDay(plan_id=plan.id, day_index=day_index, date=plan.start_date + timedelta(days=day_index),
+                      items=items, item_count=len(items), completed_mask=0, completed_count=0)
+
+def get_plan_days(plan: WorkoutPlan) -> List[WorkoutDay]:
+    """All days of a plan in order; for virtual plans untouched days are generated on the fly."""
+    rows = (WorkoutDay.query
+            .filter_by(plan_id=plan.id)
+            .order_by(WorkoutDay.day_index)
+            .all())
+    if plan.storage != "virtual":
+        return rows
+    by_index = {d.day_index: d for d in rows}
+    return [by_index.get(i) or virtual_day(plan, i) for i in range(plan.days)]
+
+def materialize_day(user_id: int, plan_id: int, day_index: int) -> int | None:
+    """
+    Id of the WorkoutDay row for (plan_id, day_index), inserting it first if the day of a
+    virtual plan was never touched. None if the plan isn't the user's or the day is out of range.
+    """
+    plan = db.session.execute(
+        select(WorkoutPlan.id, WorkoutPlan.storage, WorkoutPlan.seed, WorkoutPlan.start_date,
+               WorkoutPlan.days, WorkoutPlan.intensity, WorkoutPlan.goal, WorkoutPlan.generator_version)
+        .where(WorkoutPlan.id == plan_id, WorkoutPlan.user_id == user_id)).first()
+    if plan is None or not 0 <= day_index < plan.days:
+        return None
+    existing = select(WorkoutDay.id).where(WorkoutDay.plan_id == plan_id, WorkoutDay.day_index == day_index)
+    day_id = db.session.scalar(existing)
+    if day_id is not None or plan.storage != "virtual":
+        return day_id
+    items = seeded_day_items(plan.seed, day_index, plan.intensity, plan.goal, plan.generator_version)
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(WorkoutDay).values(
+                plan_id=plan_id, day_index=day_index, date=plan.start_date + timedelta(days=day_index),
+                items=items, item_count=len(items), completed_mask=0, completed_count=0))
+    except IntegrityError:
+        pass  # another request materialized it first (uq_plan_day)
+    return db.session.scalar(existing)
+
+def set_item_completed(user_id: int, day_id: int, item_index: int, completed: bool = True) -> Tuple[int, int] | None:
+    """
+    Atomically set/clear one item's completion bit on a day owned by user_id and keep
+    the day and plan counters in step. Does not commit.
+    Returns (completed_count, item_count) of the day, or None if nothing matched.
+    """
+    if item_index < 0 or item_index >= 63:
+        return None
+    bit = 1 << item_index
+    mask = WorkoutDay.completed_mask
+    if completed:
+        flips, new_mask, delta = mask.bitwise_and(bit) == 0, mask.bitwise_or(bit), 1
+    else:
+        flips, new_mask, delta = mask.bitwise_and(bit) != 0, mask.bitwise_and(~bit), -1
+    matches = (WorkoutDay.id == day_id,
+               WorkoutDay.item_count > item_index,
+               WorkoutDay.plan_id.in_(select(WorkoutPlan.id).where(WorkoutPlan.user_id == user_id)))
+    stmt = (update(WorkoutDay)
+            .where(*matches, flips)
+            .values(completed_mask=new_mask, completed_count=WorkoutDay.completed_count + delta)
+            .returning(WorkoutDay.plan_id, WorkoutDay.completed_count, WorkoutDay.item_count)
+            .execution_options(synchronize_session=False))
+    row = db.session.execute(stmt).first()
+    if row is None:
+        # already in the requested state (e.g. a double click), or not this user's day
+        row = db.session.execute(select(WorkoutDay.completed_count, WorkoutDay.item_count).where(*matches)).first()
+        return (row.completed_count, row.item_count) if row else None
+    db.session.execute(update(WorkoutPlan)
+                       .where(WorkoutPlan.id == row.plan_id)
+                       .values(items_completed=WorkoutPlan.items_completed + delta,
+                               version=WorkoutPlan.version + 1,
+                               updated_at=datetime.utcnow())
+                       .execution_options(synchronize_session=False))
+    return row.completed_count, row.item_count
+
+def get_plan_progress(user_id: int) -> dict | None:
+    """Completed/total counters of the user's latest plan, read without loading any items JSON."""
+    plan = db.session.execute(
+        select(WorkoutPlan.id, WorkoutPlan.start_date, WorkoutPlan.days,
+               WorkoutPlan.items_completed, WorkoutPlan.items_total,
+               WorkoutPlan.storage, WorkoutPlan.seed, WorkoutPlan.intensity, WorkoutPlan.goal,
+               WorkoutPlan.generator_version)
+        .where(WorkoutPlan.user_id == user_id)
+        .order_by(WorkoutPlan.id.desc()).limit(1)).first()
+    if plan is None:
+        return None
+    days = db.session.execute(
+        select(WorkoutDay.day_index, WorkoutDay.completed_count, WorkoutDay.item_count)
+        .where(WorkoutDay.plan_id == plan.id)
+        .order_by(WorkoutDay.day_index)).all()
+    if plan.storage == "virtual":
+        stored = {d.day_index: d for d in days}
+        days = [stored.get(i) or SimpleNamespace(
+                    day_index=i, completed_count=0,
+                    item_count=len(seeded_day_items(plan.seed, i, plan.intensity, plan.goal,
+                                                    plan.generator_version)))
+                for i in range(plan.days)]
+    total = plan.items_total or 0
+    return {
+        "plan_id": plan.id,
+        "day_index": (date.today() - plan.start_date).days,
+        "days": plan.days,
+        "items_completed": plan.items_completed,
+        "items_total": total,
+        "percent": int(100 * plan.items_completed / total) if total else 0,
+        "per_day": [{"day_index": d.day_index, "completed": d.completed_count, "total": d.item_count} for d in days],
+    }
+
 def get_today_for_user(user: User) -> Tuple[WorkoutPlan | None, WorkoutDay | None, int | None]:
     plan = (WorkoutPlan.query
             .filter_by(user_id=user.id)
@@ -135,26 +317,62 @@ def get_today_for_user(user: User) -> Tuple[WorkoutPlan | None, WorkoutDay | Non
     delta = (date.today() - plan.start_date).days
     if delta < 0 or delta >= plan.days: return plan, None, delta
     wday = WorkoutDay.query.filter_by(plan_id=plan.id, day_index=delta).first()
+    if wday is None and plan.storage == "virtual":
+        wday = virtual_day(plan, delta)
     return plan, wday, delta
 
 DTREE_PATH = os.path.join(os.path.dirname(__file__), "model_intensity.joblib")
+DTREE_FAST_PATH = os.path.join(os.path.dirname(__file__), "model_intensity.npz")
+
+# pandas/sklearn/joblib (and numpy) are imported inside the helpers that need them,
+# so importing the planner (and the web app) does not pull in the ML stack.
+def load_intensity_dataset():
+    from fitness_app.training import load_frame
+    return load_frame()
 
 def train_intensity_model():
-    df = pd.read_csv(os.path.join(os.path.dirname(__file__), "fitness_dataset.csv"))
-    X = df[["BMI"]]
-    y = df["avg_intensity"]
-    clf = DecisionTreeClassifier(max_depth=3)
-    clf.fit(X, y)
-    joblib.dump(clf, DTREE_PATH)
+    """New version under artifacts/intensity (tree + compiled .npz), made current."""
+    from fitness_app.training import train_model
+    clf, _ = train_model("intensity")
     return clf
 
+def _shipped_intensity_model():
+    # no trained version yet: DTREE_PATH ships with the package
+    if os.path.exists(DTREE_PATH):
+        import joblib
+        return joblib.load(DTREE_PATH)
+    return train_intensity_model()
+
+registry.register("intensity", artifacts.current_path("intensity", "model.joblib"),
+                  trainer=_shipped_intensity_model)
+
+def _load_fast(metadata_path):
+    from fitness_app.ml_engine import load_fast
+    return load_fast(metadata_path)
+
+def _shipped_intensity_fast():
+    from fitness_app.tree_compile import load_compiled  # numpy only
+    return load_compiled(DTREE_FAST_PATH)
+
+registry.register("intensity_fast", artifacts.current_path("intensity", artifacts.METADATA),
+                  loader=_load_fast, trainer=_shipped_intensity_fast)
+
 def get_intensity_model():
-    if not os.path.exists(DTREE_PATH):
-        return train_intensity_model()
-    return joblib.load(DTREE_PATH)
+    # loaded once per process; reloaded only if the joblib file changes
+    return registry.get("intensity")
+
+def get_intensity_predictor():
+    """Compiled (sklearn-free) intensity tree, or the sklearn model if not exported."""
+    try:
+        return registry.get("intensity_fast")
+    except FileNotFoundError:
+        return get_intensity_model()
 
 def predict_intensity_from_bmi(bmi: float) -> str:
-    clf = get_intensity_model()
-    pred = int(clf.predict([[bmi]])[0])
+    model = get_intensity_predictor()
+    with timed_inference("intensity"):
+        if hasattr(model, "predict_one"):
+            pred = int(model.predict_one([bmi]))
+        else:
+            pred = int(model.predict([[bmi]])[0])
     return ["Low", "Medium", "High"][pred]
-
@@ -0,0 +1,288 @@
+"""
+Preload-and-fork production server.
+
+The master builds the app, loads the models into the process-wide registry,
+freezes the GC (so collections in the workers don't write to the shared
+pages) and only then forks WEB_WORKERS workers. Each worker serves the
+shared listening socket with a pool of WEB_THREADS request threads, so the
+models are loaded once and shared copy-on-write.
+
+    python -m fitness_app.prefork --bind 0.0.0.0:8000 --workers 4 --threads 8
+
+Signals to the master:
+    TERM/INT  graceful stop: workers finish in-flight requests (up to
+              WEB_GRACEFUL_TIMEOUT seconds), then exit
+    HUP       rolling restart: reload promoted models in the master, start a
+              new generation of workers, then stop the old one gracefully
+    TTIN/TTOU one worker more / less
+Code changes need a full restart (the app is imported once, in the master).
+"""
+import argparse
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict
+
+from flask import Flask
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+log = logging.getLogger(__name__)
+
+
+class _RequestHandler(WSGIRequestHandler):
+    # one request per connection: an idle keep-alive connection would hold a
+    # pool thread (run behind a reverse proxy that keeps client connections)
+    protocol_version = "HTTP/1.0"
+    access_log = False
+
+    def log_request(self, code="-", size="-"):
+        if self.access_log:
+            super().log_request(code, size)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    werkzeug's server with a bounded thread pool. A pool slot is taken before
+    accept(), so while all threads are busy the worker accepts nothing and new
+    connections stay in the shared listen queue for the other workers.
+    """
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host: str, port: int, app, fd: int, threads: int, max_requests: int = 0):
+        super().__init__(host, port, app, handler=_RequestHandler, fd=fd)
+        self._slots = threading.BoundedSemaphore(threads)
+        self._active = set()
+        self._active_lock = threading.Lock()
+        self.max_requests = max_requests
+        self.handled = 0
+
+    def _handle_request_noblock(self):
+        # serve_forever calls this once the listening socket is readable; the timeout
+        # returns to its loop now and then, so shutdown() is noticed while all slots are busy
+        if not self._slots.acquire(timeout=0.5):
+            return
+        try:
+            request, client_address = self.get_request()
+        except OSError:
+            self._slots.release()
+            return
+        if not self.verify_request(request, client_address):
+            self.shutdown_request(request)
+            self._slots.release()
+            return
+        try:
+            self.process_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def process_request(self, request, client_address):
+        # the slot was taken in _handle_request_noblock; _handle gives it back
+        thread = threading.Thread(target=self._handle, args=(request, client_address), daemon=True)
+        with self._active_lock:
+            self._active.add(thread)
+        thread.start()
+        self.handled += 1
+        if self.max_requests and self.handled >= self.max_requests:
+            # recycled by the master; bounds slow leaks
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._active_lock:
+                self._active.discard(threading.current_thread())
+            self._slots.release()
+
+    def drain(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        with self._active_lock:
+            threads = list(self._active)
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+
+def preload(app: Flask):
+    """Everything the workers should inherit instead of loading themselves."""
+    from fitness_app import warmup_models
+    from fitness_app.extensions import db
+    warmup_models()
+    with app.app_context():
+        # connections opened by schema upgrades must not be shared with the children
+        db.engine.dispose()
+    gc.collect()
+    gc.freeze()
+
+
+class Master:
+    def __init__(self, app: Flask, sock: socket.socket, workers: int, threads: int,
+                 graceful_timeout: float = 30.0, max_requests: int = 0):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.max_requests = max_requests
+        self.children: Dict[int, int] = {}     # pid -> generation
+        self.generation = 0
+        self._signals = []
+        self._stopping = False
+
+    # -- workers --------------------------------------------------------------
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = self.generation
+            return
+        code = 0
+        try:
+            self._worker()
+        except BaseException:
+            log.exception("Worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _worker(self):
+        for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)   # Ctrl-C reaches the whole group; the master decides
+        random.seed()
+        from fitness_app.extensions import db
+        with self.app.app_context():
+            db.engine.dispose(close=False)
+        host, port = self.sock.getsockname()[:2]
+        # jitter so the workers don't all recycle at once
+        max_requests = self.max_requests + random.randint(0, self.max_requests // 10) if self.max_requests else 0
+        server = PooledWSGIServer(host, port, self.app, self.sock.fileno(), self.threads, max_requests)
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+        server.serve_forever()
+        server.drain(self.graceful_timeout)
+        buffer = self.app.extensions.get("workout_log_buffer")
+        if buffer is not None:
+            buffer.shutdown()
+
+    def _kill(self, pids, sig):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            generation = self.children.pop(pid, None)
+            code = os.waitstatus_to_exitcode(status)
+            if generation == self.generation and not self._stopping and code not in (0, -signal.SIGTERM):
+                log.warning("Worker %d exited with %d; replacing it", pid, code)
+
+    def _current(self):
+        return [pid for pid, gen in self.children.items() if gen == self.generation]
+
+    def _stop_old(self):
+        old = [pid for pid, gen in self.children.items() if gen != self.generation]
+        self._kill(old, signal.SIGTERM)
+
+    # -- control loop -----------------------------------------------------------
+
+    def run(self):
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, lambda signum, _: self._signals.append(signum))
+        signal.signal(signal.SIGCHLD, lambda *_: None)   # interrupts the sleep below
+        log.info("Serving on %s:%s with %d workers x %d threads",
+                 *self.sock.getsockname()[:2], self.workers, self.threads)
+        while True:
+            self._reap()
+            while self._signals:
+                self._handle_signal(self._signals.pop(0))
+            if self._stopping:
+                break
+            for _ in range(self.workers - len(self._current())):
+                self.spawn()
+            for pid in self._current()[self.workers:]:
+                self._kill([pid], signal.SIGTERM)
+                self.children[pid] = -1   # retired; don't count it again
+            time.sleep(0.5)
+        self._shutdown()
+
+    def _handle_signal(self, signum):
+        if signum in (signal.SIGTERM, signal.SIGINT):
+            self._stopping = True
+        elif signum == signal.SIGHUP:
+            log.info("Rolling restart")
+            from fitness_app import warmup_models
+            gc.unfreeze()
+            warmup_models()      # picks up newly promoted artifacts
+            gc.collect()
+            gc.freeze()
+            self.generation += 1
+            for _ in range(self.workers):
+                self.spawn()
+            self._stop_old()
+        elif signum == signal.SIGTTIN:
+            self.workers += 1
+        elif signum == signal.SIGTTOU:
+            self.workers = max(self.workers - 1, 1)
+
+    def _shutdown(self):
+        log.info("Stopping %d workers", len(self.children))
+        self._kill(list(self.children), signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        self._kill(list(self.children), signal.SIGKILL)
+        while self.children:
+            pid, _ = os.waitpid(-1, 0)
+            self.children.pop(pid, None)
+        self.sock.close()
+
+
+def bind(address: str, backlog: int = 2048) -> socket.socket:
+    host, _, port = address.rpartition(":")
+    sock = socket.create_server((host or "0.0.0.0", int(port)), backlog=backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(argv=None):
+    from fitness_app import create_app
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(message)s")
+    app = create_app()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bind", default=app.config["WEB_BIND"])
+    parser.add_argument("--workers", type=int, default=app.config["WEB_WORKERS"])
+    parser.add_argument("--threads", type=int, default=app.config["WEB_THREADS"])
+    parser.add_argument("--graceful-timeout", type=float, default=app.config["WEB_GRACEFUL_TIMEOUT"])
+    parser.add_argument("--max-requests", type=int, default=app.config["WEB_MAX_REQUESTS"],
+                        help="recycle a worker after this many requests (0: never)")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args(argv)
+
+    _RequestHandler.access_log = args.access_log
+    sock = bind(args.bind)
+    preload(app)
+    Master(app, sock, args.workers, args.threads, args.graceful_timeout, args.max_requests).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Opt-in per-request profiling.
+
+A request runs under cProfile when an admin asks for it (PROFILE_HEADER
+header or PROFILE_QUERY_ARG query argument set to 1) or when it is picked
+by 1-in-PROFILE_SAMPLE_RATE sampling (0 disables sampling). Each capture is
+written to PROFILE_DIR as <id>.prof (pstats format, e.g. for snakeviz) plus
+<id>.json with the request's path, timing and SQL counts; only the newest
+PROFILE_KEEP captures are kept. The admin dashboard lists them.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from flask import Flask, current_app, g, request
+from flask_login import current_user
+
+
+class RequestProfiler:
+    def __init__(self, directory: str, keep: int = 50, sample_rate: int = 0,
+                 header: str = "X-Profile", query_arg: str = "_profile"):
+        self.directory = directory
+        self.keep = keep
+        self.sample_rate = sample_rate
+        self.header = header
+        self.query_arg = query_arg
+        self._lock = threading.Lock()
+        self.captures = 0
+
+    def trigger(self) -> Optional[str]:
+        """Why this request should be profiled, or None."""
+        if request.endpoint == "static":
+            return None
+        if request.headers.get(self.header) == "1" or request.args.get(self.query_arg) == "1":
+            # only now is the user looked up; ordinary requests don't pay for it
+            if current_user.is_authenticated and current_user.is_admin:
+                return "admin"
+        if self.sample_rate and random.randrange(self.sample_rate) == 0:
+            return "sampled"
+        return None
+
+    @staticmethod
+    def new_capture_id(endpoint: Optional[str]) -> str:
+        endpoint = (endpoint or "unknown").replace(".", "-")
+        return f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}-{endpoint}"
+
+    def save(self, profile: cProfile.Profile, meta: dict, capture_id: Optional[str] = None) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        capture_id = capture_id or self.new_capture_id(meta["endpoint"])
+        base = os.path.join(self.directory, capture_id)
+        profile.dump_stats(base + ".prof.tmp")
+        os.replace(base + ".prof.tmp", base + ".prof")
+        with open(base + ".json.tmp", "w", encoding="utf-8") as fh:
+            json.dump(dict(meta, id=capture_id), fh)
+        os.replace(base + ".json.tmp", base + ".json")
+        with self._lock:
+            self.captures += 1
+            self._prune()
+        return capture_id
+
+    def _prune(self):
+        names = sorted(f[:-5] for f in os.listdir(self.directory) if f.endswith(".json"))
+        for capture_id in names[:-self.keep] if self.keep else []:
+            for ext in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.directory, capture_id + ext))
+                except FileNotFoundError:
+                    pass
+
+    def recent(self, limit: int = 20) -> List[dict]:
+        """Newest captures first (metadata only)."""
+        try:
+            names = sorted((f for f in os.listdir(self.directory) if f.endswith(".json")), reverse=True)
+        except FileNotFoundError:
+            return []
+        out = []
+        for name in names[:limit]:
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as fh:
+                    out.append(json.load(fh))
+            except (FileNotFoundError, ValueError):
+                continue   # pruned or half-written by another worker
+        return out
+
+    def path(self, capture_id: str) -> Optional[str]:
+        """.prof path of a capture; None for unknown ids (ids come from the URL)."""
+        if os.path.basename(capture_id) != capture_id:
+            return None
+        path = os.path.join(self.directory, capture_id + ".prof")
+        return path if os.path.isfile(path) else None
+
+    def summary(self, capture_id: str, limit: int = 40, sort: str = "cumulative") -> Optional[str]:
+        path = self.path(capture_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+def request_profiler() -> Optional[RequestProfiler]:
+    return current_app.extensions.get("request_profiler")
+
+
+def init_request_profiler(app: Flask):
+    if not app.config.get("PROFILER_ENABLED", True):
+        return
+    profiler = RequestProfiler(
+        app.config.get("PROFILE_DIR") or os.path.join(app.instance_path, "profiles"),
+        keep=app.config.get("PROFILE_KEEP", 50),
+        sample_rate=app.config.get("PROFILE_SAMPLE_RATE", 0),
+        header=app.config.get("PROFILE_HEADER", "X-Profile"),
+        query_arg=app.config.get("PROFILE_QUERY_ARG", "_profile"))
+    app.extensions["request_profiler"] = profiler
+
+    @app.before_request
+    def _start_profile():
+        trigger = profiler.trigger()
+        if trigger is None:
+            return
+        profile = cProfile.Profile()
+        # the id is fixed up front: the header goes out before teardown writes the capture
+        g.profile = (profile, trigger, time.perf_counter(), profiler.new_capture_id(request.endpoint))
+        profile.enable()
+
+    @app.after_request
+    def _profile_header(response):
+        started = g.get("profile")
+        if started is not None:
+            g.profile_status = response.status_code
+            if started[1] == "admin":
+                response.headers["X-Profile-Id"] = started[3]
+        return response
+
+    @app.teardown_request
+    def _save_profile(exc):
+        # teardown also runs when the view raised, so those requests are captured too
+        started = g.pop("profile", None)
+        if started is None:
+            return
+        profile, trigger, start, capture_id = started
+        profile.disable()
+        meta = {
+            "endpoint": request.endpoint, "method": request.method, "path": request.full_path.rstrip("?"),
+            "status": 500 if exc is not None else g.pop("profile_status", 500), "trigger": trigger,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            "sql_queries": g.get("sql_queries"), "sql_ms": round(g.get("sql_seconds", 0.0) * 1000, 2),
+            "user_id": current_user.get_id() if current_user.is_authenticated else None,
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        }
+        try:
+            profiler.save(profile, meta, capture_id)
+        except OSError:
+            app.logger.exception("Saving request profile failed")
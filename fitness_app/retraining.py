@@ -0,0 +1,218 @@
+"""
+Daily refresh of the plan-success model from the app's own outcomes.
+
+harvest_outcomes() turns plans that finished since the last watermark into
+training rows (features as in batch_scoring, plan_adherence_rate included:
+batch_scoring.plan_adherence over the plan's first ADHERENCE_DAYS; label: at
+least SUCCESS_RATE of the plan's items completed) and appends them as a shard under
+artifacts/plan_success/feedback/. retrain() then either fits a new model on
+the CSV plus all shards ("full"), or, when the current model is a forest,
+adds trees fitted on the shards it hasn't seen ("incremental"). The
+candidate is promoted only if it beats the current model on the same
+holdout rows and, for single trees, its compiled form (what the web workers
+serve) predicts exactly what sklearn does on them.
+
+The intensity model is not refreshed: its label is the intensity the app
+assigned, so the app's data would only teach it its own predictions.
+"""
+import copy
+import json
+import os
+import time
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from fitness_app import artifacts
+from fitness_app.batch_scoring import ADHERENCE, feature_columns, plan_adherence
+from fitness_app.ml_engine import FEATURE_COLS, success_proba
+from fitness_app.models import MAX_PLAN_DAYS, User, WorkoutPlan, db
+from fitness_app.training import (TrainingData, evaluate, holdout_weights, impute, imputation_values,
+                                  load_training_data, store_model, train_model)
+from fitness_app.tree_compile import load_compiled
+
+SUCCESS_RATE = 0.7      # share of a plan's items that makes it a success
+HOLDOUT_PERCENT = 20
+
+
+def feedback_dir() -> str:
+    return os.path.join(artifacts.model_dir("plan_success"), "feedback")
+
+
+def _watermark_path() -> str:
+    return os.path.join(feedback_dir(), "watermark.json")
+
+
+def read_watermark() -> Optional[date]:
+    try:
+        with open(_watermark_path(), encoding="utf-8") as fh:
+            return date.fromisoformat(json.load(fh)["through"])
+    except FileNotFoundError:
+        return None
+
+
+def _write_watermark(through: date):
+    tmp = _watermark_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"through": through.isoformat()}, fh)
+    os.replace(tmp, _watermark_path())
+
+
+def _is_holdout(plan_ids: np.ndarray) -> np.ndarray:
+    # fixed per plan, so every retrain compares models on the same rows
+    return (plan_ids * 2654435761 % 2 ** 32) % 100 < HOLDOUT_PERCENT
+
+
+def harvest_outcomes(today: Optional[date] = None, chunk_size: int = 5000) -> int:
+    """Append plans that ended after the watermark and by `today` as a feedback shard."""
+    today = today or date.today()
+    since = read_watermark()
+    X_parts, y_parts, id_parts = [], [], []
+    query = (select(WorkoutPlan.id, WorkoutPlan.start_date, WorkoutPlan.days, WorkoutPlan.storage,
+                    WorkoutPlan.items_total, WorkoutPlan.items_completed, *feature_columns())
+             .join(User, User.id == WorkoutPlan.user_id)
+             .where(WorkoutPlan.start_date <= today, WorkoutPlan.items_total > 0))
+    if since is not None:
+        # a plan ending after the watermark started at most MAX_PLAN_DAYS before it (start_date is indexed)
+        query = query.where(WorkoutPlan.start_date > since - timedelta(days=MAX_PLAN_DAYS))
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            query.where(WorkoutPlan.id > last_id).order_by(WorkoutPlan.id).limit(chunk_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ended = [r for r in rows
+                 if r[1] + timedelta(days=r[2] or 0) <= today
+                 and (since is None or r[1] + timedelta(days=r[2] or 0) > since)]
+        if not ended:
+            continue
+        X = np.array([r[6:] for r in ended], dtype=np.float32)
+        # the same adherence the plan is scored with; the plan is over, so the whole window counts
+        X[:, ADHERENCE] = plan_adherence(ended, today, X[:, ADHERENCE])
+        X_parts.append(X)
+        y_parts.append(np.array([r[5] / r[4] >= SUCCESS_RATE for r in ended], dtype=np.int8))
+        id_parts.append(np.array([r[0] for r in ended], dtype=np.int64))
+    os.makedirs(feedback_dir(), exist_ok=True)
+    n = sum(len(y) for y in y_parts)
+    if n:
+        path = os.path.join(feedback_dir(), f"{today.isoformat()}.npz")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(fh, X=np.concatenate(X_parts), y=np.concatenate(y_parts), plan_id=np.concatenate(id_parts))
+        os.replace(tmp, path)
+    _write_watermark(today)
+    return n
+
+
+def list_shards() -> List[str]:
+    try:
+        return sorted(f for f in os.listdir(feedback_dir()) if f.endswith(".npz"))
+    except FileNotFoundError:
+        return []
+
+
+def load_feedback(shards: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(X, y, holdout) of the given shards; a plan harvested twice is kept once."""
+    if not shards:
+        return np.empty((0, len(FEATURE_COLS)), dtype=np.float32), np.empty(0, dtype=np.int8), np.empty(0, dtype=bool)
+    Xs, ys, ids = [], [], []
+    for name in shards:
+        with np.load(os.path.join(feedback_dir(), name)) as z:
+            Xs.append(z["X"]), ys.append(z["y"]), ids.append(z["plan_id"])
+    plan_ids = np.concatenate(ids)
+    _, first = np.unique(plan_ids, return_index=True)
+    first.sort()
+    return np.concatenate(Xs)[first], np.concatenate(ys)[first], _is_holdout(plan_ids[first])
+
+
+def _current_model():
+    import joblib
+    from fitness_app.ml_engine import MODEL_PATH_PLAN_SUCCESS
+    path = artifacts.current_path("plan_success", "model.joblib")
+    return joblib.load(path if os.path.exists(path) else MODEL_PATH_PLAN_SUCCESS)
+
+
+def compiled_mismatches(version: str, model, X: np.ndarray) -> int:
+    """Rows of X where the compiled tree of `version` disagrees with its sklearn `model` (0 without one)."""
+    npz = os.path.join(artifacts.model_dir("plan_success"), version, "model.npz")
+    if not os.path.exists(npz):
+        return 0
+    return int((~np.isclose(success_proba(X, model=load_compiled(npz)), success_proba(X, model=model))).sum())
+
+
+def _score(metrics: dict, key: str) -> float:
+    return metrics.get(key, float("-inf"))
+
+
+def retrain(mode: str = "auto", min_improvement: float = 0.0, add_trees: int = 20,
+            estimator: Optional[str] = None, n_jobs: Optional[int] = None, promote: bool = True,
+            force: bool = False) -> dict:
+    """
+    Fit a candidate on the feedback collected so far and promote it if it beats
+    the current model on the shared holdout and its compiled tree (if any)
+    agrees with it there. Returns a report dict.
+    """
+    current_meta = artifacts.read_metadata("plan_success") or {}
+    shards = list_shards()
+    seen = current_meta.get("feedback_through")
+    new_shards = [s for s in shards if seen is None or s > seen]
+    if not new_shards and not force:
+        return {"status": "nothing new", "current": current_meta.get("version")}
+
+    base = load_training_data()
+    fb_X, fb_y, fb_holdout = load_feedback(shards)
+    data = TrainingData(
+        X=np.concatenate([base.X, fb_X]), plan_success=np.concatenate([base.plan_success, fb_y]),
+        sha256=base.sha256, rows=base.rows + len(fb_y),
+        holdout=np.concatenate([holdout_weights(base.rows, 0.2) == 0, fb_holdout]))
+    # the current model's medians: it is evaluated (and, incrementally, extended) on these rows
+    medians = imputation_values(current_meta)
+    impute(data.X, medians)
+    current = _current_model()
+    current_metrics = evaluate(current, data.X, data.plan_success, data.holdout)
+    key = "roc_auc" if "roc_auc" in current_metrics else "accuracy"
+
+    new_X, new_y, new_holdout = load_feedback(new_shards)
+    impute(new_X, medians)
+    train_new = ~new_holdout
+    incremental_ok = (hasattr(current, "estimators_") and train_new.any()
+                      and set(np.unique(new_y[train_new])) == set(current.classes_))
+    if mode == "incremental" and not incremental_ok:
+        raise ValueError("incremental retraining needs a forest model and new rows of every class")
+    if mode == "auto":
+        mode = "incremental" if incremental_ok else "full"
+
+    extra = {"mode": mode, "feedback_rows": int(len(fb_y)), "feedback_through": shards[-1] if shards else None,
+             "baseline": {"version": current_meta.get("version"), "metrics": current_metrics}}
+    if mode == "incremental":
+        candidate = copy.deepcopy(current)
+        candidate.set_params(warm_start=True, n_estimators=current.n_estimators + add_trees,
+                             **({"n_jobs": n_jobs} if n_jobs is not None else {}))
+        start = time.perf_counter()
+        candidate.fit(new_X[train_new], new_y[train_new])
+        metrics = evaluate(candidate, data.X, data.plan_success, data.holdout)
+        meta = store_model("plan_success", candidate, current_meta.get("estimator", "forest"), dict(
+            extra, metrics=metrics, impute=dict(zip(FEATURE_COLS, medians.tolist())),
+            train_seconds=round(time.perf_counter() - start, 3),
+            dataset={"file": "feedback", "sha256": base.sha256, "rows": int(train_new.sum())}),
+            promote=False)
+    else:
+        candidate, meta = train_model("plan_success", estimator or current_meta.get("estimator", "tree"),
+                                      data=data, n_jobs=n_jobs, promote=False, extra_metadata=extra)
+
+    improved = _score(meta["metrics"], key) > _score(current_metrics, key) + min_improvement
+    mismatches = compiled_mismatches(meta["version"], candidate, data.X[data.holdout]) if improved else 0
+    if mismatches:
+        status = "compiled mismatch"
+    elif improved and promote:
+        artifacts.promote("plan_success", meta["version"])
+        status = "promoted"
+    else:
+        status = "kept current"
+    return {"status": status, "mode": mode, "compiled_mismatches": mismatches,
+            "metric": key, "candidate": meta["version"], "candidate_metrics": meta["metrics"],
+            "current": current_meta.get("version"), "current_metrics": current_metrics,
+            "new_feedback_rows": int(len(new_y))}
@@ -0,0 +1,182 @@
+from typing import Callable, List
+
+from datetime import datetime
+
+from sqlalchemy import TextClause, func, inspect, literal, text, update
+
+from fitness_app.extensions import db
+
+# Idempotent data fixes that run after new columns were added.
+_BACKFILLS: List[Callable[[], int]] = []
+
+
+def backfill(fn: Callable[[], int]):
+    _BACKFILLS.append(fn)
+    return fn
+
+
+def _default_sql(arg, dialect) -> str:
+    """A server_default as DDL: SQL expressions verbatim, plain values as quoted literals."""
+    if isinstance(arg, TextClause):
+        return arg.text
+    return str(literal(arg).compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+def _add_missing_columns() -> List[str]:
+    """create_all() never alters existing tables; add new nullable/defaulted columns."""
+    engine = db.engine
+    insp = inspect(engine)
+    tables = set(insp.get_table_names())
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        missing = [c for c in table.columns if c.name not in have]
+        for col in missing:
+            ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {col.type.compile(engine.dialect)}'
+            if col.server_default is not None:
+                if not col.nullable:
+                    ddl += " NOT NULL"
+                ddl += f" DEFAULT {_default_sql(col.server_default.arg, engine.dialect)}"
+            with engine.begin() as conn:
+                conn.execute(text(ddl))
+            added.append(f"{table.name}.{col.name}")
+    return added
+
+
+def _create_missing_indexes() -> List[str]:
+    """Indexes declared on existing tables (e.g. on an older column that gained index=True)."""
+    engine = db.engine
+    insp = inspect(engine)
+    tables = set(insp.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        have = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in have:
+                index.create(engine)
+                created.append(index.name)
+    return created
+
+
+def _cancel_duplicate_active_jobs() -> int:
+    """Keep only the newest queued/running PlanJob per user, so uq_plan_job_active_user can be created."""
+    from fitness_app.models import PlanJob
+    active = PlanJob.status.in_(("queued", "running"))
+    newest = (db.session.query(func.max(PlanJob.id)).filter(active).group_by(PlanJob.user_id))
+    n = (db.session.query(PlanJob).filter(active, PlanJob.id.not_in(newest))
+         .update({"status": "cancelled", "error": "duplicate request"}, synchronize_session=False))
+    db.session.commit()
+    return n
+
+
+def upgrade_schema() -> List[str]:
+    """Create missing tables and columns, then run backfills. Returns what changed."""
+    db.create_all()
+    changes = [f"added column {name}" for name in _add_missing_columns()]
+    if _cancel_duplicate_active_jobs():
+        changes.append("cancelled duplicate plan jobs")
+    changes += [f"created index {name}" for name in _create_missing_indexes()]
+    for fn in _BACKFILLS:
+        n = fn()
+        if n:
+            changes.append(f"{fn.__name__}: {n} rows")
+    return changes
+
+
+@backfill
+def backfill_day_completion(batch_size: int = 1000) -> int:
+    """Move completion flags from WorkoutDay.items JSON into item_count/completed_mask."""
+    from fitness_app.models import WorkoutDay
+    total = 0
+    while True:
+        rows = (db.session.query(WorkoutDay.id, WorkoutDay.items)
+                .filter(WorkoutDay.item_count.is_(None))
+                .limit(batch_size).all())
+        if not rows:
+            return total
+        params = []
+        for day_id, items in rows:
+            mask = 0
+            for i, item in enumerate(items):
+                if item.get("completed"):
+                    mask |= 1 << i
+            params.append({"id": day_id, "item_count": len(items), "completed_mask": mask,
+                           "completed_count": bin(mask).count("1")})
+        db.session.execute(update(WorkoutDay), params)
+        db.session.commit()
+        total += len(rows)
+
+
+@backfill
+def backfill_progress_counters() -> int:
+    """Per-day completed_count from the bitmask, then per-plan totals from the days."""
+    from fitness_app.models import WorkoutDay, WorkoutPlan
+    rows = (db.session.query(WorkoutDay.id, WorkoutDay.completed_mask)
+            .filter(WorkoutDay.completed_mask != 0, WorkoutDay.completed_count == 0).all())
+    if rows:
+        db.session.execute(update(WorkoutDay), [
+            {"id": day_id, "completed_count": bin(mask).count("1")} for day_id, mask in rows])
+    sums = (db.session.query(WorkoutDay.plan_id,
+                             func.coalesce(func.sum(WorkoutDay.item_count), 0),
+                             func.coalesce(func.sum(WorkoutDay.completed_count), 0))
+            .join(WorkoutPlan, WorkoutPlan.id == WorkoutDay.plan_id)
+            .filter(WorkoutPlan.items_total.is_(None))
+            .group_by(WorkoutDay.plan_id).all())
+    if sums:
+        db.session.execute(update(WorkoutPlan), [
+            {"id": plan_id, "items_total": total, "items_completed": done} for plan_id, total, done in sums])
+    db.session.commit()
+    return len(rows) + len(sums)
+
+
+@backfill
+def backfill_plan_updated_at() -> int:
+    """Plans from before updated_at existed: their last change is not known, creation is the best bound."""
+    from fitness_app.models import WorkoutPlan
+    n = (db.session.query(WorkoutPlan).filter(WorkoutPlan.updated_at.is_(None))
+         .update({"updated_at": func.coalesce(WorkoutPlan.created_at, datetime.utcnow())},
+                 synchronize_session=False))
+    db.session.commit()
+    return n
+
+
+@backfill
+def backfill_generator_version(batch_size: int = 1000) -> int:
+    """
+    Pin plans from before generator versions were recorded. A virtual plan with a
+    stored strength day gets the generator that reproduces that day; any other plan
+    gets version 2, the generator its untouched days were being shown with.
+    """
+    from fitness_app.models import WorkoutDay, WorkoutPlan
+    from fitness_app.planner import seeded_day_items
+    total = 0
+    while True:
+        plans = (db.session.query(WorkoutPlan.id, WorkoutPlan.storage, WorkoutPlan.seed,
+                                  WorkoutPlan.intensity, WorkoutPlan.goal)
+                 .filter(WorkoutPlan.generator_version.is_(None)).limit(batch_size).all())
+        if not plans:
+            return total
+        virtual = {p.id: p for p in plans if p.storage == "virtual"}
+        stored = {}
+        for plan_id, day_index, items in (db.session.query(WorkoutDay.plan_id, WorkoutDay.day_index, WorkoutDay.items)
+                                          .filter(WorkoutDay.plan_id.in_(list(virtual)), WorkoutDay.day_index % 4 != 3)):
+            stored.setdefault(plan_id, (day_index, items))
+        params = []
+        for p in plans:
+            version = 2
+            if p.id in stored:
+                day_index, items = stored[p.id]
+                names = [item["name"] for item in items]
+                for candidate in (1, 2):
+                    regenerated = seeded_day_items(p.seed, day_index, p.intensity, p.goal, candidate)
+                    if [item["name"] for item in regenerated] == names:
+                        version = candidate
+                        break
+            params.append({"id": p.id, "generator_version": version})
+        db.session.execute(update(WorkoutPlan), params)
+        db.session.commit()
+        total += len(plans)
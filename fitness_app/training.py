@@ -0,0 +1,258 @@
+"""
+Training pipeline for the plan-success and intensity models.
+
+The CSV is read in chunks with compact dtypes and encoded straight into one
+preallocated float32 matrix (the dtype sklearn's trees work in, so fitting
+doesn't copy it). Peak memory is that matrix plus one chunk, whatever the
+file size. The holdout split is done with sample weights instead of copies.
+Missing values are imputed with the training rows' medians before fitting;
+the medians are stored in the artifact's metadata so that scoring fills the
+same gaps with the same values (see imputation_values).
+
+    flask --app fitness_app train-model --target plan_success --estimator forest --n-jobs -1
+"""
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from fitness_app import artifacts
+from fitness_app.ml_engine import FEATURE_COLS, GOALS
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fitness_dataset.csv")
+
+# Numbers are parsed straight to float32 by the C parser (that's what the matrix
+# holds, and NaN stays representable); labels end up as int8.
+DTYPES = {
+    "age": "float32", "height_cm": "float32", "weight_kg": "float32", "BMI": "float32",
+    "plan_length_days": "float32", "avg_sets_per_day": "float32", "avg_reps_per_set": "float32",
+    "avg_cardio_minutes_per_day": "float32", "exercise_types_count": "float32",
+    "previous_success_rate": "float32", "plan_success": "float32",
+    "plan_adherence_rate": "float32", "user_rating": "float32",
+    # categoricals: labels or already-numeric codes, both are accepted
+    "gender": "category", "fitness_level": "category", "goal": "category",
+    "previous_goal": "category", "avg_intensity": "category",
+}
+LABELS = {
+    "gender": {"Female": 0, "Male": 1},
+    "fitness_level": {"Beginner": 0, "Intermediate": 1, "Advanced": 2},
+    "goal": {g: i for i, g in enumerate(GOALS)},
+    "previous_goal": {g: i for i, g in enumerate(GOALS)},
+    "avg_intensity": {"Low": 0, "Medium": 1, "High": 2},
+}
+
+# target -> (feature columns, label column, default tree depth)
+TARGETS = {
+    "plan_success": (FEATURE_COLS, "plan_success", 5),
+    "intensity": (["BMI"], "avg_intensity", 3),
+}
+ESTIMATORS = ("tree", "forest", "extra_trees")
+
+
+@dataclass
+class TrainingData:
+    X: np.ndarray              # float32, FEATURE_COLS order
+    plan_success: np.ndarray   # int8
+    sha256: str
+    rows: int
+    holdout: Optional[np.ndarray] = None   # bool per row; None: random split of `holdout` fraction
+
+
+def _encode(col, labels: Dict[str, int]) -> np.ndarray:
+    """Categorical column -> float32 codes through a per-category lookup (NaN if unknown)."""
+    def code(cat):
+        if cat in labels:
+            return labels[cat]
+        try:
+            return float(cat)
+        except (TypeError, ValueError):
+            return np.nan
+    table = np.array([code(c) for c in col.cat.categories] + [np.nan], dtype=np.float32)
+    return table[col.cat.codes.to_numpy()]   # code -1 (missing) picks the trailing NaN
+
+
+def _scan(csv_path: str) -> Tuple[str, int]:
+    """sha256 of the file and an upper bound on its data rows, in one streaming pass."""
+    digest, lines, last = hashlib.sha256(), 0, b"\n"
+    with open(csv_path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+            lines += block.count(b"\n")
+            last = block[-1:]
+    return digest.hexdigest(), lines + (last != b"\n") - 1
+
+
+def load_training_data(csv_path: str = DATASET_PATH, chunksize: int = 200_000) -> TrainingData:
+    import pandas as pd
+    sha256, upper = _scan(csv_path)
+    X = np.empty((max(upper, 0), len(FEATURE_COLS)), dtype=np.float32)
+    y = np.empty(max(upper, 0), dtype=np.int8)
+    n = 0
+    for chunk in pd.read_csv(csv_path, dtype=DTYPES, chunksize=chunksize):
+        rows = slice(n, n + len(chunk))
+        for j, col in enumerate(FEATURE_COLS):
+            if col in LABELS:
+                X[rows, j] = _encode(chunk[col], LABELS[col])
+            else:
+                X[rows, j] = chunk[col].to_numpy()
+        y[rows] = chunk["plan_success"].fillna(-1).to_numpy().astype(np.int8)
+        n += len(chunk)
+    # rows without a label can't be trained on
+    keep = y[:n] >= 0
+    if keep.all():
+        X, y = X[:n], y[:n]
+    else:
+        X, y = X[:n][keep], y[:n][keep]
+    return TrainingData(X=X, plan_success=y, sha256=sha256, rows=len(y))
+
+
+def load_frame(csv_path: str = DATASET_PATH, chunksize: int = 200_000):
+    """DataFrame of the encoded features (float32) plus plan_success, for notebooks and tools."""
+    import pandas as pd
+    data = load_training_data(csv_path, chunksize)
+    df = pd.DataFrame(data.X, columns=FEATURE_COLS, copy=False)
+    df["plan_success"] = data.plan_success
+    return df
+
+
+def target_arrays(data: TrainingData, target: str) -> Tuple[np.ndarray, np.ndarray]:
+    features, label, _ = TARGETS[target]
+    if target == "plan_success":
+        return data.X, data.plan_success
+    X = data.X[:, [FEATURE_COLS.index(c) for c in features]]
+    y = data.X[:, FEATURE_COLS.index(label)]
+    keep = ~np.isnan(y)
+    return X[keep], y[keep].astype(np.int8)
+
+
+def feature_medians(X: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Per-column median of the (selected) rows, ignoring NaN; 0 for a column with no values."""
+    sample = X if rows is None else X[rows]
+    if not sample.size:
+        return np.zeros(X.shape[1], dtype=np.float32)
+    with np.errstate(all="ignore"):
+        medians = np.nanmedian(sample, axis=0) if np.isnan(sample).any() else np.median(sample, axis=0)
+    return np.nan_to_num(medians, nan=0.0).astype(np.float32)
+
+
+def impute(X: np.ndarray, medians: np.ndarray) -> np.ndarray:
+    """Replace NaN in X with its column's median, in place; returns X."""
+    missing = np.isnan(X)
+    if missing.any():
+        X[missing] = np.take(medians, np.nonzero(missing)[1])
+    return X
+
+
+@lru_cache(maxsize=1)
+def _shipped_medians() -> Tuple[float, ...]:
+    return tuple(feature_medians(load_training_data().X).tolist())
+
+
+def imputation_values(metadata: Optional[dict], features=FEATURE_COLS) -> np.ndarray:
+    """
+    Medians a model's inputs are imputed with: those stored with the artifact,
+    or, for the shipped model (no metadata), the shipped dataset's.
+    """
+    stored = (metadata or {}).get("impute")
+    if stored:
+        return np.array([stored[c] for c in features], dtype=np.float32)
+    shipped = dict(zip(FEATURE_COLS, _shipped_medians()))
+    return np.array([shipped[c] for c in features], dtype=np.float32)
+
+
+def make_estimator(target: str, estimator: str = "tree", n_jobs: Optional[int] = None,
+                   max_depth: Optional[int] = None, n_estimators: int = 100, seed: int = 42):
+    depth = max_depth if max_depth is not None else TARGETS[target][2]
+    if estimator == "tree":
+        from sklearn.tree import DecisionTreeClassifier
+        return DecisionTreeClassifier(max_depth=depth, random_state=seed)
+    if estimator == "forest":
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_estimators=n_estimators, max_depth=depth, n_jobs=n_jobs, random_state=seed)
+    if estimator == "extra_trees":
+        from sklearn.ensemble import ExtraTreesClassifier
+        return ExtraTreesClassifier(n_estimators=n_estimators, max_depth=depth, n_jobs=n_jobs, random_state=seed)
+    raise ValueError(f"Unknown estimator: {estimator}")
+
+
+def holdout_weights(n: int, holdout: float, seed: int = 42) -> np.ndarray:
+    """1.0 for training rows, 0.0 for the holdout (zero-weight rows are ignored by the trees)."""
+    rng = np.random.default_rng(seed)
+    return (rng.random(n) >= holdout).astype(np.float32)
+
+
+def evaluate(model, X, y, rows: np.ndarray, batch: int = 500_000) -> dict:
+    """Holdout metrics, predicting in batches so the holdout is never copied whole."""
+    from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+    idx = np.flatnonzero(rows)
+    if idx.size == 0:
+        return {}
+    proba = np.concatenate([model.predict_proba(X[idx[i:i + batch]]) for i in range(0, idx.size, batch)])
+    truth = y[idx]
+    pred = model.classes_[proba.argmax(axis=1)]
+    metrics = {"holdout_rows": int(idx.size), "accuracy": float(accuracy_score(truth, pred)),
+               "macro_f1": float(f1_score(truth, pred, average="macro"))}
+    if len(model.classes_) == 2 and len(np.unique(truth)) == 2:
+        metrics["roc_auc"] = float(roc_auc_score(truth, proba[:, 1]))
+    return metrics
+
+
+def train_model(target: str, estimator: str = "tree", csv_path: str = DATASET_PATH,
+                n_jobs: Optional[int] = None, max_depth: Optional[int] = None, n_estimators: int = 100,
+                holdout: float = 0.2, chunksize: int = 200_000, seed: int = 42, promote: bool = True,
+                data: Optional[TrainingData] = None, extra_metadata: Optional[dict] = None):
+    """Fit, evaluate and store a new artifact version. Returns (model, metadata)."""
+    if target not in TARGETS:
+        raise ValueError(f"Unknown target: {target}")
+    start = time.perf_counter()
+    data = data if data is not None else load_training_data(csv_path, chunksize)
+    load_seconds = time.perf_counter() - start
+    X, y = target_arrays(data, target)
+    if data.holdout is not None and target == "plan_success":
+        weights, holdout = (~data.holdout).astype(np.float32), float(data.holdout.mean())
+    else:
+        weights = holdout_weights(len(y), holdout, seed)
+    # in place (X is data.X for plan_success); scoring imputes with the same medians
+    medians = feature_medians(X, weights > 0)
+    impute(X, medians)
+    model = make_estimator(target, estimator, n_jobs, max_depth, n_estimators, seed)
+    start = time.perf_counter()
+    model.fit(X, y, sample_weight=weights if holdout > 0 else None)
+    train_seconds = time.perf_counter() - start
+    metrics = evaluate(model, X, y, weights == 0) if holdout > 0 else {}
+    metadata = store_model(target, model, estimator, dict(
+        extra_metadata or {},
+        impute=dict(zip(TARGETS[target][0], medians.tolist())),
+        dataset={"file": os.path.basename(csv_path), "sha256": data.sha256, "rows": data.rows},
+        metrics=metrics, load_seconds=round(load_seconds, 3), train_seconds=round(train_seconds, 3)),
+        promote=promote)
+    return model, metadata
+
+
+def store_model(target: str, model, estimator: str, metadata: dict, promote: bool = True) -> dict:
+    """Write `model` as a new artifact version (plus its compiled form for single trees)."""
+    import joblib
+    import sklearn
+    from fitness_app.tree_compile import compile_tree
+    files = {"model.joblib": lambda path: joblib.dump(model, path)}
+    if estimator == "tree":
+        # the sklearn-free artifact the web workers serve from
+        files["model.npz"] = lambda path: compile_tree(model).save(path)
+    metadata = dict(
+        metadata,
+        target=target,
+        estimator=estimator,
+        params={k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))},
+        features=TARGETS[target][0],
+        classes=[int(c) for c in model.classes_],
+        created_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        sklearn_version=sklearn.__version__,
+    )
+    version = artifacts.write_version(target, files, metadata)
+    if promote:
+        artifacts.promote(target, version)
+    return artifacts.read_metadata(target, version)
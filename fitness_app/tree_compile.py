@@ -0,0 +1,177 @@
+"""
+Compile fitted sklearn decision trees into plain NumPy arrays.
+
+The compiled artifact (.npz) predicts without importing sklearn, so web
+workers only need numpy. Thresholds are compared against float32 inputs,
+exactly like sklearn's Tree.apply, and NaN follows each node's
+missing_go_to_left like it does there, so predictions are identical.
+
+    python -m fitness_app.tree_compile    # compile both models and verify them
+"""
+import os
+from array import array
+from bisect import bisect_left
+from typing import List
+
+import numpy as np
+
+_LEAF = -1
+
+
+def _as_float32(x: float) -> float:
+    # sklearn casts inputs to float32 before comparing them to thresholds
+    return array("f", (x,))[0]
+
+
+class CompiledTree:
+    def __init__(self, feature, threshold, left, right, value, classes, n_features, missing_go_to_left=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        # trees fitted before sklearn 1.3 (and older .npz files) send NaN right everywhere
+        self.missing_go_to_left = (np.zeros(self.left.size, dtype=bool) if missing_go_to_left is None
+                                   else np.asarray(missing_go_to_left, dtype=bool))
+        self.value = np.asarray(value, dtype=np.float64)       # (n_nodes, n_classes), rows sum to 1
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = int(n_features)
+        self.max_depth = self._depth()
+        # python-list copies for the single-row path (cheaper to index than arrays)
+        self._feature = self.feature.tolist()
+        self._threshold = self.threshold.tolist()
+        self._left = self.left.tolist()
+        self._right = self.right.tolist()
+        self._missing_left = self.missing_go_to_left.tolist()
+        self._leaf_class = self.classes_[self.value.argmax(axis=1)].tolist()
+        self._intervals = self._build_intervals() if self.n_features_in_ == 1 else None
+
+    def _depth(self) -> int:
+        depth, stack = 0, [(0, 0)]
+        while stack:
+            node, d = stack.pop()
+            depth = max(depth, d)
+            if self.left[node] != _LEAF:
+                stack.append((int(self.left[node]), d + 1))
+                stack.append((int(self.right[node]), d + 1))
+        return depth
+
+    def _leaf(self, row) -> int:
+        node = 0
+        left, right, feature, threshold = self._left, self._right, self._feature, self._threshold
+        while left[node] != _LEAF:
+            x = _as_float32(row[feature[node]])
+            if x <= threshold[node] or (x != x and self._missing_left[node]):
+                node = left[node]
+            else:
+                node = right[node]
+        return node
+
+    def _build_intervals(self):
+        """For one-feature trees: sorted thresholds, the class of each interval and the class of NaN."""
+        thresholds = self.threshold[self.left != _LEAF]
+        # largest float32 <= threshold, so that x32 <= cut  <=>  x32 <= threshold
+        cut32 = thresholds.astype(np.float32)
+        over = cut32.astype(np.float64) > thresholds
+        cut32[over] = np.nextafter(cut32[over], np.float32(-np.inf))
+        cuts = sorted(set(cut32.astype(np.float64).tolist()))
+        # interval i is (cuts[i-1], cuts[i]]; its right edge (or +inf) lies inside it
+        edges = cuts + [float("inf")]
+        labels = [self._leaf_class[self._leaf([e])] for e in edges]
+        return cuts, labels, self._leaf_class[self._leaf([float("nan")])]
+
+    def predict_one(self, row):
+        """Predict a single sample (a sequence of n_features values)."""
+        if self._intervals is not None:
+            cuts, labels, missing = self._intervals
+            x = _as_float32(row[0])
+            return missing if x != x else labels[bisect_left(cuts, x)]
+        return self._leaf_class[self._leaf(row)]
+
+    def apply(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        rows = np.arange(len(X))
+        nodes = np.zeros(len(X), dtype=np.int32)
+        for _ in range(self.max_depth):
+            inner = self.left[nodes] != _LEAF
+            if not inner.any():
+                break
+            n, r = nodes[inner], rows[inner]
+            x = X[r, self.feature[n]]
+            go_left = (x <= self.threshold[n]) | (np.isnan(x) & self.missing_go_to_left[n])
+            nodes[inner] = np.where(go_left, self.left[n], self.right[n])
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.value[self.apply(X)]
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def save(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, kind=np.array("tree"), feature=self.feature, threshold=self.threshold,
+                     left=self.left, right=self.right, value=self.value,
+                     classes=self.classes_, n_features=np.array(self.n_features_in_),
+                     missing_go_to_left=self.missing_go_to_left)
+        os.replace(tmp, path)
+
+
+def compile_tree(clf) -> CompiledTree:
+    """Export a fitted DecisionTreeClassifier."""
+    t = clf.tree_
+    value = t.value[:, 0, :].astype(np.float64)
+    value = value / value.sum(axis=1, keepdims=True)
+    return CompiledTree(t.feature, t.threshold, t.children_left, t.children_right,
+                        value, clf.classes_, clf.n_features_in_, getattr(t, "missing_go_to_left", None))
+
+
+def load_compiled(path: str) -> CompiledTree:
+    with np.load(path, allow_pickle=False) as z:
+        return CompiledTree(z["feature"], z["threshold"], z["left"], z["right"],
+                            z["value"], z["classes"], int(z["n_features"]),
+                            z["missing_go_to_left"] if "missing_go_to_left" in z.files else None)
+
+
+def verify_equivalence(clf, compiled: CompiledTree, X) -> int:
+    """Number of rows where the compiled tree disagrees with sklearn (should be 0)."""
+    X = np.asarray(X, dtype=np.float64)
+    expected = clf.predict(X)
+    mismatches = int((compiled.predict(X) != expected).sum())
+    mismatches += int(not np.allclose(compiled.predict_proba(X), clf.predict_proba(X)))
+    one_by_one: List = [compiled.predict_one(row) for row in X.tolist()]
+    mismatches += int((np.asarray(one_by_one) != expected).sum())
+    return mismatches
+
+
+def compiled_path(joblib_path: str) -> str:
+    return os.path.splitext(joblib_path)[0] + ".npz"
+
+
+def main():
+    import joblib
+    from fitness_app import ml_engine, planner
+
+    intensity = joblib.load(planner.DTREE_PATH)
+    plan_success = joblib.load(ml_engine.MODEL_PATH_PLAN_SUCCESS)
+    intensity_X = planner.load_intensity_dataset()[["BMI"]]
+    plan_X = ml_engine.load_dataset()[ml_engine.FEATURE_COLS]
+
+    failed = False
+    for clf, X, path in ((intensity, intensity_X, planner.DTREE_FAST_PATH),
+                         (plan_success, plan_X, compiled_path(ml_engine.MODEL_PATH_PLAN_SUCCESS))):
+        compiled = compile_tree(clf)
+        bad = verify_equivalence(clf, compiled, X)
+        if bad:
+            failed = True
+            print(f"{path}: {bad} mismatches against sklearn, not written")
+            continue
+        compiled.save(path)
+        print(f"{path}: {compiled.left.size} nodes, equivalent on {len(X)} rows")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
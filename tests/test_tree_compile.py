@@ -0,0 +1,67 @@
+"""Compiled trees must predict exactly what sklearn predicts, NaN included."""
+import numpy as np
+import pytest
+
+sklearn_tree = pytest.importorskip("sklearn.tree")
+
+from fitness_app import ml_engine, planner
+from fitness_app.tree_compile import compile_tree, load_compiled
+from fitness_app.training import load_training_data
+
+
+@pytest.fixture(scope="module")
+def plan_data():
+    data = load_training_data()
+    return data.X, data.plan_success
+
+
+def _with_missing(X, rate, seed):
+    """X plus a copy of it with `rate` of the cells set to NaN."""
+    rng = np.random.default_rng(seed)
+    holes = X.copy()
+    holes[rng.random(X.shape) < rate] = np.nan
+    return np.vstack([X, holes])
+
+
+def _assert_equivalent(clf, compiled, X):
+    X = np.asarray(X, dtype=np.float32)
+    expected = clf.predict(X)
+    np.testing.assert_array_equal(compiled.apply(X), clf.apply(X))
+    np.testing.assert_array_equal(compiled.predict(X), expected)
+    np.testing.assert_allclose(compiled.predict_proba(X), clf.predict_proba(X))
+    np.testing.assert_array_equal([compiled.predict_one(row) for row in X.tolist()], expected)
+
+
+@pytest.mark.parametrize("max_depth", [3, 5, 8])
+def test_tree_trained_with_missing_values(plan_data, max_depth, tmp_path):
+    X, y = plan_data
+    X_train = _with_missing(X, 0.1, seed=max_depth)
+    clf = sklearn_tree.DecisionTreeClassifier(max_depth=max_depth, random_state=0)
+    clf.fit(X_train, np.concatenate([y, y]))
+    assert clf.tree_.missing_go_to_left[clf.tree_.children_left != -1].any()
+    compiled = compile_tree(clf)
+    X_test = _with_missing(X, 0.3, seed=100 + max_depth)
+    _assert_equivalent(clf, compiled, X_test)
+    # and after a round trip through the .npz
+    compiled.save(str(tmp_path / "model.npz"))
+    _assert_equivalent(clf, load_compiled(str(tmp_path / "model.npz")), X_test)
+
+
+def test_one_feature_tree_with_missing_values():
+    frame = planner.load_intensity_dataset()
+    X = frame[["BMI"]].to_numpy(dtype=np.float32)
+    y = frame["avg_intensity"].to_numpy()
+    X_train = _with_missing(X, 0.2, seed=1)
+    clf = sklearn_tree.DecisionTreeClassifier(max_depth=3, random_state=0)
+    clf.fit(X_train, np.concatenate([y, y]))
+    _assert_equivalent(clf, compile_tree(clf), _with_missing(X, 0.5, seed=2))
+
+
+def test_shipped_models(plan_data):
+    import joblib
+    X, _ = plan_data
+    clf = joblib.load(ml_engine.MODEL_PATH_PLAN_SUCCESS)
+    _assert_equivalent(clf, load_compiled(ml_engine.MODEL_PATH_PLAN_SUCCESS_FAST), _with_missing(X, 0.3, seed=3))
+    clf = joblib.load(planner.DTREE_PATH)
+    bmi = planner.load_intensity_dataset()[["BMI"]].to_numpy(dtype=np.float32)
+    _assert_equivalent(clf, load_compiled(planner.DTREE_FAST_PATH), _with_missing(bmi, 0.3, seed=4))